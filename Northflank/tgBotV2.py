@@ -10,7 +10,7 @@ from dotenv import load_dotenv
 from telethon.sync import TelegramClient
 from telethon import events
 
-from utils import get_shanghai_time, send_bark_notification, build_order_params, set_account_leverage
+from utils import get_shanghai_time, send_bark_notification, build_order_params, set_account_leverage, ProcessedIdStore
 import okx.Trade as Trade
 import okx.MarketData as MarketData
 import okx.Account as Account
@@ -98,24 +98,11 @@ def get_test_accounts():
     return accounts
 
 TEST_ACCOUNTS = get_test_accounts()
-PROCESSED_IDS_FILE = os.path.join(DATA_DIR, 'processed_message_ids.json')
+PROCESSED_IDS_FILE = os.path.join(DATA_DIR, 'processed_message_ids.json')  # 旧版缓存，仅用于首次迁移
+PROCESSED_IDS_LOG = os.path.join(DATA_DIR, 'processed_message_ids.log')
 
-def load_processed_ids():
-    try:
-        with open(PROCESSED_IDS_FILE, 'r', encoding='utf-8') as f:
-            return {int(k): set(v) for k, v in json.load(f).items()}
-    except (FileNotFoundError, json.JSONDecodeError, Exception) as e:
-        logger.warning(f"加载消息ID缓存失败 ({e})，将创建新的缓存。")
-        return {}
-
-def save_processed_ids(ids):
-    try:
-        with open(PROCESSED_IDS_FILE, 'w', encoding='utf-8') as f:
-            json.dump({k: list(v) for k, v in ids.items()}, f, indent=2)
-    except Exception as e:
-        logger.error(f"保存消息ID缓存失败: {e}")
-
-PROCESSED_MESSAGE_IDS = load_processed_ids()
+# 已处理消息ID：启动时加载一次，之后每个新ID只追加一行
+PROCESSED_IDS = ProcessedIdStore(PROCESSED_IDS_LOG, legacy_json_path=PROCESSED_IDS_FILE)
 
 # --- Signal Extraction (from root tgBotV2.py) ---
 def extract_trade_info(message):
@@ -286,16 +273,12 @@ async def check_and_patch_missing_signals():
     while True:
         await asyncio.sleep(PATCH_MISSING_SIGNALS_INTERVAL)
         logger.info('【定时补单检查】启动...')
-        global PROCESSED_MESSAGE_IDS
-        PROCESSED_MESSAGE_IDS = load_processed_ids()
         try:
             for channel_id in CHANNEL_IDS:
                 async for msg in client.iter_messages(channel_id, limit=20):
                     if not (msg and msg.text): continue
                     async with signal_lock:
-                        if msg.id in PROCESSED_MESSAGE_IDS.get(channel_id, set()): continue
-                        PROCESSED_MESSAGE_IDS.setdefault(channel_id, set()).add(msg.id)
-                        save_processed_ids(PROCESSED_MESSAGE_IDS)
+                        if not PROCESSED_IDS.add(channel_id, msg.id): continue
                         action, symbol = extract_trade_info(msg.text)
                         if action and symbol: await process_open_signal(action, symbol, f"补单: {msg.text}")
                         close_type, close_symbol = extract_close_signal(msg.text)
@@ -307,9 +290,7 @@ async def check_and_patch_missing_signals():
 async def handler(event):
     msg_text = event.message.text or ''
     async with signal_lock:
-        if event.id in PROCESSED_MESSAGE_IDS.get(event.chat_id, set()): return
-        PROCESSED_MESSAGE_IDS.setdefault(event.chat_id, set()).add(event.id)
-        save_processed_ids(PROCESSED_MESSAGE_IDS)
+        if not PROCESSED_IDS.add(event.chat_id, event.id): return
         action, symbol = extract_trade_info(msg_text)
         if action and symbol: await process_open_signal(action, symbol, msg_text)
         close_type, close_symbol = extract_close_signal(msg_text)
@@ -318,10 +299,8 @@ async def handler(event):
 async def init_processed_ids():
     logger.info("正在初始化消息ID缓存...")
     for channel_id in CHANNEL_IDS:
-        PROCESSED_MESSAGE_IDS.setdefault(channel_id, set())
         async for message in client.iter_messages(channel_id, limit=50):
-            if message: PROCESSED_MESSAGE_IDS[channel_id].add(message.id)
-    save_processed_ids(PROCESSED_MESSAGE_IDS)
+            if message: PROCESSED_IDS.add(channel_id, message.id)
     logger.info("消息ID缓存初始化完成。")
 
 async def set_leverage_for_all_accounts():
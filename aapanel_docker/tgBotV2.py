@@ -7,7 +7,7 @@ import re
 from datetime import datetime, timedelta
 from telethon.sync import TelegramClient
 from telethon import events
-from utils import get_shanghai_time, send_bark_notification, build_order_params, set_account_leverage
+from utils import get_shanghai_time, send_bark_notification, build_order_params, set_account_leverage, ProcessedIdStore
 import okx.Trade as Trade
 import okx.MarketData as MarketData
 import okx.Account as Account
@@ -89,30 +89,11 @@ def get_test_accounts():
 
 TEST_ACCOUNTS = get_test_accounts()
 
-PROCESSED_IDS_FILE = 'processed_message_ids.json'
+PROCESSED_IDS_FILE = 'processed_message_ids.json'  # 旧版缓存，仅用于首次迁移
+PROCESSED_IDS_LOG = 'processed_message_ids.log'
 
-# 加载/保存消息ID缓存
-
-def load_processed_ids():
-    try:
-        with open(PROCESSED_IDS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 转为 set 方便后续处理
-            return {int(k): set(v) for k, v in data.items()}
-    except Exception:
-        return {}
-
-def save_processed_ids(processed_ids):
-    try:
-        # set 转 list 方便序列化
-        data = {str(k): list(v) for k, v in processed_ids.items()}
-        with open(PROCESSED_IDS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"保存消息ID缓存失败: {e}")
-
-# 初始化缓存
-PROCESSED_MESSAGE_IDS = load_processed_ids()
+# 已处理消息ID：启动时加载一次，之后每个新ID只追加一行
+PROCESSED_IDS = ProcessedIdStore(PROCESSED_IDS_LOG, legacy_json_path=PROCESSED_IDS_FILE)
 
 # 提取信号中的价格，如“ETH价格:2633.96”
 def extract_signal_price(message):
@@ -122,16 +103,10 @@ def extract_signal_price(message):
     return None
 
 async def init_processed_ids():
-    updated = False
     for channel_id in CHANNEL_IDS:
-        if channel_id not in PROCESSED_MESSAGE_IDS:
-            PROCESSED_MESSAGE_IDS[channel_id] = set()
         async for message in client.iter_messages(channel_id, limit=20):
-            if message and message.id not in PROCESSED_MESSAGE_IDS[channel_id]:
-                PROCESSED_MESSAGE_IDS[channel_id].add(message.id)
-                updated = True
-    if updated:
-        save_processed_ids(PROCESSED_MESSAGE_IDS)
+            if message:
+                PROCESSED_IDS.add(channel_id, message.id)
 
 # ===== 可调参数区 =====
 # 支持通过环境变量设置（单位：秒），如未设置则用默认值
@@ -142,22 +117,14 @@ PATCH_MISSING_SIGNALS_INTERVAL = int(os.getenv('PATCH_MISSING_SIGNALS_INTERVAL',
 async def check_and_patch_missing_signals():
     while True:
         logger.info('【定时补单检查】正在检查各频道最近20条消息...')
-        # 每次定时检查前都重新加载缓存，实现热编辑支持
-        global PROCESSED_MESSAGE_IDS
-        PROCESSED_MESSAGE_IDS = load_processed_ids()
         try:
             for channel_id in CHANNEL_IDS:
-                if channel_id not in PROCESSED_MESSAGE_IDS:
-                    PROCESSED_MESSAGE_IDS[channel_id] = set()
                 async for message in client.iter_messages(channel_id, limit=20):
                     if not message or not message.text:
                         continue
-                    msg_id = message.id
-                    if msg_id in PROCESSED_MESSAGE_IDS[channel_id]:
+                    # 只处理新消息（登记成功说明之前未处理过）
+                    if not PROCESSED_IDS.add(channel_id, message.id):
                         continue
-                    # 只处理新消息
-                    PROCESSED_MESSAGE_IDS[channel_id].add(msg_id)
-                    save_processed_ids(PROCESSED_MESSAGE_IDS)
                     msg_text = message.text
                     action, symbol = extract_trade_info(msg_text)
                     close_type, close_symbol = extract_close_signal(msg_text)
@@ -684,11 +651,7 @@ async def main():
         channel_id = event.chat_id
         msg_id = event.id
         # 记录消息ID，避免重复
-        if channel_id not in PROCESSED_MESSAGE_IDS:
-            PROCESSED_MESSAGE_IDS[channel_id] = set()
-        if msg_id not in PROCESSED_MESSAGE_IDS[channel_id]:
-            PROCESSED_MESSAGE_IDS[channel_id].add(msg_id)
-            save_processed_ids(PROCESSED_MESSAGE_IDS)
+        PROCESSED_IDS.add(channel_id, msg_id)
         # 统一日志内容
         base_log = f"【信号播报】\n时间: {sh_time}\n频道: {channel_id}\n用户: {sender_name}\n原始信息: {msg}"
         # 提取开仓信号
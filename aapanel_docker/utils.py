@@ -88,4 +88,155 @@ def set_account_leverage(apikey, secretkey, passphrase, flag, inst_id, lever, mg
         lever=lever,
         mgnMode=mgn_mode
     )
-    return result
\ No newline at end of file
+    return result
+
+# ========== 已处理消息ID去重存储 ==========
+# 每个频道保留的去重窗口大小（高水位以下最近多少个消息ID）
+PROCESSED_ID_WINDOW = int(os.getenv('PROCESSED_ID_WINDOW', 1024))
+
+class DedupWindow:
+    """
+    单个频道的去重窗口：高水位（见过的最大消息ID）+ 其下 size 个ID的位图，
+    第 i 位表示 hwm - i 是否已处理。频道消息ID单调递增，低于窗口的旧ID视为已处理。
+    """
+    __slots__ = ('size', 'hwm', 'bits')
+
+    def __init__(self, size=PROCESSED_ID_WINDOW):
+        self.size = size
+        self.hwm = None
+        self.bits = 0
+
+    def __contains__(self, msg_id):
+        if self.hwm is None or msg_id > self.hwm:
+            return False
+        offset = self.hwm - msg_id
+        if offset >= self.size:
+            return True
+        return (self.bits >> offset) & 1 == 1
+
+    def add(self, msg_id):
+        """登记ID，已存在返回 False"""
+        if msg_id in self:
+            return False
+        if self.hwm is None:
+            self.hwm, self.bits = msg_id, 1
+        elif msg_id > self.hwm:
+            shift = msg_id - self.hwm
+            self.bits = ((self.bits << shift) | 1) & ((1 << self.size) - 1) if shift < self.size else 1
+            self.hwm = msg_id
+        else:
+            self.bits |= 1 << (self.hwm - msg_id)
+        return True
+
+    def __iter__(self):
+        """窗口内已处理的ID，从小到大"""
+        if self.hwm is None:
+            return iter(())
+        return iter([self.hwm - i for i in range(self.size - 1, -1, -1) if (self.bits >> i) & 1])
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+class ProcessedIdStore:
+    """
+    已处理消息ID的追加写日志：每个新ID追加一行"频道ID 消息ID"，启动时一次性加载到内存，
+    之后查重只查内存，登记只追加一行；追加次数达到阈值后把内存内容重写为紧凑文件
+    （先写临时文件再 os.replace，中途崩溃不会损坏原文件）。
+    内存中每个频道只保留一个 DedupWindow，内存和压缩后的文件大小都与历史长度无关。
+    """
+
+    def __init__(self, path, legacy_json_path=None, compact_every=1000, fsync=False, window=PROCESSED_ID_WINDOW):
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.window = window
+        self._ids = {}
+        self._file = None
+        self._appends = 0
+        self._load(legacy_json_path)
+
+    def _load(self, legacy_json_path):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    # 崩溃时最后一行可能只写了一半，跳过无法解析的行
+                    if len(parts) != 2:
+                        continue
+                    try:
+                        channel_id, msg_id = int(parts[0]), int(parts[1])
+                    except ValueError:
+                        continue
+                    self._channel(channel_id).add(msg_id)
+        elif legacy_json_path and os.path.exists(legacy_json_path):
+            # 从旧版 processed_message_ids.json 迁移
+            try:
+                with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                count = 0
+                for channel_id, ids in data.items():
+                    window = self._channel(int(channel_id))
+                    for msg_id in sorted(int(i) for i in ids):
+                        window.add(msg_id)
+                        count += 1
+                print(f"[INFO] 已从 {legacy_json_path} 迁移 {count} 个消息ID（保留每个频道最近 {self.window} 个ID窗口）")
+            except Exception as e:
+                print(f"[WARN] 迁移旧消息ID缓存失败: {e}")
+        # 启动时压缩一次：去掉重复和半行记录，之后的追加从完整的行尾开始
+        self.compact()
+
+    def _channel(self, channel_id):
+        window = self._ids.get(channel_id)
+        if window is None:
+            window = self._ids[channel_id] = DedupWindow(self.window)
+        return window
+
+    def high_water_mark(self, channel_id):
+        """频道已处理的最大消息ID，未见过该频道返回 None"""
+        window = self._ids.get(channel_id)
+        return window.hwm if window else None
+
+    def seen(self, channel_id, msg_id):
+        """消息是否已处理"""
+        ids = self._ids.get(channel_id)
+        return ids is not None and msg_id in ids
+
+    def add(self, channel_id, msg_id):
+        """登记消息ID，已存在返回 False；新ID追加写入日志并返回 True"""
+        if not self._channel(channel_id).add(msg_id):
+            return False
+        try:
+            self._file.write(f"{channel_id} {msg_id}\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except Exception as e:
+            print(f"[ERROR] 写入消息ID日志失败: {e}")
+        self._appends += 1
+        if self._appends >= self.compact_every:
+            self.compact()
+        return True
+
+    def compact(self):
+        """把内存中的ID重写为紧凑日志并重新打开追加句柄"""
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for channel_id, ids in self._ids.items():
+                    for msg_id in ids:
+                        f.write(f"{channel_id} {msg_id}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file:
+                self._file.close()
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[ERROR] 压缩消息ID日志失败: {e}")
+        if self._file is None or self._file.closed:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._appends = 0
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -84,7 +84,7 @@ async def get_orders(
 ):
     """获取交易订单列表"""
     try:
-        with DatabaseManager() as db:
+        with DatabaseManager(read_only=True) as db:
             # 解析日期
             start_dt = None
             end_dt = None
@@ -116,7 +116,7 @@ async def get_messages(
 ):
     """获取Telegram消息列表"""
     try:
-        with DatabaseManager() as db:
+        with DatabaseManager(read_only=True) as db:
             # 解析日期
             start_dt = None
             end_dt = None
@@ -144,7 +144,7 @@ async def get_statistics(
 ):
     """获取交易统计"""
     try:
-        with DatabaseManager() as db:
+        with DatabaseManager(read_only=True) as db:
             # 解析日期
             start_dt = None
             end_dt = None
@@ -189,7 +189,7 @@ async def get_orders_summary(
 ):
     """获取订单摘要统计"""
     try:
-        with DatabaseManager() as db:
+        with DatabaseManager(read_only=True) as db:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=days)
             
@@ -234,7 +234,7 @@ async def get_orders_summary(
 async def health_check():
     """健康检查"""
     try:
-        with DatabaseManager() as db:
+        with DatabaseManager(read_only=True) as db:
             # 简单测试数据库连接
             db.get_trading_orders(limit=1)
         
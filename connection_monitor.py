@@ -0,0 +1,119 @@
+"""
+Telegram 连接健康检查
+
+进程长期运行，不再定时整体重启：
+- 定期检查 client 是否连接，并发一个轻量请求（updates.GetState）确认连接真实可用
+- 连续失败达到次数后只重建 Telegram 连接（disconnect + connect），
+  client、事件 handler 以及其余内存状态（OKX 连接、行情、队列）全部保留
+- 重连后调用 catch_up() 拉取断线期间错过的更新
+"""
+import asyncio
+import logging
+import os
+import time
+
+from telethon.tl.functions.updates import GetStateRequest
+
+logger = logging.getLogger('tg_bot')
+
+TG_HEALTH_CHECK_INTERVAL = float(os.getenv('TG_HEALTH_CHECK_INTERVAL', '60'))
+TG_HEALTH_CHECK_TIMEOUT = float(os.getenv('TG_HEALTH_CHECK_TIMEOUT', '10'))
+# 连续失败多少次后重建连接
+TG_HEALTH_MAX_FAILURES = int(os.getenv('TG_HEALTH_MAX_FAILURES', '2'))
+# 重连失败后的最长等待（秒）
+TG_RECONNECT_MAX_BACKOFF = 300
+
+class TelegramConnectionMonitor:
+    """定期检查 Telegram 连接，不健康时只重建连接"""
+
+    def __init__(self, client, interval: float = TG_HEALTH_CHECK_INTERVAL, timeout: float = TG_HEALTH_CHECK_TIMEOUT,
+                 max_failures: int = TG_HEALTH_MAX_FAILURES, on_reconnected=None):
+        # on_reconnected: 可选 async () -> None，重连成功后调用
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.on_reconnected = on_reconnected
+        self._task = None
+        self.checks = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.reconnects = 0
+        self.last_rtt_ms = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self.run(), name='tg-health')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def check(self) -> bool:
+        """连接可用返回 True"""
+        self.checks += 1
+        if not self.client.is_connected():
+            logger.warning("Telegram 连接已断开")
+            return False
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.client(GetStateRequest()), self.timeout)
+        except Exception as e:
+            logger.warning(f"Telegram 健康检查失败: {e!r}")
+            return False
+        self.last_rtt_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    async def reconnect(self):
+        """只重建 Telegram 连接，直到成功"""
+        backoff = self.interval
+        while True:
+            logger.warning("重建 Telegram 连接...")
+            try:
+                await asyncio.wait_for(self.client.disconnect(), self.timeout)
+            except Exception as e:
+                logger.warning(f"断开 Telegram 连接时出错: {e!r}")
+            try:
+                await asyncio.wait_for(self.client.connect(), self.timeout * 3)
+                if await self.check():
+                    break
+            except Exception as e:
+                logger.error(f"重连 Telegram 失败: {e!r}")
+            logger.info(f"{backoff:.0f}s 后再次尝试重连")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, TG_RECONNECT_MAX_BACKOFF)
+        self.reconnects += 1
+        self.consecutive_failures = 0
+        logger.info(f"Telegram 连接已恢复（第 {self.reconnects} 次重连）")
+        try:
+            # 补收断线期间的更新，重复投递的消息由流水线去重
+            await self.client.catch_up()
+        except Exception as e:
+            logger.warning(f"补收断线期间的消息失败: {e!r}")
+        if self.on_reconnected is not None:
+            try:
+                await self.on_reconnected()
+            except Exception as e:
+                logger.error(f"重连回调出错: {e}")
+
+    async def run(self):
+        """持续检查，直到被取消"""
+        while True:
+            await asyncio.sleep(self.interval)
+            if await self.check():
+                self.consecutive_failures = 0
+                continue
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.max_failures:
+                await self.reconnect()
+
+    def stats(self) -> dict:
+        return {
+            'connected': self.client.is_connected(),
+            'checks': self.checks,
+            'failures': self.failures,
+            'reconnects': self.reconnects,
+            'last_rtt_ms': round(self.last_rtt_ms, 2)
+        }
@@ -1,15 +1,36 @@
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
-from models import TradingOrder, TelegramMessage, SystemLog, BotSession, SessionLocal
+from models import TradingOrder, TelegramMessage, SystemLog, BotSession, BotState, SessionLocal, ReadSessionLocal
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import os
 import json
 
+def signal_messages_after_query(cursor: int, since: datetime, limit: int = 500):
+    """补单检查读取游标之后的信号消息，只取需要的列，按 id 升序"""
+    return (
+        select(TelegramMessage.id, TelegramMessage.timestamp, TelegramMessage.signal_type,
+               TelegramMessage.signal_action, TelegramMessage.signal_symbol)
+        .where(TelegramMessage.id > cursor, TelegramMessage.has_signal == True,
+               TelegramMessage.timestamp >= since)
+        .order_by(TelegramMessage.id)
+        .limit(limit)
+    )
+
+def executed_message_ids_query(message_ids: List[int]):
+    """给定消息中已有成功订单关联的消息 id，由 ix_trading_orders_source_message 覆盖"""
+    return (
+        select(TradingOrder.source_message_id)
+        .where(TradingOrder.source_message_id.in_(message_ids), TradingOrder.status == '成功')
+        .distinct()
+    )
+
 class DatabaseManager:
     """数据库管理器"""
     
-    def __init__(self):
-        self.db = SessionLocal()
+    def __init__(self, read_only: bool = False):
+        # read_only 使用只读引擎（query_only），供 API 等只查询的进程使用
+        self.db = ReadSessionLocal() if read_only else SessionLocal()
     
     def __enter__(self):
         return self
@@ -20,6 +41,25 @@ class DatabaseManager:
     def close(self):
         self.db.close()
     
+    # 批量写入
+    def bulk_insert(self, rows_by_model: Dict[type, List[Dict]]) -> int:
+        """按表批量插入（executemany），所有表在同一个事务中提交，返回写入行数"""
+        written = 0
+        try:
+            for model, rows in rows_by_model.items():
+                # executemany 要求同一批参数字段一致，按字段组合分组
+                shapes = {}
+                for row in rows:
+                    shapes.setdefault(tuple(row), []).append(row)
+                for group in shapes.values():
+                    self.db.execute(model.__table__.insert(), group)
+                    written += len(group)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return written
+    
     # 交易订单相关方法
     def add_trading_order(self, order_data: Dict) -> TradingOrder:
         """添加交易订单"""
@@ -58,6 +98,12 @@ class DatabaseManager:
                 order.close_time = close_time
             self.db.commit()
     
+    def get_executed_message_ids(self, message_ids: List[int]) -> set:
+        """返回其中已有成功订单关联的消息 id 集合"""
+        if not message_ids:
+            return set()
+        return set(self.db.execute(executed_message_ids_query(message_ids)).scalars())
+    
     # Telegram消息相关方法
     def add_telegram_message(self, message_data: Dict) -> TelegramMessage:
         """添加Telegram消息"""
@@ -87,6 +133,10 @@ class DatabaseManager:
         messages = query.order_by(TelegramMessage.timestamp.desc()).offset(offset).limit(limit).all()
         return [message.to_dict() for message in messages]
     
+    def get_signal_messages_after(self, cursor: int, since: datetime, limit: int = 500) -> List[Dict]:
+        """获取 id 大于游标且在时间窗口内的信号消息（仅补单检查所需字段，按 id 升序）"""
+        return [dict(row._mapping) for row in self.db.execute(signal_messages_after_query(cursor, since, limit))]
+    
     # 系统日志相关方法
     def add_system_log(self, level: str, module: str, message: str) -> SystemLog:
         """添加系统日志"""
@@ -116,6 +166,35 @@ class DatabaseManager:
         logs = query.order_by(SystemLog.timestamp.desc()).offset(offset).limit(limit).all()
         return [log.to_dict() for log in logs]
     
+    # 运行状态相关方法
+    def get_state(self, key: str) -> Optional[str]:
+        """读取运行状态"""
+        state = self.db.get(BotState, key)
+        return state.value if state else None
+    
+    def set_state(self, key: str, value: str):
+        """写入运行状态"""
+        self.db.merge(BotState(key=key, value=value, updated_at=datetime.utcnow()))
+        self.db.commit()
+    
+    def get_states(self, prefix: str) -> Dict[str, tuple]:
+        """读取指定前缀的全部运行状态，返回 key -> (value, updated_at)"""
+        rows = self.db.execute(
+            select(BotState.key, BotState.value, BotState.updated_at).where(BotState.key.like(f"{prefix}%"))
+        ).all()
+        return {key: (value, updated_at) for key, value, updated_at in rows}
+    
+    def set_states(self, values: Dict[str, str]):
+        """一次事务写入多个运行状态"""
+        now = datetime.utcnow()
+        for key, value in values.items():
+            self.db.merge(BotState(key=key, value=value, updated_at=now))
+        self.db.commit()
+    
+    def get_max_id(self, model) -> int:
+        """表中当前最大 id，空表返回 0"""
+        return self.db.execute(select(func.max(model.id))).scalar() or 0
+    
     # 机器人会话相关方法
     def get_or_create_bot_session(self, session_name: str, phone_number: str) -> BotSession:
         """获取或创建机器人会话"""
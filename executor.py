@@ -0,0 +1,93 @@
+"""
+执行层：把阻塞 I/O 移出 Telethon 事件循环
+
+按 I/O 类型划分独立的有界线程池（交易所、通知、持久化），
+互不抢占线程，慢的 Bark 推送或 SQLite 写入不会拖住下单。
+"""
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('tg_bot')
+
+# 各类线程池大小，默认交易所池覆盖最多5个账号并留有余量
+EXCHANGE_MAX_WORKERS = int(os.getenv('EXCHANGE_MAX_WORKERS', '8'))
+NOTIFICATION_MAX_WORKERS = int(os.getenv('NOTIFICATION_MAX_WORKERS', '2'))
+PERSISTENCE_MAX_WORKERS = int(os.getenv('PERSISTENCE_MAX_WORKERS', '1'))
+
+# 事件循环延迟告警阈值（毫秒）
+LOOP_LAG_WARN_MS = float(os.getenv('LOOP_LAG_WARN_MS', '100'))
+
+exchange_executor = ThreadPoolExecutor(max_workers=EXCHANGE_MAX_WORKERS, thread_name_prefix='okx')
+notification_executor = ThreadPoolExecutor(max_workers=NOTIFICATION_MAX_WORKERS, thread_name_prefix='notify')
+persistence_executor = ThreadPoolExecutor(max_workers=PERSISTENCE_MAX_WORKERS, thread_name_prefix='db')
+
+async def _run_in(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+async def run_exchange(func, *args, **kwargs):
+    """在交易所线程池中执行 OKX REST 调用"""
+    return await _run_in(exchange_executor, func, *args, **kwargs)
+
+async def run_notification(func, *args, **kwargs):
+    """在通知线程池中执行 Bark 等外部推送"""
+    return await _run_in(notification_executor, func, *args, **kwargs)
+
+async def run_persistence(func, *args, **kwargs):
+    """在持久化线程池中执行数据库/文件读写"""
+    return await _run_in(persistence_executor, func, *args, **kwargs)
+
+async def fan_out(accounts, func, *args):
+    """
+    对每个账号并发执行 func(account, *args)，全部返回后按账号顺序给出结果。
+    单个账号抛出的异常作为结果返回，不影响其他账号。
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [loop.run_in_executor(exchange_executor, func, account, *args) for account in accounts]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+class LoopLagWatchdog:
+    """事件循环延迟看门狗：周期性休眠，测量实际唤醒比预期晚了多少毫秒"""
+
+    def __init__(self, interval: float = 0.5, warn_ms: float = LOOP_LAG_WARN_MS):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.samples = 0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - start - self.interval) * 1000)
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self.samples += 1
+            if lag_ms > self.warn_ms:
+                logger.warning(f"事件循环阻塞 {lag_ms:.1f}ms（阈值 {self.warn_ms:.0f}ms）")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self, reset: bool = False) -> dict:
+        """返回延迟统计；reset=True 时清零区间最大值"""
+        stats = {
+            'last_lag_ms': round(self.last_lag_ms, 1),
+            'max_lag_ms': round(self.max_lag_ms, 1),
+            'samples': self.samples
+        }
+        if reset:
+            self.max_lag_ms = 0.0
+        return stats
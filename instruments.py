@@ -0,0 +1,108 @@
+"""
+合约元数据缓存
+
+启动时通过 PublicAPI.get_instruments(instType='SWAP') 一次性加载全部永续合约的
+tickSz（价格精度）、lotSz（数量精度）、minSz（最小下单量）、ctVal（合约面值），
+之后按间隔整体刷新。下单参数的价格按 tickSz 取整、数量按 lotSz 向下取整，
+避免因精度不符被交易所拒单后再走一轮重试。
+"""
+import logging
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+logger = logging.getLogger('tg_bot')
+
+# 合约信息刷新间隔（秒）
+INSTRUMENT_REFRESH_INTERVAL = float(os.getenv('INSTRUMENT_REFRESH_INTERVAL', '3600'))
+# 未加载到合约信息时沿用原来的两位小数
+_FALLBACK_TICK = Decimal('0.01')
+
+class Instrument:
+    """单个合约的精度信息"""
+    __slots__ = ('inst_id', 'tick_sz', 'lot_sz', 'min_sz', 'ct_val')
+
+    def __init__(self, inst_id, tick_sz, lot_sz, min_sz, ct_val):
+        self.inst_id = inst_id
+        self.tick_sz = Decimal(tick_sz)
+        self.lot_sz = Decimal(lot_sz)
+        self.min_sz = Decimal(min_sz)
+        self.ct_val = Decimal(ct_val or '1')
+
+    def __repr__(self):
+        return f"Instrument({self.inst_id}, tickSz={self.tick_sz}, lotSz={self.lot_sz}, minSz={self.min_sz}, ctVal={self.ct_val})"
+
+def _quantize(value, step, rounding):
+    """把 value 取整到 step 的整数倍，结果保留 step 的小数位数"""
+    value = Decimal(str(value))
+    return ((value / step).to_integral_value(rounding=rounding) * step).quantize(step)
+
+class InstrumentRegistry:
+    """永续合约精度缓存，读操作无锁"""
+
+    def __init__(self, clients, inst_type: str = 'SWAP', refresh_interval: float = INSTRUMENT_REFRESH_INTERVAL, flag: str = '1'):
+        self.clients = clients
+        # 实盘 '0' / 模拟盘 '1'，两个环境的合约精度不保证一致，必须与下单账号相同
+        self.flag = str(flag)
+        self.inst_type = inst_type
+        self.refresh_interval = refresh_interval
+        self._instruments = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- 加载 ----------
+    def refresh(self) -> bool:
+        """重新加载全部合约信息（阻塞，在交易所线程池或启动阶段调用）"""
+        with self._lock:
+            try:
+                response = self.clients.public(self.flag).get_instruments(instType=self.inst_type)
+            except Exception as e:
+                logger.error(f"加载合约信息失败: {e}")
+                return False
+            if response.get('code') != '0':
+                logger.error(f"加载合约信息失败: {response}")
+                return False
+            instruments = {}
+            for item in response.get('data', []):
+                try:
+                    instruments[item['instId']] = Instrument(item['instId'], item['tickSz'], item['lotSz'],
+                                                             item['minSz'], item.get('ctVal'))
+                except (KeyError, ArithmeticError) as e:
+                    logger.debug(f"跳过无法解析的合约信息 {item.get('instId')}: {e}")
+            # 整体替换，读方总是看到完整的一份
+            self._instruments = instruments
+            self._loaded_at = time.monotonic()
+        logger.info(f"合约信息已加载: {len(instruments)} 个 {self.inst_type} 合约")
+        return True
+
+    def refresh_if_due(self) -> bool:
+        """超过刷新间隔时重新加载；未到期返回 False"""
+        if time.monotonic() - self._loaded_at < self.refresh_interval:
+            return False
+        return self.refresh()
+
+    def get(self, inst_id):
+        return self._instruments.get(inst_id)
+
+    # ---------- 取整 ----------
+    def round_price(self, inst_id, price) -> Decimal:
+        """价格按 tickSz 四舍五入"""
+        instrument = self._instruments.get(inst_id)
+        return _quantize(price, instrument.tick_sz if instrument else _FALLBACK_TICK, ROUND_HALF_UP)
+
+    def quantize_size(self, inst_id, size) -> Decimal:
+        """数量（张）按 lotSz 向下取整；低于 minSz 时抛出 ValueError，不发出必被拒绝的订单"""
+        instrument = self._instruments.get(inst_id)
+        if instrument is None:
+            return Decimal(str(size))
+        quantized = _quantize(size, instrument.lot_sz, ROUND_DOWN)
+        if quantized < instrument.min_sz:
+            raise ValueError(f"{inst_id} 下单数量 {size} 低于最小下单量 {instrument.min_sz}")
+        return quantized
+
+    def stats(self) -> dict:
+        return {
+            'instruments': len(self._instruments),
+            'age_s': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None
+        }
@@ -0,0 +1,105 @@
+"""
+杠杆设置缓存
+
+启动时不再为每个账号、每个币种顺序调用 set_leverage：
+- 已确认的杠杆按 账号/合约/保证金模式 记录在 bot_state 表（leverage:*），
+  与配置一致且未超过有效期的直接跳过，不发任何请求
+- 其余组合先 get_leverage 读取当前值，只有与配置不同才 set_leverage
+- 所有 账号×币种 在交易所线程池中并发执行，启动耗时约为一次往返
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from database import DatabaseManager
+from executor import run_exchange, run_persistence
+
+logger = logging.getLogger('tg_bot')
+
+# 缓存的杠杆多久后重新向交易所确认（小时），防止在网页端手动修改后长期不一致
+LEVERAGE_CACHE_TTL_HOURS = float(os.getenv('LEVERAGE_CACHE_TTL_HOURS', '24'))
+STATE_PREFIX = 'leverage:'
+
+class LeverageManager:
+    """按需设置杠杆，结果持久化缓存"""
+
+    def __init__(self, clients, mgn_mode: str = 'cross', ttl_hours: float = LEVERAGE_CACHE_TTL_HOURS):
+        self.clients = clients
+        self.mgn_mode = mgn_mode
+        self.ttl = timedelta(hours=ttl_hours)
+
+    def _state_key(self, account, inst_id):
+        return f"{STATE_PREFIX}{account['account_name']}:{inst_id}:{self.mgn_mode}"
+
+    # ---------- 缓存读写（在持久化线程池中执行） ----------
+    @staticmethod
+    def _load():
+        with DatabaseManager() as db:
+            return db.get_states(STATE_PREFIX)
+
+    @staticmethod
+    def _save(values):
+        with DatabaseManager() as db:
+            db.set_states(values)
+
+    # ---------- 交易所调用（在交易所线程池中执行） ----------
+    def _sync_one(self, account, inst_id):
+        """确保单个合约杠杆与配置一致，返回 ('unchanged' | 'set' | 'failed', 杠杆)"""
+        target = str(account['LEVERAGE'])
+        name = account['account_name']
+        try:
+            account_api = self.clients.account(account)
+            response = account_api.get_leverage(instId=inst_id, mgnMode=self.mgn_mode)
+            if response.get('code') == '0' and response.get('data'):
+                levers = {str(int(float(item['lever']))) for item in response['data']}
+                if levers == {target}:
+                    return 'unchanged', target
+            else:
+                logger.warning(f"账号 {name} 获取 {inst_id} 杠杆失败，直接设置: {response}")
+            response = account_api.set_leverage(instId=inst_id, lever=target, mgnMode=self.mgn_mode)
+            if response.get('code') == '0':
+                logger.info(f"账号 {name} 设置 {inst_id} 杠杆成功: {target}x")
+                return 'set', target
+            logger.error(f"账号 {name} 设置 {inst_id} 杠杆失败: {response}")
+        except Exception as e:
+            logger.error(f"账号 {name} 设置 {inst_id} 杠杆时出错: {e}")
+        return 'failed', None
+
+    async def ensure(self, accounts, symbols) -> dict:
+        """确保所有账号在给定币种上的杠杆与配置一致"""
+        start = time.perf_counter()
+        try:
+            cached = await run_persistence(self._load)
+        except Exception as e:
+            logger.warning(f"读取杠杆缓存失败，全部向交易所确认: {e}")
+            cached = {}
+        now = datetime.utcnow()
+        pending = []
+        counts = {'cached': 0, 'unchanged': 0, 'set': 0, 'failed': 0}
+        for account in accounts:
+            for symbol in symbols:
+                inst_id = f"{symbol.upper()}-USDT-SWAP"
+                key = self._state_key(account, inst_id)
+                value, updated_at = cached.get(key, (None, None))
+                if value == str(account['LEVERAGE']) and updated_at and now - updated_at < self.ttl:
+                    counts['cached'] += 1
+                    continue
+                pending.append((key, account, inst_id))
+
+        results = await asyncio.gather(*(run_exchange(self._sync_one, account, inst_id) for _, account, inst_id in pending))
+        confirmed = {}
+        for (key, _, _), (status, lever) in zip(pending, results):
+            counts[status] += 1
+            if lever is not None:
+                confirmed[key] = lever
+        if confirmed:
+            try:
+                await run_persistence(self._save, confirmed)
+            except Exception as e:
+                logger.warning(f"保存杠杆缓存失败: {e}")
+        counts['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        logger.info(f"杠杆检查完成: 缓存命中 {counts['cached']}, 无需修改 {counts['unchanged']}, "
+                    f"已设置 {counts['set']}, 失败 {counts['failed']}, 耗时 {counts['elapsed_ms']}ms")
+        return counts
@@ -4,14 +4,9 @@ import asyncio
 from telethon.sync import TelegramClient
 import requests
 from telethon import events
-import re
 from datetime import datetime, timedelta
 import pytz
 import os
-import okx.Trade as Trade
-import okx.MarketData as MarketData
-import okx.Account as Account
-import random
 import logging
 import traceback
 import time
@@ -22,10 +17,25 @@ import subprocess
 import signal
 import argparse
 import okx_utils
+from executor import fan_out, run_exchange, run_notification, LoopLagWatchdog
+from okx_clients import OKXClientRegistry
+from leverage import LeverageManager
+from instruments import InstrumentRegistry
+from order_gateway import OrderGateway
+from ws_trading import WsTradingService, OKX_WS_TRADING
+from order_templates import OrderTemplateBook
+from market_data import MarketDataService
+from position_book import PositionBookService
+from signal_parser import parse_signal
+from persistence import PersistenceWriter
+from reconciler import SignalReconciler, RECONCILE_INTERVAL
+from pipeline import SignalPipeline, SignalContext, Stage, RecentKeys, SignalFingerprints, PIPELINE_EXECUTE_WORKERS
+from connection_monitor import TelegramConnectionMonitor
+from notifier import NotificationDispatcher, NOTIFY_TG_RATE_PER_MIN, NOTIFY_BARK_RATE_PER_MIN
 
 # 导入数据持久化模块
-from models import create_tables
-from database import DatabaseManager, FileManager
+from models import create_tables, TradingOrder, TelegramMessage, SystemLog
+from database import FileManager
 
 # 自动加载 .env.local（本地开发专用）
 if os.path.exists('.env.local'):
@@ -80,6 +90,10 @@ except Exception as e:
 
 file_manager = FileManager(DATA_PATH)
 
+# 写后持久化：交易路径只入队，后台线程批量写库并追加订单日志文件
+# 后台线程在 bot_main_loop 中启动（守护进程 fork 之后），启动前的记录同步写入
+persistence_writer = PersistenceWriter(file_manager=file_manager)
+
 # 日志设置
 def setup_logger():
     current_date = datetime.now().strftime('%Y-%m-%d')
@@ -171,51 +185,46 @@ for idx in range(1, 6):
 
 if not OKX_ACCOUNTS:
     logger.warning("未检测到任何OKX账号环境变量，自动下单功能将不可用。")
+# 行情、合约精度、服务器时间等公共接口与账号同一环境（实盘/模拟盘）
+OKX_FLAG = OKX_ACCOUNTS[0]['FLAG'] if OKX_ACCOUNTS else '1'
+if any(account['FLAG'] != OKX_FLAG for account in OKX_ACCOUNTS):
+    logger.warning(f"账号的 FLAG 不一致，公共接口统一使用 FLAG={OKX_FLAG}")
 
-# 全局平仓关键词，便于统一维护
-CLOSE_KEYWORDS = ['空止盈', '空止损', '多止盈', '多止损', '平多', '平空']
+# OKX 客户端注册表：进程级共享，跨重启周期复用连接
+okx_clients = OKXClientRegistry()
+# 杠杆只在与配置不一致时设置，已确认的结果缓存在数据库
+leverage_manager = LeverageManager(okx_clients)
+# 永续合约精度缓存：下单价格按 tickSz、数量按 lotSz 取整
+instruments = InstrumentRegistry(okx_clients, flag=OKX_FLAG)
+# 可选的 WebSocket 下单通道（OKX_WS_TRADING=true），未连接时网关回退 REST
+ws_trading = WsTradingService(OKX_ACCOUNTS) if OKX_WS_TRADING else None
+# 下单网关：同一账号的订单合并为批量请求，按腿重试
+order_gateway = OrderGateway(okx_clients, ws=ws_trading, flag=OKX_FLAG)
+# 开仓订单模板：按 账号/币种/动作 预生成静态字段，信号到达后只填价格和 id
+order_templates = OrderTemplateBook(instruments)
 
-# 订单日志记录 - 使用数据库和文件双重记录
-def log_order_to_database(order_info):
-    """将订单信息记录到数据库"""
-    try:
-        with DatabaseManager() as db:
-            db.add_trading_order(order_info)
-        logger.info("订单信息已记录到数据库")
-    except Exception as e:
-        logger.error(f"记录订单信息到数据库失败: {e}")
-        logger.error(traceback.format_exc())
-
-def log_order_to_file(order_info):
-    """将订单信息记录到文件"""
-    try:
-        file_manager.write_order_log(order_info)
-        logger.info("订单信息已记录到文件")
-    except Exception as e:
-        logger.error(f"记录订单信息到文件失败: {e}")
+# 行情订阅的币种，默认与杠杆设置的币种一致
+MARKET_DATA_SYMBOLS = [s.strip().upper() for s in (get_env('MARKET_DATA_SYMBOLS', required=False) or 'ETH,BTC').split(',') if s.strip()]
+market_data = MarketDataService([f"{symbol}-USDT-SWAP" for symbol in MARKET_DATA_SYMBOLS], flag=OKX_FLAG)
+# 持仓簿：私有 WebSocket 推送维护的持仓，平仓时不必先走一次 REST 查询
+position_book = PositionBookService(OKX_ACCOUNTS, okx_clients)
 
+# 订单日志记录 - 使用数据库和文件双重记录（均由后台写入器完成）
 def log_order(order_info):
-    """记录订单信息到数据库和文件"""
-    log_order_to_database(order_info)
-    log_order_to_file(order_info)
+    """记录订单信息到数据库和文件（入队）"""
+    persistence_writer.submit(TradingOrder, order_info)
 
 def log_telegram_message(message_data):
-    """记录Telegram消息到数据库"""
-    try:
-        with DatabaseManager() as db:
-            db.add_telegram_message(message_data)
-    except Exception as e:
-        logger.error(f"记录Telegram消息失败: {e}")
+    """记录Telegram消息到数据库（入队）"""
+    persistence_writer.submit(TelegramMessage, message_data)
 
 def log_system_message(level, module, message):
-    """记录系统消息到数据库"""
-    try:
-        with DatabaseManager() as db:
-            db.add_system_log(level, module, message)
-    except Exception as e:
-        logger.error(f"记录系统消息失败: {e}")
+    """记录系统消息到数据库（入队）"""
+    persistence_writer.submit(SystemLog, {'level': level, 'module': module, 'message': message})
 
 # Bark 推送
+BARK_TIMEOUT = 10
+
 def send_bark_notification(bark_api_key, title, message):
     if not bark_api_key:
         return False
@@ -227,7 +236,7 @@ def send_bark_notification(bark_api_key, title, message):
         'group': 'TG Signal',
     }
     try:
-        response = requests.post(bark_url, json=payload, headers=headers)
+        response = requests.post(bark_url, json=payload, headers=headers, timeout=BARK_TIMEOUT)
         if response.status_code == 200:
             logger.info(f"Bark 通知发送成功: {title}")
             return True
@@ -239,140 +248,18 @@ def send_bark_notification(bark_api_key, title, message):
         logger.error(traceback.format_exc())
         return False
 
-# 提取交易信息
-def extract_trade_info(message):
-    """从消息中提取交易信息"""
-    logger.debug(f"正在从消息中提取交易信息: {message[:100]}...")
-    
-    # 首先检查是否包含平仓关键词，如果是平仓信号则不提取开仓信息
-    has_close_signal = any(keyword in message for keyword in CLOSE_KEYWORDS)
-    
-    if has_close_signal:
-        logger.debug("检测到平仓信号，跳过开仓信号提取")
-        return None, None
-    
-    # 尝试从标准格式中提取
-    action_pattern = r"执行交易:(.+?)(?= \d+\.\d+\w+)"
-    action_match = re.search(action_pattern, message)
-    symbol_pattern = r"策略当前交易对:(\w+USDT\.P)"
-    symbol_match = re.search(symbol_pattern, message)
-    
-    if action_match and symbol_match:
-        action = action_match.group(1).strip()
-        symbol = symbol_match.group(1).split('USDT')[0]
-        logger.info(f"成功提取交易信息 - 动作: {action}, 符号: {symbol}")
-        return action, symbol
-    
-    # 如果标准格式不匹配，使用通用正则表达式
-    # 做多信号 - 支持多种格式
-    long_patterns = [
-        r'做多\s*([A-Z]+)',  # 做多 ETH
-        r'([A-Z]+)\s*做多',  # ETH 做多
-        r'买入\s*([A-Z]+)',  # 买入 ETH
-        r'([A-Z]+)\s*买入',  # ETH 买入
-        r'LONG\s*([A-Z]+)',  # LONG ETH
-        r'([A-Z]+)\s*LONG',  # ETH LONG
-        r'做多\s*\d+\.?\d*([A-Z]+)',  # 做多 0.072ETH
-        r'([A-Z]+)\s*做多\s*\d+\.?\d*',  # ETH 做多 0.072
-        r'买入\s*\d+\.?\d*([A-Z]+)',  # 买入 0.072ETH
-        r'([A-Z]+)\s*买入\s*\d+\.?\d*',  # ETH 买入 0.072
-    ]
-    
-    # 做空信号 - 支持多种格式
-    short_patterns = [
-        r'做空\s*([A-Z]+)',  # 做空 ETH
-        r'([A-Z]+)\s*做空',  # ETH 做空
-        r'卖出\s*([A-Z]+)',  # 卖出 ETH
-        r'([A-Z]+)\s*卖出',  # ETH 卖出
-        r'SHORT\s*([A-Z]+)',  # SHORT ETH
-        r'([A-Z]+)\s*SHORT',  # ETH SHORT
-        r'做空\s*\d+\.?\d*([A-Z]+)',  # 做空 0.072ETH
-        r'([A-Z]+)\s*做空\s*\d+\.?\d*',  # ETH 做空 0.072
-        r'卖出\s*\d+\.?\d*([A-Z]+)',  # 卖出 0.072ETH
-        r'([A-Z]+)\s*卖出\s*\d+\.?\d*',  # ETH 卖出 0.072
-    ]
-    
-    # 检查做多信号
-    for pattern in long_patterns:
-        match = re.search(pattern, message, re.IGNORECASE)
-        if match:
-            symbol = match.group(1).upper()
-            logger.info(f"检测到做多信号: {symbol}")
-            return '做多', symbol
-    
-    # 检查做空信号
-    for pattern in short_patterns:
-        match = re.search(pattern, message, re.IGNORECASE)
-        if match:
-            symbol = match.group(1).upper()
-            logger.info(f"检测到做空信号: {symbol}")
-            return '做空', symbol
-    
-    logger.debug("未检测到交易信号")
-    return None, None
-
-def extract_close_signal(message):
-    """精简版：只返回 long 或 short，不再有 both"""
-    logger.debug(f"正在从消息中提取平仓信号: {message[:100]}...")
-
-    # 先判断多空止盈止损和平多/平空
-    if any(kw in message for kw in ['空止盈', '空止损', '平空']):
-        symbol_match = re.search(r'([A-Z]+)', message)
-        if symbol_match:
-            symbol = symbol_match.group(1).upper().split('USDT')[0]
-            logger.info(f"检测到平空/空止盈/空止损信号: {symbol}")
-            return 'short', symbol
-        else:
-            logger.warning("未能从平空/空止盈/空止损信号中提取币种")
-            return 'short', None
-    if any(kw in message for kw in ['多止盈', '多止损', '平多']):
-        symbol_match = re.search(r'([A-Z]+)', message)
-        if symbol_match:
-            symbol = symbol_match.group(1).upper().split('USDT')[0]
-            logger.info(f"检测到平多/多止盈/多止损信号: {symbol}")
-            return 'long', symbol
-        else:
-            logger.warning("未能从平多/多止盈/多止损信号中提取币种")
-            return 'long', None
-    logger.debug("未检测到平仓信号")
-    return None, None
-
 def get_shanghai_time():
     shanghai_tz = pytz.timezone('Asia/Shanghai')
     return datetime.now(shanghai_tz)
 
-def generate_clord_id():
-    return f"TG{int(time.time())}{random.randint(1000, 9999)}"
-
-def set_leverage(account, symbols):
-    try:
-        account_api = Account.AccountAPI(
-            account['API_KEY'],
-            account['SECRET_KEY'],
-            account['PASSPHRASE'],
-            False,
-            account['FLAG']
-        )
-        
-        for symbol in symbols:
-            symbol_id = f"{symbol.upper()}-USDT-SWAP"
-            response = account_api.set_leverage(
-                instId=symbol_id,
-                lever=str(account['LEVERAGE']),
-                mgnMode='cross'
-            )
-            if response.get('code') == '0':
-                logger.info(f"账号 {account['account_name']} 设置 {symbol} 杠杆成功: {account['LEVERAGE']}x")
-            else:
-                logger.error(f"账号 {account['account_name']} 设置 {symbol} 杠杆失败: {response}")
-    except Exception as e:
-        logger.error(f"设置杠杆时出错: {e}")
-        logger.error(traceback.format_exc())
-
 def get_latest_market_price(symbol):
+    symbol_id = f"{symbol.upper()}-USDT-SWAP"
+    # 优先使用 WebSocket 内存行情，过期或未订阅时回退 REST
+    cached_price = market_data.get_last_price(symbol_id)
+    if cached_price is not None:
+        return cached_price
     try:
-        market_api = MarketData.MarketAPI(debug=False)
-        symbol_id = f"{symbol.upper()}-USDT-SWAP"
+        market_api = okx_clients.market(market_data.flag)
         response = market_api.get_ticker(instId=symbol_id)
         if response.get('code') == '0':
             return float(response['data'][0]['last'])
@@ -383,46 +270,30 @@ def get_latest_market_price(symbol):
         logger.error(f"获取市场价格时出错: {e}")
         return None
 
-def place_order(account, action, symbol):
+def place_order(account, action, symbol, source_message_id=None):
     """
-    使用 okx_utils 的 build_order_params 和 TradeAPI 下单，自动带止盈止损。
+    按预生成的订单模板下单，自动带止盈止损。
     止盈1%，止损2.7%。
+    source_message_id 为触发下单的 telegram_messages.id，随订单记录入库。
     """
     try:
-        trade_api = Trade.TradeAPI(
-            account['API_KEY'],
-            account['SECRET_KEY'],
-            account['PASSPHRASE'],
-            False,
-            account['FLAG']
-        )
         symbol_id = f"{symbol.upper()}-USDT-SWAP"
         market_price = get_latest_market_price(symbol)
         if market_price is None:
             logger.error(f"无法获取 {symbol} 最新价格，无法下单")
             return False
-        # 计算止盈止损
-        if action == '做多':
-            side = 'buy'
-            pos_side = 'long'
-            take_profit = round(market_price * 1.01, 2)
-            stop_loss = round(market_price * (1 - 0.027), 2)
-        elif action == '做空':
-            side = 'sell'
-            pos_side = 'short'
-            take_profit = round(market_price * (1 - 0.01), 2)
-            stop_loss = round(market_price * (1 + 0.027), 2)
-        else:
+        # 预生成的模板已含方向、数量等静态字段，这里只填价格、止盈止损和 clOrdId
+        template = order_templates.get(account, symbol, action)
+        if template is None:
             logger.error(f"未知的交易动作: {action}")
             return False
-        qty = account['FIXED_QTY'].get(symbol, '0.01')
-        # 构建下单参数
-        order_params = okx_utils.build_order_params(
-            symbol_id, side, market_price, qty, pos_side, take_profit, stop_loss
-        )
-        response = trade_api.place_order(**order_params)
-        if response.get('code') == '0':
-            order_id = response['data'][0]['ordId']
+        qty = template.size
+        order_params = template.build(market_price)
+        # 经下单网关发送，同一账号并发的订单合并为一次批量请求
+        result = order_gateway.submit(account, [order_params])[0]
+        position_book.invalidate(account, symbol_id)
+        if result['ok']:
+            order_id = result['ordId']
             # 记录订单信息
             order_info = {
                 'timestamp': datetime.utcnow(),
@@ -436,14 +307,15 @@ def place_order(account, action, symbol):
                 'status': '成功',
                 'error_message': None,
                 'profit_loss': None,
-                'close_time': None
+                'close_time': None,
+                'source_message_id': source_message_id
             }
             log_order(order_info)
             log_system_message('INFO', 'trading', f"下单成功: {account['account_name']} {action} {symbol} {qty}")
             logger.info(f"账号 {account['account_name']} {action} {symbol} 下单成功: {order_id}")
             return True
         else:
-            error_msg = f"下单失败: {response}"
+            error_msg = f"下单失败: {result['sCode']} {result['sMsg']}"
             logger.error(f"账号 {account['account_name']} {action} {symbol} {error_msg}")
             order_info = {
                 'timestamp': datetime.utcnow(),
@@ -457,7 +329,8 @@ def place_order(account, action, symbol):
                 'status': '失败',
                 'error_message': error_msg,
                 'profit_loss': None,
-                'close_time': None
+                'close_time': None,
+                'source_message_id': source_message_id
             }
             log_order(order_info)
             log_system_message('ERROR', 'trading', f"下单失败: {account['account_name']} {action} {symbol} - {error_msg}")
@@ -478,40 +351,28 @@ def place_order(account, action, symbol):
             'status': '失败',
             'error_message': error_msg,
             'profit_loss': None,
-            'close_time': None
+            'close_time': None,
+            'source_message_id': source_message_id
         }
         log_order(order_info)
         log_system_message('ERROR', 'trading', f"下单异常: {account['account_name']} {action} {symbol} - {error_msg}")
         return False
 
-def close_position(account, symbol, close_type='both'):
+def close_position(account, symbol, close_type='both', source_message_id=None):
     try:
-        account_api = Account.AccountAPI(
-            account['API_KEY'],
-            account['SECRET_KEY'],
-            account['PASSPHRASE'],
-            False,
-            account['FLAG']
-        )
-        
-        trade_api = Trade.TradeAPI(
-            account['API_KEY'],
-            account['SECRET_KEY'],
-            account['PASSPHRASE'],
-            False,
-            account['FLAG']
-        )
+        account_api = okx_clients.account(account)
         
         symbol_id = f"{symbol.upper()}-USDT-SWAP"
         
-        # 获取持仓信息
-        positions_response = account_api.get_positions(instId=symbol_id)
-        if positions_response.get('code') != '0':
-            logger.error(f"获取持仓信息失败: {positions_response}")
-            return None
-        
-        positions = positions_response['data']
-        close_results = []
+        # 优先使用持仓簿；未同步或刚有成交待确认时回退 REST 查询
+        positions = position_book.get_positions(account, symbol_id)
+        if positions is None:
+            positions_response = account_api.get_positions(instId=symbol_id)
+            if positions_response.get('code') != '0':
+                logger.error(f"获取持仓信息失败: {positions_response}")
+                return None
+            positions = positions_response['data']
+        legs = []
         
         for position in positions:
             pos_side = position['posSide']
@@ -530,28 +391,47 @@ def close_position(account, symbol, close_type='both'):
                 else:
                     logger.error(f"未知的持仓方向: {pos_side}")
                     continue
-                clord_id = generate_clord_id()
-                
-                response = trade_api.place_order(
-                    instId=symbol_id,
-                    tdMode='cross',
-                    side=side,
-                    posSide=pos_side,
-                    ordType='market',
-                    sz=str(pos_size),
-                    clOrdId=clord_id
-                )
-                
-                if response.get('code') == '0':
-                    order_id = response['data'][0]['ordId']
-                    close_results.append({
-                        'pos_side': pos_side,
-                        'size': pos_size,
-                        'order_id': order_id
-                    })
-                    logger.info(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 成功: {order_id}")
-                else:
-                    logger.error(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 失败: {response}")
+                legs.append((pos_side, pos_size, {
+                    'instId': symbol_id,
+                    'tdMode': 'cross',
+                    'side': side,
+                    'posSide': pos_side,
+                    'ordType': 'market',
+                    'sz': position['pos'],
+                    'clOrdId': okx_utils.generate_clord_id('TGC')
+                }))
+        
+        # 所有需要平的持仓一次批量请求发出
+        results = order_gateway.submit(account, [params for _, _, params in legs])
+        if legs:
+            position_book.invalidate(account, symbol_id)
+        close_results = []
+        for (pos_side, pos_size, _), result in zip(legs, results):
+            if result['ok']:
+                order_id = result['ordId']
+                close_results.append({
+                    'pos_side': pos_side,
+                    'size': pos_size,
+                    'order_id': order_id
+                })
+                logger.info(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 成功: {order_id}")
+                log_order({
+                    'timestamp': datetime.utcnow(),
+                    'account_name': account['account_name'],
+                    'action': '平仓',
+                    'symbol': symbol,
+                    'quantity': pos_size,
+                    'price': 0.0,
+                    'market_price': None,
+                    'order_id': order_id,
+                    'status': '成功',
+                    'error_message': None,
+                    'profit_loss': None,
+                    'close_time': datetime.utcnow(),
+                    'source_message_id': source_message_id
+                })
+            else:
+                logger.error(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 失败: {result['sCode']} {result['sMsg']}")
         
         if close_results:
             log_system_message('INFO', 'trading', f"平仓完成: {account['account_name']} {symbol} {len(close_results)}个持仓")
@@ -566,41 +446,274 @@ def close_position(account, symbol, close_type='both'):
         log_system_message('ERROR', 'trading', f"平仓异常: {account['account_name']} {symbol} - {str(e)}")
         return None
 
+# 补单检查：重新执行被遗漏（未成功执行）的信号，订单关联原消息 id
+async def patch_missed_open(msg):
+    if msg['signal_action'] not in ['做多', '做空'] or not msg['signal_symbol']:
+        return True
+    logger.warning(f"检测到遗漏开仓信号，自动补单: 消息 {msg['id']} {msg['signal_action']} {msg['signal_symbol']}")
+    results = await fan_out(OKX_ACCOUNTS, place_order, msg['signal_action'], msg['signal_symbol'], msg['id'])
+    return any(result is True for result in results)
+
+async def patch_missed_close(msg):
+    # 平仓信号的 action 可能为 long/short/平多/平空/多止盈/多止损/空止盈/空止损
+    if not msg['signal_action'] or not msg['signal_symbol']:
+        return True
+    logger.warning(f"检测到遗漏平仓信号，自动补平仓: 消息 {msg['id']} {msg['signal_action']} {msg['signal_symbol']}")
+    results = await fan_out(OKX_ACCOUNTS, close_position, msg['signal_symbol'], msg['signal_action'], msg['id'])
+    return any(isinstance(result, list) for result in results)
+
+reconciler = SignalReconciler(persistence_writer, patch_missed_open, patch_missed_close)
+
 class BotManager:
     def __init__(self):
-        self.restart_interval = timedelta(minutes=30)
         self.stop_event = threading.Event()
         self.bot_thread = None
         self.last_start = None
         self.client = None
+        self.pipeline = None
+        self.connection_monitor = None
+        # OKX 连接预热、行情订阅、杠杆设置在进程内只做一次
+        self.warmed_up = False
+        # 跨会话保留，重连后重复投递的消息只处理一次
+        self.seen_messages = RecentKeys()
+        # 多个群组在几秒内转发的同一信号只执行一次
+        self.signal_fingerprints = SignalFingerprints()
+        # 通知分发器：按目的地合并、限速、重试，跨会话保留未发出的内容
+        self.log_notifier = NotificationDispatcher('log_group', self.send_log_group, NOTIFY_TG_RATE_PER_MIN, max_length=3000)
+        self.bark_notifier = NotificationDispatcher('bark', self.send_bark, NOTIFY_BARK_RATE_PER_MIN)
         # 使用Northflank Volumes路径
         self.pid_file = os.path.join(DATA_PATH, 'tg_bot.pid')
         self.log_file = os.path.join(LOGS_PATH, 'tg_bot_daemon.log')
 
     def start_bot(self):
+        """长期运行；只有会话意外退出时才整体重启（Telegram 断线由健康检查单独重连）"""
         while not self.stop_event.is_set():
             try:
                 self.last_start = datetime.now()
-                logger.info(f"开始新的机器人会话，计划运行到: {self.last_start + self.restart_interval}")
+                logger.info("开始机器人会话")
                 asyncio.run(self.bot_main_loop())
                 if self.stop_event.is_set():
                     break
-                logger.info(f"等待2秒后重启...")
-                time.sleep(2)
+                logger.warning("机器人会话意外结束，10秒后重启...")
+                time.sleep(10)
             except Exception as e:
                 logger.error(f"机器人会话出错: {e}")
                 logger.error(traceback.format_exc())
                 time.sleep(10)
 
-    async def send_restart_notification(self):
-        if not self.client or not self.client.is_connected() or TG_LOG_GROUP_ID is None:
+    async def send_reconnect_notification(self):
+        if TG_LOG_GROUP_ID is None:
             return
+        shanghai_time = get_shanghai_time().strftime('%Y-%m-%d %H:%M:%S')
+        self.log_notifier.post('connection', f"🔌 Telegram 连接已恢复\n时间: {shanghai_time}\n重连次数: {self.connection_monitor.reconnects}")
+
+    # ---------- 信号流水线 ----------
+    def build_pipeline(self):
+        """ingest → parse → dedup → risk → execute → notify → persist；通知与写库为低优先级"""
+        return SignalPipeline([
+            Stage('parse', self.stage_parse),
+            Stage('dedup', self.stage_dedup),
+            Stage('risk', self.stage_risk),
+            Stage('execute', self.stage_execute, workers=PIPELINE_EXECUTE_WORKERS),
+            Stage('notify', self.stage_notify, low_priority=True),
+            Stage('persist', self.stage_persist, low_priority=True),
+        ])
+
+    async def stage_parse(self, ctx):
+        """一次解析得到开仓/平仓信号（结果按消息内容缓存），生成待入库的消息记录"""
+        signal = parse_signal(ctx.text)
+        ctx.signal = signal
+        ctx.timeline.mark('parsed')
+        if signal.kind:
+            logger.info(f"信号解析结果: {signal}")
+            if not signal.symbol:
+                logger.warning("未能从信号中提取币种")
+        ctx.message_data = {
+            'timestamp': datetime.utcnow(),
+            'group_id': str(ctx.chat_id),
+            'group_title': f"群组ID:{ctx.chat_id}",
+            'sender_name': None,
+            'message_text': ctx.text,
+            'has_signal': False,
+            'signal_type': None,
+            'signal_action': None,
+            'signal_symbol': None
+        }
+        if signal.is_open or signal.is_close:
+            ctx.message_data['has_signal'] = True
+            ctx.message_data['signal_type'] = '交易信号' if signal.is_open else '平仓信号'
+            ctx.message_data['signal_action'] = signal.action
+            ctx.message_data['signal_symbol'] = signal.symbol
+        return ctx
+
+    async def stage_dedup(self, ctx):
+        """
+        丢弃重连后重复投递的同一条 Telegram 消息；通过后预分配消息 id。
+        其他群组刚发出过的相同信号照常记录和通知，但不再下单
+        """
+        if not self.seen_messages.add((ctx.chat_id, ctx.tg_message_id)):
+            logger.info(f"忽略重复消息: 群组 {ctx.chat_id} 消息 {ctx.tg_message_id}")
+            return None
+        # 订单记录据此关联触发它的消息
+        ctx.message_id = persistence_writer.allocate_id(TelegramMessage)
+        ctx.message_data['id'] = ctx.message_id
+        if ctx.message_data['has_signal']:
+            origin = self.signal_fingerprints.check(ctx.signal, ctx.chat_id)
+            if origin is not None:
+                ctx.skip_reason = f"群组 {origin} 在 {self.signal_fingerprints.ttl:g} 秒内已发出相同信号"
+                # 记为已处理，补单检查不会再为它下单
+                ctx.message_data['signal_type'] = '重复信号'
+                reconciler.finish(ctx.message_id, True)
+                logger.info(f"跳过重复信号: 群组 {ctx.chat_id} {ctx.signal.action} {ctx.signal.symbol}，{ctx.skip_reason}")
+                return ctx
+            reconciler.begin(ctx.message_id)
+        return ctx
+
+    async def stage_risk(self, ctx):
+        """下单前检查：不支持的开仓动作、没有可用账号时不执行"""
+        if not ctx.message_data['has_signal'] or ctx.skip_reason:
+            return ctx
+        signal = ctx.signal
+        if signal.is_open and signal.action not in ['做多', '做空']:
+            ctx.skip_reason = f"不支持的交易动作 '{signal.action}'"
+        elif not OKX_ACCOUNTS:
+            ctx.skip_reason = "没有可用的交易账号"
+        if ctx.skip_reason:
+            logger.info(f"无需下单: {ctx.skip_reason}")
+            reconciler.finish(ctx.message_id, True)
+        return ctx
+
+    async def stage_execute(self, ctx):
+        """并发为所有账号下单/平仓，订单关联消息 id；行情价格由各账号下单时自行读取"""
+        if not ctx.message_data['has_signal'] or ctx.skip_reason:
+            return ctx
+        signal = ctx.signal
+        timeline = ctx.timeline
+
+        def acked(func):
+            # 在交易线程中记录每个账号拿到交易所回报的时间
+            def call(account, *args):
+                try:
+                    return func(account, *args)
+                finally:
+                    timeline.ack(account['account_name'])
+            return call
+
         try:
-            shanghai_time = get_shanghai_time().strftime('%Y-%m-%d %H:%M:%S')
-            restart_message = f"🔄 机器人定时重启\n时间: {shanghai_time}\n"
-            await self.client.send_message(TG_LOG_GROUP_ID, restart_message)
+            timeline.mark('order_sent')
+            if signal.is_open:
+                logger.info(f"并发处理 {len(OKX_ACCOUNTS)} 个账号的下单...")
+                ctx.results = await fan_out(OKX_ACCOUNTS, acked(place_order), signal.action, signal.symbol, ctx.message_id)
+                reconciler.finish(ctx.message_id, any(result is True for result in ctx.results))
+            else:
+                logger.info(f"并发处理 {len(OKX_ACCOUNTS)} 个账号的平仓...")
+                ctx.results = await fan_out(OKX_ACCOUNTS, acked(close_position), signal.symbol, signal.action, ctx.message_id)
+                reconciler.finish(ctx.message_id, any(isinstance(result, list) for result in ctx.results))
         except Exception as e:
-            logger.error(f"发送重启通知失败: {e}")
+            # 结果未知，交由补单检查按关联订单判断
+            reconciler.finish(ctx.message_id)
+            ctx.error = e
+            logger.error(f"处理{ctx.message_data['signal_type']}时出错: {e}")
+            logger.error(traceback.format_exc())
+        summary = self.pipeline.record_timeline(ctx)
+        logger.info(f"信号时间线(ms，自收到消息起) 消息 {ctx.message_id}: " + ", ".join(f"{name} {ms}" for name, ms in summary.items()))
+        return ctx
+
+    async def send_log_group(self, title, text):
+        await self.client.send_message(TG_LOG_GROUP_ID, text)
+
+    async def send_bark(self, title, text):
+        return await run_notification(send_bark_notification, BARK_API_KEY, title, text)
+
+    async def resolve_sender(self, ctx):
+        """解析发送者名称（可能需要请求 Telegram），写入消息记录"""
+        if ctx.sender_name is None:
+            try:
+                sender = await ctx.event.get_sender()
+                ctx.sender_name = sender.username if sender.username else (sender.first_name or "") + (sender.last_name or "")
+            except Exception as e:
+                logger.warning(f"获取消息发送者失败: {e}")
+                ctx.sender_name = ""
+        ctx.message_data['sender_name'] = ctx.sender_name
+
+    async def stage_notify(self, ctx):
+        """日志群组与 Bark 通知，在下单完成后交给通知分发器；通知失败不影响消息入库"""
+        await self.resolve_sender(ctx)
+        try:
+            await self.notify_signal(ctx)
+        except Exception as e:
+            logger.error(f"生成通知失败: {e}")
+            logger.error(traceback.format_exc())
+        return ctx
+
+    async def notify_signal(self, ctx):
+        """一条信号的所有结果合并为一条日志群组消息和一条 Bark 推送"""
+        signal = ctx.signal
+        has_signal = ctx.message_data['has_signal']
+        shanghai_time = ctx.shanghai_time
+        base_log = f"时间: {shanghai_time}\n来源: 群组ID:{ctx.chat_id} (@{ctx.sender_name})\n消息: {ctx.text[:300]}{'...' if len(ctx.text) > 300 else ''}"
+        log_group = self.log_notifier if TG_LOG_GROUP_ID is not None else None
+        bark = self.bark_notifier if BARK_API_KEY else None
+
+        if not has_signal:
+            # 普通消息共用一个批次，窗口内的多条合并发送
+            if log_group:
+                log_group.post('messages', f"📥 收到消息:\n{base_log}\n\n📭 未检测到交易信号")
+            return
+
+        action, symbol = signal.action, signal.symbol
+        if ctx.market_price is None:
+            ctx.market_price = await run_exchange(get_latest_market_price, symbol)
+        market_price = ctx.market_price
+        key = ctx.message_id
+        if signal.is_open:
+            header = f"✅ 检测到交易信号!\n动作: {action}\n符号: {symbol}\n市场价格: {market_price}"
+            bark_title = "新的交易信号"
+            bark_lines = [f"时间: {shanghai_time}", f"交易信号: {action} {symbol}", f"市场价格: {market_price}"]
+        else:
+            header = f"🔄 检测到平仓信号!\n类型: {action}\n符号: {symbol}\n市场价格: {market_price}"
+            bark_title = "新的平仓信号"
+            bark_lines = [f"时间: {shanghai_time}", f"平仓信号: {action} {symbol}", f"市场价格: {market_price}"]
+
+        result_lines = []
+        if ctx.skip_reason:
+            result_lines.append(f"ℹ️ 无需下单: {ctx.skip_reason}")
+        elif ctx.error is not None:
+            title = "处理交易信号时出错" if signal.is_open else "处理平仓信号时出错"
+            result_lines.append(f"❌ {title}: {str(ctx.error)}")
+        else:
+            for account, result in zip(OKX_ACCOUNTS, ctx.results or []):
+                name = account['account_name']
+                if signal.is_open:
+                    if isinstance(result, Exception):
+                        logger.error(f"账号 {name} 下单异常: {result}")
+                        result = False
+                    if result:
+                        result_lines.append(f"📊 账号 {name}: 下单成功")
+                    else:
+                        result_lines.append(f"❌ 账号 {name}: 下单失败")
+                        logger.error(f"账号 {name} 下单失败")
+                else:
+                    if isinstance(result, Exception):
+                        logger.error(f"账号 {name} 平仓异常: {result}")
+                        result = None
+                    if result:
+                        result_lines.append(f"🔄 账号 {name}: 平仓完成 {len(result)} 个持仓")
+                    else:
+                        result_lines.append(f"ℹ️ 账号 {name}: 没有相关持仓，无需平仓")
+                        logger.info(f"账号 {name} 无需平仓")
+
+        if log_group:
+            log_group.post(key, f"📥 收到消息:\n{base_log}")
+            log_group.post(key, header)
+            log_group.post(key, "\n".join(result_lines))
+        if bark:
+            bark.post(key, "\n".join(bark_lines + result_lines), title=bark_title)
+
+    async def stage_persist(self, ctx):
+        """记录Telegram消息到数据库（入队）"""
+        log_telegram_message(ctx.message_data)
+        return ctx
 
     async def bot_main_loop(self):
         try:
@@ -613,8 +726,19 @@ class BotManager:
 
             for account in OKX_ACCOUNTS:
                 logger.info(f"账号: {account['account_name']}, 杠杆倍数: {account['LEVERAGE']}")
-            for account in OKX_ACCOUNTS:
-                set_leverage(account, ['ETH', 'BTC'])
+            persistence_writer.start()
+            persistence_writer.seed_ids(TelegramMessage)
+            if not self.warmed_up:
+                okx_clients.warm_up(OKX_ACCOUNTS, [OKX_FLAG])
+                await run_exchange(instruments.refresh)
+                await run_exchange(order_gateway.clock.sync)
+                if ws_trading is not None:
+                    ws_trading.start()
+                order_templates.build(OKX_ACCOUNTS, MARKET_DATA_SYMBOLS)
+                market_data.start()
+                position_book.start()
+                await leverage_manager.ensure(OKX_ACCOUNTS, ['ETH', 'BTC'])
+                self.warmed_up = True
 
             logger.info(f"监听群组 IDs: {TG_GROUP_IDS}")
 
@@ -627,197 +751,81 @@ class BotManager:
                 timeout=30
             )
 
+            self.pipeline = self.build_pipeline()
+            await self.pipeline.start()
+            self.log_notifier.start()
+            self.bark_notifier.start()
+
             @self.client.on(events.NewMessage(chats=TG_GROUP_IDS))
             async def handler(event):
-                message_text = event.message.text
-                shanghai_time = get_shanghai_time().strftime('%Y-%m-%d %H:%M:%S')
-                group_title = f"群组ID:{event.chat_id}"
-                logger.info(f"收到来自[{group_title}]的新消息")
-                logger.debug(f"完整消息内容: {message_text}")
-                sender = await event.get_sender()
-                sender_name = sender.username if sender.username else (sender.first_name or "") + (sender.last_name or "")
-                base_log = f"时间: {shanghai_time}\n来源: {group_title} (@{sender_name})\n消息: {message_text[:300]}{'...' if len(message_text) > 300 else ''}"
-
-                # 记录Telegram消息到数据库
-                message_data = {
-                    'timestamp': datetime.utcnow(),
-                    'group_id': str(event.chat_id),
-                    'group_title': group_title,
-                    'sender_name': sender_name,
-                    'message_text': message_text,
-                    'has_signal': False,
-                    'signal_type': None,
-                    'signal_action': None,
-                    'signal_symbol': None
-                }
-
-                # 提取交易信息
-                action, symbol = extract_trade_info(message_text)
-                # 提取平仓信号
-                close_type, close_symbol = extract_close_signal(message_text)
-                
-                # 更新消息数据
-                if action and symbol:
-                    message_data['has_signal'] = True
-                    message_data['signal_type'] = '交易信号'
-                    message_data['signal_action'] = action
-                    message_data['signal_symbol'] = symbol
-                elif close_type and close_symbol:
-                    message_data['has_signal'] = True
-                    message_data['signal_type'] = '平仓信号'
-                    message_data['signal_action'] = close_type
-                    message_data['signal_symbol'] = close_symbol
-                
-                # 记录消息到数据库
-                log_telegram_message(message_data)
-                
-                # 合并消息发送到日志群组
-                combined_message = f"📥 收到消息:\n{base_log}"
-                
-                if action and symbol:
-                    combined_message += f"\n\n✅ 检测到交易信号!\n动作: {action}\n符号: {symbol}"
-                elif close_type and close_symbol:
-                    combined_message += f"\n\n🔄 检测到平仓信号!\n类型: {close_type}\n符号: {close_symbol}"
+                # ingest：不等待任何网络调用，发送者等信息留到通知阶段再解析
+                ctx = SignalContext(event.chat_id, event.message.id, event.message.text,
+                                    shanghai_time=get_shanghai_time().strftime('%Y-%m-%d %H:%M:%S'), event=event)
+                logger.info(f"收到来自[群组ID:{event.chat_id}]的新消息")
+                logger.debug(f"完整消息内容: {ctx.text}")
+                signal = parse_signal(ctx.text)
+                if signal.is_open or signal.is_close:
+                    # 快速路径：在 handler 内直接解析、检查并下单，之后才进入通知与写库队列
+                    await self.pipeline.run_inline(ctx, through='execute')
                 else:
-                    combined_message += f"\n\n📭 未检测到交易信号"
-
-                # 发送合并消息到日志群组
-                if TG_LOG_GROUP_ID is not None:
-                    try:
-                        if len(combined_message) > 3000:
-                            parts = [combined_message[i:i + 3000] for i in range(0, len(combined_message), 3000)]
-                            for i, part in enumerate(parts):
-                                prefix = f"📥 消息内容 (第 {i + 1}/{len(parts)} 部分):\n"
-                                await self.client.send_message(TG_LOG_GROUP_ID, prefix + part)
-                        else:
-                            await self.client.send_message(TG_LOG_GROUP_ID, combined_message)
-                        logger.info("消息已发送到日志记录群组")
-                    except Exception as e:
-                        logger.error(f"发送到日志群组失败: {e}")
-                        logger.error(traceback.format_exc())
-
-                # 处理交易信号
-                if action and symbol:
-                    try:
-                        market_price = get_latest_market_price(symbol)
-                        logger.info(f"最新市场价格: {market_price}")
-                        bark_message = f"时间: {shanghai_time}\n交易信号: {action} {symbol}\n市场价格: {market_price}"
-                        if send_bark_notification(BARK_API_KEY, "新的交易信号", bark_message):
-                            logger.info("Bark 通知发送成功")
-                        else:
-                            logger.warning("Bark 通知发送失败")
-                        
-                        if action not in ['做多', '做空']:
-                            no_order_log = f"ℹ️ 无需下单: 不支持的交易动作 '{action}'\n时间: {shanghai_time}\n详情: {action} {symbol}\n市场价格: {market_price}"
-                            if TG_LOG_GROUP_ID is not None:
-                                await self.client.send_message(TG_LOG_GROUP_ID, no_order_log)
-                            logger.info(f"无需下单: 不支持的交易动作 '{action}'")
-                            return
-                        
-                        for account in OKX_ACCOUNTS:
-                            logger.info(f"处理账号 {account['account_name']} 的下单...")
-                            order_result = place_order(account, action, symbol)
-                            if order_result:
-                                order_log = f"📊 下单成功!\n时间: {shanghai_time}\n账号: {account['account_name']}\n详情: {action} {symbol}\n市场价格: {market_price}"
-                                if TG_LOG_GROUP_ID is not None:
-                                    await self.client.send_message(TG_LOG_GROUP_ID, order_log)
-                                logger.info("下单结果已发送到日志记录群组")
-                                bark_order_message = f"时间: {shanghai_time}\n账号: {account['account_name']}\n下单结果: {action}极速{('做多' if action == '做多' else '做空')}成功\n市场价格: {market_price}"
-                                if send_bark_notification(BARK_API_KEY, "下单结果", bark_order_message):
-                                    logger.info("Bark 下单通知发送成功")
-                                else:
-                                    logger.warning("Bark 下单通知失败")
-                            else:
-                                error_log = f"❌ 下单失败!\n时间: {shanghai_time}\n账号: {account['account_name']}\n详情: {action} {symbol}\n市场价格: {market_price}"
-                                if TG_LOG_GROUP_ID is not None:
-                                    await self.client.send_message(TG_LOG_GROUP_ID, error_log)
-                                logger.error(f"账号 {account['account_name']} 下单失败")
-                    except Exception as e:
-                        error_msg = f"❌ 处理交易信号时出错!\n时间: {shanghai_time}\n错误: {str(e)}"
-                        if TG_LOG_GROUP_ID is not None:
-                            await self.client.send_message(TG_LOG_GROUP_ID, error_msg)
-                        logger.error(f"处理交易信号时出错: {e}")
-                        logger.error(traceback.format_exc())
-                
-                # 处理平仓信号
-                elif close_type and close_symbol:
-                    try:
-                        market_price = get_latest_market_price(close_symbol)
-                        logger.info(f"最新市场价格: {market_price}")
-                        bark_message = f"时间: {shanghai_time}\n平仓信号: {close_type} {close_symbol}\n市场价格: {market_price}"
-                        if send_bark_notification(BARK_API_KEY, "新的平仓信号", bark_message):
-                            logger.info("Bark 平仓通知发送成功")
-                        else:
-                            logger.warning("Bark 平仓通知发送失败")
-                        
-                        for account in OKX_ACCOUNTS:
-                            logger.info(f"处理账号 {account['account_name']} 的平仓...")
-                            close_results = close_position(account, close_symbol, close_type)
-                            if close_results:
-                                close_log = f"🔄 平仓完成!\n时间: {shanghai_time}\n账号: {account['account_name']}\n详情: {close_type} {close_symbol}\n市场价格: {market_price}\n平仓结果: {len(close_results)} 个持仓"
-                                if TG_LOG_GROUP_ID is not None:
-                                    await self.client.send_message(TG_LOG_GROUP_ID, close_log)
-                                logger.info("平仓结果已发送到日志记录群组")
-                                bark_close_message = f"时间: {shanghai_time}\n账号: {account['account_name']}\n平仓结果: {close_type} {close_symbol} 平仓完成\n市场价格: {market_price}"
-                                if send_bark_notification(BARK_API_KEY, "平仓结果", bark_close_message):
-                                    logger.info("Bark 平仓通知发送成功")
-                                else:
-                                    logger.warning("Bark 平仓通知失败")
-                            else:
-                                no_position_log = f"ℹ️ 无需平仓: 账号 {account['account_name']} 在 {close_symbol} 上没有相关持仓\n时间: {shanghai_time}\n详情: {close_type} {close_symbol}\n市场价格: {market_price}"
-                                if TG_LOG_GROUP_ID is not None:
-                                    await self.client.send_message(TG_LOG_GROUP_ID, no_position_log)
-                                logger.info(f"账号 {account['account_name']} 无需平仓")
-                    except Exception as e:
-                        error_msg = f"❌ 处理平仓信号时出错!\n时间: {shanghai_time}\n错误: {str(e)}"
-                        if TG_LOG_GROUP_ID is not None:
-                            await self.client.send_message(TG_LOG_GROUP_ID, error_msg)
-                        logger.error(f"处理平仓信号时出错: {e}")
-                        logger.error(traceback.format_exc())
+                    await self.pipeline.submit(ctx)
 
             await self.client.start()
             logger.info(f"Telegram 客户端已连接，开始监听群组: {TG_GROUP_IDS}")
-            start_time = datetime.now()
+            loop_watchdog = LoopLagWatchdog()
+            loop_watchdog.start()
+            self.connection_monitor = TelegramConnectionMonitor(self.client, on_reconnected=self.send_reconnect_notification)
+            self.connection_monitor.start()
             last_check_time = datetime.utcnow()
             while not self.stop_event.is_set():
-                if datetime.now() - start_time >= self.restart_interval:
-                    logger.info("达到重启时间，准备重启...")
-                    await self.send_restart_notification()
-                    break
                 await asyncio.sleep(30)
                 current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 logger.debug(f"机器人仍在运行，当前时间: {current_time}")
+                lag_stats = loop_watchdog.stats(reset=True)
+                logger.info(f"事件循环延迟: 最近 {lag_stats['last_lag_ms']}ms, 区间最大 {lag_stats['max_lag_ms']}ms")
+                conn_stats = okx_clients.stats()
+                logger.info(f"OKX 连接统计: 请求 {conn_stats['requests']}, 复用 {conn_stats['reused_connections']}, 新建握手 {conn_stats['new_connections']}")
+                logger.info(f"下单网关: {order_gateway.stats()}")
+                if ws_trading is not None:
+                    logger.info(f"WebSocket 下单: {ws_trading.stats()}")
+                logger.info(f"持仓簿: {position_book.stats()}")
+                db_stats = persistence_writer.stats()
+                logger.info(f"持久化队列: 深度 {db_stats['queue_depth']} (最大 {db_stats['max_depth']}), 已写入 {db_stats['written']}, 失败 {db_stats['failed']}, 上次刷盘 {db_stats['last_flush_ms']}ms")
+                stage_stats = self.pipeline.stats(reset=True)
+                logger.info("信号流水线: " + ", ".join(
+                    f"{name} 深度 {s['depth']}/{s['max_depth']} 处理 {s['processed']} 平均 {s['avg_ms']}ms 最大 {s['max_ms']}ms"
+                    for name, s in stage_stats.items()))
+                logger.info(f"Telegram 连接: {self.connection_monitor.stats()}")
+                logger.info(f"跨群组重复信号: {self.signal_fingerprints.stats()}")
+                logger.info(f"通知分发: 日志群组 {self.log_notifier.stats()}, Bark {self.bark_notifier.stats()}")
+                timeline_stats = self.pipeline.timeline_stats()
+                logger.info(f"信号收到→全部回报: 最近 {timeline_stats['signals']} 条, 中位数 {timeline_stats['p50_ms']}ms, 最大 {timeline_stats['max_ms']}ms")
+
+                try:
+                    if await run_exchange(instruments.refresh_if_due):
+                        order_templates.rebuild()
+                except Exception as e:
+                    logger.error(f"刷新合约信息异常: {e}")
+                try:
+                    await run_exchange(order_gateway.clock.sync_if_due)
+                except Exception as e:
+                    logger.error(f"校准服务器时间异常: {e}")
 
-                # 每分钟检查一次补单
-                if (datetime.utcnow() - last_check_time).total_seconds() >= 60:
+                # 定期增量补单检查（只处理游标之后的新信号）
+                if (datetime.utcnow() - last_check_time).total_seconds() >= RECONCILE_INTERVAL:
                     last_check_time = datetime.utcnow()
                     try:
-                        with DatabaseManager() as db:
-                            # 查询最近2小时所有有信号的消息
-                            since = datetime.utcnow() - timedelta(hours=2)
-                            messages = db.get_telegram_messages(limit=500, has_signal=True, start_date=since)
-                            # 查询所有已成功订单
-                            orders = db.get_trading_orders(limit=1000, start_date=since)
-                            order_keys = set((o['action'], o['symbol']) for o in orders if o['status'] == '成功')
-                            for msg in messages:
-                                # 补开仓信号
-                                if msg['signal_type'] == '交易信号':
-                                    key = (msg['signal_action'], msg['signal_symbol'])
-                                    if key not in order_keys and msg['signal_action'] in ['做多', '做空'] and msg['signal_symbol']:
-                                        logger.warning(f"检测到遗漏开仓信号，自动补单: {key}")
-                                        for account in OKX_ACCOUNTS:
-                                            place_order(account, msg['signal_action'], msg['signal_symbol'])
-                                # 补平仓信号
-                                elif msg['signal_type'] == '平仓信号':
-                                    key = (msg['signal_action'], msg['signal_symbol'])
-                                    # 平仓信号的 action 可能为 long/short/平多/平空/多止盈/多止损/空止盈/空止损
-                                    if key not in order_keys and msg['signal_action'] and msg['signal_symbol']:
-                                        logger.warning(f"检测到遗漏平仓信号，自动补平仓: {key}")
-                                        for account in OKX_ACCOUNTS:
-                                            close_position(account, msg['signal_symbol'], msg['signal_action'])
+                        await reconciler.tick()
+                        logger.info(f"补单检查: {reconciler.stats()}")
                     except Exception as e:
                         logger.error(f"补单检查异常: {e}")
                         logger.error(traceback.format_exc())
+            loop_watchdog.stop()
+            await self.connection_monitor.stop()
+            # 断开前把已收到的消息处理完（通知需要 Telegram 连接）
+            await self.pipeline.stop()
+            await self.log_notifier.stop()
+            await self.bark_notifier.stop()
             logger.info("正在断开Telegram连接...")
             if self.client and self.client.is_connected():
                 await self.client.disconnect()
@@ -841,6 +849,7 @@ class BotManager:
         self.stop_event.set()
         if self.bot_thread and self.bot_thread.is_alive():
             self.bot_thread.join(timeout=30)
+        persistence_writer.stop()
         logger.info("机器人管理器已停止")
 
     def start_with_daemon(self):
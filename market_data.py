@@ -0,0 +1,193 @@
+"""
+行情数据服务：通过 OKX 公共 WebSocket 订阅 tickers，在内存中维护最新价
+
+- 后台线程运行独立事件循环，不受 Telethon 主循环重启影响
+- 行情表为 instId -> Ticker 的普通 dict，只有 WS 线程整体替换条目，读取方无需加锁
+- 超过新鲜度阈值的行情视为过期，由调用方回退到 REST
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+logger = logging.getLogger('tg_bot')
+
+# 未设置时按账号 FLAG 选择实盘或模拟盘地址，与 REST 行情回退保持同一环境；测试时可指向本地替身
+OKX_WS_PUBLIC_URL = os.getenv('OKX_WS_PUBLIC_URL')
+_LIVE_PUBLIC_URL = 'wss://ws.okx.com:8443/ws/v5/public'
+_DEMO_PUBLIC_URL = 'wss://wspap.okx.com:8443/ws/v5/public'
+# 行情最大允许延迟（秒），超过则回退 REST
+TICKER_MAX_AGE = float(os.getenv('TICKER_MAX_AGE', '3'))
+# OKX 要求 30 秒内有数据往来，否则断开连接
+WS_PING_INTERVAL = 20
+WS_RECONNECT_MAX_DELAY = 30
+
+def public_ws_url(flag, url=None):
+    """公共频道地址：显式配置优先，否则按 FLAG 选择实盘或模拟盘"""
+    if url:
+        return url
+    return _DEMO_PUBLIC_URL if str(flag) == '1' else _LIVE_PUBLIC_URL
+
+class Ticker(NamedTuple):
+    """单个交易对的最新行情"""
+    last: float
+    bid: float
+    ask: float
+    received_at: float  # 本地接收时间（time.monotonic）
+    exchange_ts: int    # 交易所推送时间戳（毫秒）
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+class MarketDataService:
+    """OKX 公共行情 WebSocket 订阅服务"""
+
+    def __init__(self, inst_ids, url: str = OKX_WS_PUBLIC_URL, max_age: float = TICKER_MAX_AGE, flag: str = '1'):
+        self.inst_ids = list(dict.fromkeys(inst_ids))
+        # 实盘 '0' / 模拟盘 '1'，REST 回退应使用同一 flag 的 MarketAPI
+        self.flag = str(flag)
+        self.url = public_ws_url(self.flag, url)
+        self.max_age = max_age
+        self._tickers = {}
+        self._thread = None
+        self._loop = None
+        self._ws = None
+        self._stop = threading.Event()
+        self.connected = False
+        self.frames = 0
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        """启动后台订阅线程；未安装 websockets 时仅记录警告，所有查询走 REST"""
+        if websockets is None:
+            logger.warning("未安装 websockets，行情服务不可用，将全部使用 REST 获取价格")
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._thread_main, name='market-data', daemon=True)
+        self._thread.start()
+        logger.info(f"行情服务已启动，订阅: {self.inst_ids}")
+        return True
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        loop, ws = self._loop, self._ws
+        if loop is not None and ws is not None:
+            asyncio.run_coroutine_threadsafe(ws.close(), loop)
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._run())
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(self.url, ping_interval=None, close_timeout=2) as ws:
+                    await ws.send(json.dumps({
+                        'op': 'subscribe',
+                        'args': [{'channel': 'tickers', 'instId': inst_id} for inst_id in self.inst_ids]
+                    }))
+                    self._ws = ws
+                    self.connected = True
+                    delay = 1
+                    logger.info(f"行情 WebSocket 已连接: {self.url}")
+                    await self._consume(ws)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"行情 WebSocket 连接异常: {e}")
+            finally:
+                self._ws = None
+                self.connected = False
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WS_RECONNECT_MAX_DELAY)
+
+    async def _consume(self, ws):
+        while not self._stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=WS_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                await ws.send('ping')
+                continue
+            if raw == 'pong':
+                continue
+            self.handle_message(raw)
+
+    # ---------- 数据处理 ----------
+    def handle_message(self, raw):
+        """解析一帧 tickers 推送并更新行情表"""
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get('event') == 'error':
+            logger.error(f"行情订阅失败: {message}")
+            return
+        data = message.get('data')
+        if not data or message.get('arg', {}).get('channel') != 'tickers':
+            return
+        received_at = time.monotonic()
+        for item in data:
+            inst_id = item.get('instId')
+            if not inst_id:
+                continue
+            self._tickers[inst_id] = Ticker(
+                last=_to_float(item.get('last')),
+                bid=_to_float(item.get('bidPx')),
+                ask=_to_float(item.get('askPx')),
+                received_at=received_at,
+                exchange_ts=int(item.get('ts') or 0)
+            )
+        self.frames += 1
+
+    # ---------- 查询 ----------
+    def get_ticker(self, inst_id: str, max_age: Optional[float] = None) -> Optional[Ticker]:
+        """返回未过期的行情，过期或不存在时返回 None"""
+        ticker = self._tickers.get(inst_id)
+        limit = self.max_age if max_age is None else max_age
+        if ticker is None or time.monotonic() - ticker.received_at > limit:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ticker
+
+    def get_last_price(self, inst_id: str, max_age: Optional[float] = None) -> Optional[float]:
+        """返回未过期的最新成交价"""
+        ticker = self.get_ticker(inst_id, max_age)
+        return ticker.last if ticker and ticker.last > 0 else None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            'connected': self.connected,
+            'frames': self.frames,
+            'hits': self.hits,
+            'misses': self.misses,
+            'reconnects': self.reconnects,
+            'age_ms': {inst_id: round((now - t.received_at) * 1000) for inst_id, t in self._tickers.items()}
+        }
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Float, DateTime, Text, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -14,10 +14,48 @@ if DATABASE_URL.startswith('sqlite:///'):
     if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir, exist_ok=True)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith('sqlite') else {})
+# SQLite 调优参数：main.py（写）与 api.py（读）是两个进程共用同一个库，
+# WAL 模式下读不阻塞写、写不阻塞读
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))  # 负数单位为 KiB，即 64MB
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))  # 毫秒
+
+def _apply_sqlite_pragmas(dbapi_connection, read_only):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        # journal_mode 写入库文件，只需写连接设置；读连接沿用库的 WAL 模式
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+def make_engine(url: str = DATABASE_URL, read_only: bool = False):
+    """创建数据库引擎；SQLite 连接建立时统一设置调优 PRAGMA，read_only 引擎拒绝任何写入"""
+    if not url.startswith('sqlite'):
+        return create_engine(url)
+    engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT / 1000})
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        _apply_sqlite_pragmas(dbapi_connection, read_only)
+
+    return engine
+
+engine = make_engine(DATABASE_URL)
+# 只读引擎：供 api.py 查询使用
+read_engine = make_engine(DATABASE_URL, read_only=True)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # 创建基类
 Base = declarative_base()
@@ -39,6 +77,12 @@ class TradingOrder(Base):
     error_message = Column(Text, nullable=True)
     profit_loss = Column(Float, nullable=True)  # 盈亏
     close_time = Column(DateTime, nullable=True)  # 平仓时间
+    source_message_id = Column(Integer, nullable=True)  # 触发该订单的 telegram_messages.id
+    
+    __table_args__ = (
+        # 补单检查：按消息 id 查是否已有成功订单
+        Index('ix_trading_orders_source_message', 'source_message_id', 'status'),
+    )
     
     def to_dict(self):
         return {
@@ -54,7 +98,8 @@ class TradingOrder(Base):
             'status': self.status,
             'error_message': self.error_message,
             'profit_loss': self.profit_loss,
-            'close_time': self.close_time.isoformat() if self.close_time else None
+            'close_time': self.close_time.isoformat() if self.close_time else None,
+            'source_message_id': self.source_message_id
         }
 
 class TelegramMessage(Base):
@@ -72,6 +117,11 @@ class TelegramMessage(Base):
     signal_action = Column(String(50), nullable=True)
     signal_symbol = Column(String(20), nullable=True)
     
+    __table_args__ = (
+        # 增量补单检查：has_signal + id 游标范围，按 id 顺序读取
+        Index('ix_telegram_messages_signal_id', 'has_signal', 'id', 'timestamp', 'signal_type', 'signal_action', 'signal_symbol'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -128,10 +178,43 @@ class BotSession(Base):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class BotState(Base):
+    """机器人运行状态表（键值对，如补单检查游标）"""
+    __tablename__ = "bot_state"
+    
+    key = Column(String(100), primary_key=True)
+    value = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # 创建所有表
 def create_tables():
     """创建数据库表"""
     Base.metadata.create_all(bind=engine)
+    migrate_columns()
+    migrate_indexes()
+
+def migrate_columns():
+    """为已存在的旧表补加模型中新增的可空列"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+# 旧版补单查询使用的索引，查询改为按消息 id 游标后已无查询使用，只会拖慢写入
+OBSOLETE_INDEXES = ('ix_telegram_messages_signal_ts', 'ix_trading_orders_status_ts', 'ix_trading_orders_action_symbol')
+
+def migrate_indexes():
+    """为已存在的旧库补建模型中新增的索引（create_all 不会给已有表加索引），并删除废弃索引"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
 
 # 获取数据库会话
 def get_db():
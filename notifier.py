@@ -0,0 +1,187 @@
+"""
+异步通知分发
+
+每个通知目的地（日志群组、Bark）一个 NotificationDispatcher：
+- post() 只把内容挂到待发送批次上立即返回，不等待任何网络调用
+- 同一个 key（如同一条信号）在合并窗口内的内容合并成一条发送；
+  因限速尚未发出的批次继续接收新内容，积压越多合并越多
+- 按目的地令牌桶限速，发送失败按指数退避重试，Telegram FloodWait 按要求的秒数等待
+- 待发送批次超过上限时丢弃最旧的批次，保证内存有界
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('tg_bot')
+
+# 同一 key 的内容在首条到达后等待多久再发送（秒）
+NOTIFY_COALESCE_WINDOW = float(os.getenv('NOTIFY_COALESCE_WINDOW', '1.0'))
+# 每分钟最多发送条数
+NOTIFY_TG_RATE_PER_MIN = float(os.getenv('NOTIFY_TG_RATE_PER_MIN', '20'))
+NOTIFY_BARK_RATE_PER_MIN = float(os.getenv('NOTIFY_BARK_RATE_PER_MIN', '60'))
+NOTIFY_MAX_RETRIES = int(os.getenv('NOTIFY_MAX_RETRIES', '3'))
+NOTIFY_MAX_PENDING = int(os.getenv('NOTIFY_MAX_PENDING', '1000'))
+# 首次重试前的等待（秒），之后每次翻倍
+NOTIFY_RETRY_BACKOFF = 1.0
+# 停止时等待待发送内容发完的最长时间（秒）
+NOTIFY_DRAIN_TIMEOUT = 10
+
+class RateLimiter:
+    """令牌桶限速，单个消费者使用"""
+
+    def __init__(self, rate_per_min: float, burst: int = 3):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class _Batch:
+    __slots__ = ('title', 'parts', 'created')
+
+    def __init__(self, title):
+        self.title = title
+        self.parts = []
+        self.created = time.monotonic()
+
+class NotificationDispatcher:
+    """单个通知目的地的合并、限速与重试发送"""
+
+    def __init__(self, name, send, rate_per_min: float, window: float = NOTIFY_COALESCE_WINDOW,
+                 max_length: int = None, max_retries: int = NOTIFY_MAX_RETRIES, max_pending: int = NOTIFY_MAX_PENDING):
+        # send: async (title, text) -> 返回 False 或抛出异常表示发送失败
+        self.name = name
+        self.send = send
+        self.window = window
+        self.max_length = max_length
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self._limiter = RateLimiter(rate_per_min)
+        self._batches = OrderedDict()
+        self._pending = None
+        self._idle = None
+        self._task = None
+        self._closing = False
+        self.posted = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        """在当前事件循环中启动发送协程"""
+        self._pending = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closing = False
+        if self._batches:
+            self._pending.set()
+            self._idle.clear()
+        self._task = asyncio.create_task(self._run(), name=f"notifier-{self.name}")
+
+    async def stop(self, timeout: float = NOTIFY_DRAIN_TIMEOUT):
+        """不再等待合并窗口，尽量发完待发送内容后停止"""
+        if self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"通知[{self.name}] {timeout}s 内未发完，剩余 {len(self._batches)} 条")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    # ---------- 提交 ----------
+    def post(self, key, text, title=None):
+        """追加一段内容到 key 对应的批次，不等待发送"""
+        batch = self._batches.get(key)
+        if batch is None:
+            if len(self._batches) >= self.max_pending:
+                _, oldest = self._batches.popitem(last=False)
+                self.dropped += 1
+                logger.warning(f"通知[{self.name}] 积压过多，丢弃最早的一条: {oldest.title or ''}")
+            batch = self._batches[key] = _Batch(title)
+        elif title and not batch.title:
+            batch.title = title
+        batch.parts.append(text)
+        self.posted += 1
+        if self._pending is not None:
+            self._pending.set()
+            self._idle.clear()
+
+    # ---------- 发送 ----------
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            key, batch = next(iter(self._batches.items()))
+            delay = batch.created + self.window - time.monotonic()
+            if delay > 0 and not self._closing:
+                await asyncio.sleep(delay)
+            await self._limiter.acquire()
+            # 等待期间可能因积压被丢弃
+            batch = self._batches.pop(key, None)
+            if batch is not None:
+                await self._deliver(batch)
+            if not self._batches:
+                self._pending.clear()
+                self._idle.set()
+
+    def _chunks(self, text):
+        if not self.max_length or len(text) <= self.max_length:
+            return [text]
+        parts = [text[i:i + self.max_length] for i in range(0, len(text), self.max_length)]
+        return [f"(第 {i + 1}/{len(parts)} 部分)\n{part}" for i, part in enumerate(parts)]
+
+    async def _deliver(self, batch):
+        chunks = self._chunks("\n\n".join(batch.parts))
+        for index, chunk in enumerate(chunks):
+            if index:
+                await self._limiter.acquire()
+            await self._send_with_retry(batch.title, chunk)
+
+    async def _send_with_retry(self, title, text):
+        for attempt in range(1, self.max_retries + 1):
+            wait = None
+            try:
+                if await self.send(title, text) is not False:
+                    self.sent += 1
+                    return True
+                error = "发送返回失败"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                # Telegram FloodWaitError 会给出需要等待的秒数
+                wait = getattr(e, 'seconds', None)
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            wait = wait or NOTIFY_RETRY_BACKOFF * 2 ** (attempt - 1)
+            logger.warning(f"通知[{self.name}] 发送失败（第 {attempt} 次）: {error}，{wait}s 后重试")
+            await asyncio.sleep(wait)
+        self.failed += 1
+        logger.error(f"通知[{self.name}] 发送失败，已放弃: {error}")
+        return False
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._batches),
+            'posted': self.posted,
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'dropped': self.dropped
+        }
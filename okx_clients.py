@@ -0,0 +1,130 @@
+"""
+OKX API 客户端注册表
+
+python-okx 的 TradeAPI/AccountAPI/MarketAPI 本身就是带连接池的 HTTP 客户端（HTTP/2 keep-alive），
+每次调用都新建实例会重新握手 TCP+TLS。这里按账号缓存客户端实例，进程内所有信号、
+所有重启周期共用同一批连接，并统计连接复用与新建握手次数。
+"""
+import logging
+import threading
+
+import okx.Account as Account
+import okx.MarketData as MarketData
+import okx.PublicData as PublicData
+import okx.Trade as Trade
+
+logger = logging.getLogger('tg_bot')
+
+# 记录过的连接标识上限，避免长时间运行后集合无限增长
+_MAX_TRACKED_STREAMS = 1024
+
+class OKXClientRegistry:
+    """按账号缓存 OKX 客户端实例，复用 keep-alive 连接"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._seen_streams = set()
+        self.clients_created = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    @staticmethod
+    def _account_key(account):
+        return account['API_KEY'], account['FLAG']
+
+    def _get_or_create(self, key, factory):
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._instrument(client)
+                self._clients[key] = client
+                self.clients_created += 1
+        return client
+
+    def trade(self, account) -> Trade.TradeAPI:
+        """获取账号的 TradeAPI"""
+        return self._get_or_create(
+            ('trade',) + self._account_key(account),
+            lambda: Trade.TradeAPI(account['API_KEY'], account['SECRET_KEY'], account['PASSPHRASE'], False, account['FLAG'])
+        )
+
+    def account(self, account) -> Account.AccountAPI:
+        """获取账号的 AccountAPI"""
+        return self._get_or_create(
+            ('account',) + self._account_key(account),
+            lambda: Account.AccountAPI(account['API_KEY'], account['SECRET_KEY'], account['PASSPHRASE'], False, account['FLAG'])
+        )
+
+    def market(self, flag: str = '1') -> MarketData.MarketAPI:
+        """获取公共行情 MarketAPI（无需签名，实盘/模拟盘各共享一个）"""
+        return self._get_or_create(('market', str(flag)), lambda: MarketData.MarketAPI(flag=str(flag), debug=False))
+
+    def public(self, flag: str = '1') -> PublicData.PublicAPI:
+        """获取公共数据 PublicAPI（合约信息、服务器时间等，无需签名，实盘/模拟盘各共享一个）"""
+        return self._get_or_create(('public', str(flag)), lambda: PublicData.PublicAPI(flag=str(flag), debug=False))
+
+    def warm_up(self, accounts, flags=None):
+        """
+        启动时为所有账号预先创建客户端；公共客户端按实际使用的环境创建，
+        flags 默认取各账号的 FLAG，无账号时为模拟盘 '1'
+        """
+        flags = set(map(str, flags or [account['FLAG'] for account in accounts] or ['1']))
+        for flag in flags:
+            self.market(flag)
+            self.public(flag)
+        for account in accounts:
+            self.trade(account)
+            self.account(account)
+        logger.info(f"OKX 客户端注册表已就绪: {len(self._clients)} 个客户端")
+
+    def _instrument(self, client):
+        """通过 httpx 响应钩子统计连接复用情况；客户端不支持钩子时只统计实例数"""
+        hooks = getattr(client, 'event_hooks', None)
+        if hooks is None:
+            return
+        try:
+            response_hooks = list(hooks.get('response', [])) + [self._on_response]
+            client.event_hooks = {**hooks, 'response': response_hooks}
+        except Exception as e:
+            logger.debug(f"无法为 OKX 客户端注册连接统计钩子: {e}")
+
+    def _on_response(self, response):
+        stream = response.extensions.get('network_stream')
+        with self._lock:
+            self.requests += 1
+            if stream is None:
+                return
+            stream_id = id(stream)
+            if stream_id in self._seen_streams:
+                self.reused_connections += 1
+            else:
+                self.new_connections += 1
+                if len(self._seen_streams) >= _MAX_TRACKED_STREAMS:
+                    self._seen_streams.clear()
+                self._seen_streams.add(stream_id)
+
+    def stats(self) -> dict:
+        """返回客户端与连接复用统计"""
+        return {
+            'clients': len(self._clients),
+            'clients_created': self.clients_created,
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections
+        }
+
+    def close(self):
+        """关闭所有客户端连接"""
+        with self._lock:
+            for client in self._clients.values():
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            self._clients.clear()
@@ -0,0 +1,119 @@
+"""
+OKX REST 请求签名与序列化
+
+下单网关自己完成请求体编码和签名，不再经过 python-okx 的 _request：
+- 每个账号预先用 SECRET_KEY 初始化一个 HMAC-SHA256 对象，签名时 copy() 后只处理本次的
+  timestamp+method+path+body；固定请求头（KEY、PASSPHRASE、模拟盘标记）预先生成
+- 请求体优先用 orjson 编码为 bytes，未安装时回退标准库 json（紧凑分隔符）
+- 本地时钟与 OKX /api/v5/public/time 的偏差定期校准，签名时间戳按服务器时间生成，
+  避免本机时钟漂移导致的 50102（请求时间戳过期）拒单
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger('tg_bot')
+
+# 服务器时间校准间隔（秒）
+OKX_CLOCK_SYNC_INTERVAL = float(os.getenv('OKX_CLOCK_SYNC_INTERVAL', '300'))
+# 往返超过该值的校准结果误差过大，不采用（毫秒）
+_MAX_SYNC_RTT_MS = 2000
+
+def dumps(obj) -> bytes:
+    """请求体编码为 bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+class ServerClock:
+    """本地时钟相对 OKX 服务器时间的偏差"""
+
+    def __init__(self, clients, sync_interval: float = OKX_CLOCK_SYNC_INTERVAL, flag: str = '1'):
+        self.clients = clients
+        # 向与下单账号同一环境（实盘/模拟盘）的接口校准
+        self.flag = str(flag)
+        self.sync_interval = sync_interval
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.synced_at = 0.0
+        self.syncs = 0
+        self._lock = threading.Lock()
+
+    def sync(self) -> bool:
+        """请求一次服务器时间，用往返中点估算偏差（阻塞，在交易所线程池或启动阶段调用）"""
+        with self._lock:
+            try:
+                before = time.time()
+                response = self.clients.public(self.flag).get_system_time()
+                after = time.time()
+            except Exception as e:
+                logger.warning(f"校准 OKX 服务器时间失败: {e}")
+                return False
+            if response.get('code') != '0' or not response.get('data'):
+                logger.warning(f"校准 OKX 服务器时间失败: {response}")
+                return False
+            rtt_ms = (after - before) * 1000
+            if rtt_ms > _MAX_SYNC_RTT_MS:
+                logger.warning(f"校准 OKX 服务器时间往返过长（{rtt_ms:.0f}ms），沿用上次偏差")
+                return False
+            server_ms = int(response['data'][0]['ts'])
+            self.offset_ms = server_ms - (before + after) * 500
+            self.rtt_ms = rtt_ms
+            self.synced_at = time.monotonic()
+            self.syncs += 1
+        logger.info(f"OKX 服务器时间已校准: 偏差 {self.offset_ms:+.0f}ms, 往返 {rtt_ms:.0f}ms")
+        return True
+
+    def sync_if_due(self) -> bool:
+        if time.monotonic() - self.synced_at < self.sync_interval:
+            return False
+        return self.sync()
+
+    def timestamp(self) -> str:
+        """按服务器时间生成签名用的 ISO 时间戳，如 2024-01-01T00:00:00.123Z"""
+        now_ms = int(time.time() * 1000 + self.offset_ms)
+        seconds, millis = divmod(now_ms, 1000)
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)) + f".{millis:03d}Z"
+
+    def stats(self) -> dict:
+        return {
+            'offset_ms': round(self.offset_ms, 1),
+            'rtt_ms': round(self.rtt_ms, 1) if self.rtt_ms is not None else None,
+            'syncs': self.syncs
+        }
+
+class RequestSigner:
+    """单个账号的签名器：HMAC key 与固定请求头只在创建时计算一次"""
+    __slots__ = ('_mac', '_headers')
+
+    def __init__(self, account):
+        self._mac = hmac.new(account['SECRET_KEY'].encode(), digestmod=hashlib.sha256)
+        self._headers = {
+            'Content-Type': 'application/json',
+            'OK-ACCESS-KEY': account['API_KEY'],
+            'OK-ACCESS-PASSPHRASE': account['PASSPHRASE'],
+            'x-simulated-trading': str(account['FLAG'])
+        }
+
+    def sign(self, timestamp: str, method: str, path: str, body: bytes = b'') -> str:
+        mac = self._mac.copy()
+        mac.update(f"{timestamp}{method}{path}".encode())
+        mac.update(body)
+        return base64.b64encode(mac.digest()).decode()
+
+    def headers(self, timestamp: str, method: str, path: str, body: bytes = b'') -> dict:
+        """返回带签名的完整请求头"""
+        headers = dict(self._headers)
+        headers['OK-ACCESS-SIGN'] = self.sign(timestamp, method, path, body)
+        headers['OK-ACCESS-TIMESTAMP'] = timestamp
+        return headers
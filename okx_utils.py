@@ -96,7 +96,16 @@ def generate_clord_id(prefix="ORD"):
     return f"{prefix}{timestamp}{rand}"[:32]
 
 # ========== 6. 构建下单参数 ==========
-def build_order_params(inst_id, side, entry_price, size, pos_side, take_profit, stop_loss, prefix="ORD"):
+def build_order_params(inst_id, side, entry_price, size, pos_side, take_profit, stop_loss, prefix="ORD", instruments=None):
+    """
+    instruments: 可选的合约精度缓存（instruments.InstrumentRegistry），
+    传入时价格按 tickSz 取整、数量按 lotSz 向下取整
+    """
+    if instruments is not None:
+        entry_price = instruments.round_price(inst_id, entry_price)
+        take_profit = instruments.round_price(inst_id, take_profit)
+        stop_loss = instruments.round_price(inst_id, stop_loss)
+        size = instruments.quantize_size(inst_id, size)
     cl_ord_id = generate_clord_id(prefix)
     attach_algo_ord = {
         "attachAlgoClOrdId": generate_clord_id(prefix),
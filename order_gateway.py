@@ -0,0 +1,282 @@
+"""
+下单网关
+
+同一账号的订单合并为批量下单请求：
+- submit(account, [订单参数, ...]) 在交易线程中调用，一次调用的多条订单（如平掉多个持仓）
+  放进同一个 place_multiple_orders 请求，超过交易所单次上限（20 条）时拆分
+- 同一账号已有请求在途时，后到的订单先排队，在途请求返回后合并成下一批一起发送，
+  不额外等待，只是不再各自占用一次往返
+- 按腿（leg）判断结果，只自动重试确定未下单的腿（时间戳过期、限频、请求未发出）；
+  超时、系统繁忙等结果未知的腿先按 clOrdId 查单：已存在视为下单成功，确认不存在才重发，
+  查询失败则返回 sCode=unknown 交给补单检查处理（clOrdId 只在原订单未结束时去重，不能靠它防重复）
+- 请求体编码和签名由网关完成（okx_signing），复用 TradeAPI 的 HTTP 连接池直接 POST；
+  时间戳按校准后的服务器时间生成，遇到 50102（时间戳过期）先重新校准再重试
+- 启用 WebSocket 下单（ws_trading）时优先通过账号的私有 WebSocket 发单，未连接时回退 REST
+"""
+import logging
+import os
+import threading
+import time
+
+import httpx
+
+import okx_utils
+from okx_signing import RequestSigner, ServerClock, dumps
+from ws_trading import WsNotSent, WsOutcomeUnknown
+
+logger = logging.getLogger('tg_bot')
+
+# OKX 批量下单单次最多 20 条
+OKX_BATCH_LIMIT = 20
+# 单腿临时性失败的重试次数
+ORDER_LEG_RETRIES = int(os.getenv('ORDER_LEG_RETRIES', '2'))
+ORDER_RETRY_BACKOFF = 0.2
+# 确定未下单、可直接重发的错误码：时间戳过期、限频
+RETRYABLE_CODES = {'50011', '50102'}
+# 结果未知的错误码：服务暂不可用、接口超时、系统繁忙、系统错误、下单超时，重发前先查单
+UNKNOWN_OUTCOME_CODES = {'50001', '50004', '50013', '50026', '51149'}
+# 网关内部错误码：请求没有离开本机 / 请求已发出但结果未知
+NOT_SENT_CODE = 'not_sent'
+UNKNOWN_CODE = 'unknown'
+# 查单返回订单不存在
+ORDER_NOT_EXIST_CODE = '51603'
+# 连接阶段的异常，请求未发出
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# 请求时间戳过期：本地时钟与服务器偏差过大
+TIMESTAMP_EXPIRED_CODE = '50102'
+ORDER_PATH = '/api/v5/trade/order'
+BATCH_ORDERS_PATH = '/api/v5/trade/batch-orders'
+
+class _Leg:
+    __slots__ = ('params', 'result', 'code')
+
+    def __init__(self, params):
+        if not params.get('clOrdId'):
+            params = dict(params, clOrdId=okx_utils.generate_clord_id('GW'))
+        self.params = params
+        self.result = None
+        # 最近一次请求的错误码，重试时据此判断是否需要校准时钟
+        self.code = None
+
+class _AccountLane:
+    """单个账号的排队状态与签名器"""
+    __slots__ = ('cond', 'pending', 'busy', 'signer')
+
+    def __init__(self, account):
+        self.cond = threading.Condition()
+        self.pending = []
+        self.busy = False
+        self.signer = RequestSigner(account)
+
+class OrderGateway:
+    """按账号合并、拆分、重试的批量下单"""
+
+    def __init__(self, clients, retries: int = ORDER_LEG_RETRIES, clock: ServerClock = None, ws=None, flag: str = '1'):
+        self.clients = clients
+        self.retries = retries
+        # 服务器时间偏差，由调用方在启动和定时任务中校准；flag 为账号所在环境
+        self.clock = clock or ServerClock(clients, flag=flag)
+        # 可选 ws_trading.WsTradingService；登录签名同样按服务器时间生成
+        self.ws = ws
+        if ws is not None and ws.clock is None:
+            ws.clock = self.clock
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.legs = 0
+        self.retried_legs = 0
+        self.failed_legs = 0
+        self.lookups = 0
+        self.unknown_legs = 0
+        self.clock_resyncs = 0
+        self.ws_requests = 0
+        self.rest_fallbacks = 0
+        self.encode_count = 0
+        self.encode_total_us = 0.0
+        self.encode_max_us = 0.0
+
+    def _lane(self, account):
+        key = (account['API_KEY'], account['FLAG'])
+        lane = self._lanes.get(key)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.setdefault(key, _AccountLane(account))
+        return lane
+
+    def submit(self, account, orders):
+        """
+        提交一组订单参数，阻塞到全部有结果，按顺序返回每条的结果：
+        {'ok', 'ordId', 'clOrdId', 'sCode', 'sMsg'}
+        """
+        legs = [_Leg(params) for params in orders]
+        if not legs:
+            return []
+        lane = self._lane(account)
+        with lane.cond:
+            lane.pending.extend(legs)
+        while True:
+            with lane.cond:
+                while lane.busy and any(leg.result is None for leg in legs):
+                    lane.cond.wait()
+                if all(leg.result is not None for leg in legs):
+                    return [leg.result for leg in legs]
+                # 没有在途请求：由当前线程把排队中的订单（含其他调用方的）一起发出
+                lane.busy = True
+                batch, lane.pending = lane.pending, []
+            try:
+                self._send(account, lane.signer, batch)
+            except Exception as e:
+                logger.error(f"账号 {account['account_name']} 批量下单异常: {e}")
+                for leg in batch:
+                    if leg.result is None:
+                        leg.result = {'ok': False, 'ordId': '', 'clOrdId': leg.params['clOrdId'], 'sCode': '', 'sMsg': f"下单异常: {e}"}
+            finally:
+                with lane.cond:
+                    lane.busy = False
+                    lane.cond.notify_all()
+
+    def _send(self, account, signer, batch):
+        trade_api = self.clients.trade(account)
+        pending = batch
+        for attempt in range(self.retries + 1):
+            final = attempt == self.retries
+            retry, unknown = [], []
+            for start in range(0, len(pending), OKX_BATCH_LIMIT):
+                chunk = pending[start:start + OKX_BATCH_LIMIT]
+                chunk_retry, chunk_unknown = self._send_chunk(trade_api, signer, account, chunk, final)
+                retry.extend(chunk_retry)
+                unknown.extend(chunk_unknown)
+            if unknown:
+                # 给在途请求留出到达交易所的时间，再查单决定是否重发
+                time.sleep(ORDER_RETRY_BACKOFF)
+                retry.extend(self._resolve(trade_api, account, unknown, final))
+            if not retry:
+                return
+            with self._lock:
+                self.retried_legs += len(retry)
+            logger.warning(f"账号 {account['account_name']} {len(retry)} 条订单临时失败，第 {attempt + 1} 次重试")
+            if any(leg.code == TIMESTAMP_EXPIRED_CODE for leg in retry):
+                with self._lock:
+                    self.clock_resyncs += 1
+                self.clock.sync()
+            time.sleep(ORDER_RETRY_BACKOFF * (attempt + 1))
+            pending = retry
+
+    def _post(self, trade_api, signer, path, payload):
+        """编码、签名并通过 TradeAPI 的连接池发送 POST 请求"""
+        start = time.perf_counter()
+        body = dumps(payload)
+        headers = signer.headers(self.clock.timestamp(), 'POST', path, body)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        with self._lock:
+            self.encode_count += 1
+            self.encode_total_us += elapsed_us
+            self.encode_max_us = max(self.encode_max_us, elapsed_us)
+        return trade_api.post(path, content=body, headers=headers).json()
+
+    def _resolve(self, trade_api, account, legs, final):
+        """按 clOrdId 查询结果未知的腿：已存在记为成功，不存在返回待重发，查询失败记为 unknown"""
+        retry = []
+        for leg in legs:
+            with self._lock:
+                self.lookups += 1
+            try:
+                response = trade_api.get_order(instId=leg.params['instId'], clOrdId=leg.params['clOrdId'])
+            except Exception as e:
+                response = {'code': '', 'msg': f"查询异常: {e}", 'data': []}
+            code = response.get('code')
+            if code == '0' and response.get('data'):
+                item = response['data'][0]
+                leg.result = {'ok': True, 'ordId': item.get('ordId', ''), 'clOrdId': leg.params['clOrdId'], 'sCode': '0',
+                              'sMsg': f"查单确认: {item.get('state', '')}"}
+                continue
+            if code == ORDER_NOT_EXIST_CODE and not final:
+                leg.code = NOT_SENT_CODE
+                retry.append(leg)
+                continue
+            with self._lock:
+                self.failed_legs += 1
+            if code == ORDER_NOT_EXIST_CODE:
+                leg.result = {'ok': False, 'ordId': '', 'clOrdId': leg.params['clOrdId'], 'sCode': leg.code,
+                              'sMsg': '多次请求结果未知，查单确认订单不存在'}
+                continue
+            with self._lock:
+                self.unknown_legs += 1
+            logger.error(f"账号 {account['account_name']} 订单 {leg.params['clOrdId']} 下单结果未知且查单失败: {response}")
+            leg.result = {'ok': False, 'ordId': '', 'clOrdId': leg.params['clOrdId'], 'sCode': UNKNOWN_CODE,
+                          'sMsg': f"下单结果未知（{leg.code}），查单失败: {response.get('msg') or response}"}
+        return retry
+
+    def _send_chunk(self, trade_api, signer, account, chunk, final):
+        """发送一批订单，写入各腿结果；返回 (可直接重发的腿, 结果未知需查单的腿)"""
+        with self._lock:
+            self.requests += 1
+            self.legs += len(chunk)
+        response = None
+        if self.ws is not None:
+            try:
+                if len(chunk) == 1:
+                    response = self.ws.request(account, 'order', [chunk[0].params])
+                else:
+                    response = self.ws.request(account, 'batch-orders', [leg.params for leg in chunk])
+                with self._lock:
+                    self.ws_requests += 1
+            except WsNotSent as e:
+                logger.warning(f"账号 {account['account_name']} WebSocket 下单未发出，改用 REST: {e}")
+                with self._lock:
+                    self.rest_fallbacks += 1
+            except WsOutcomeUnknown as e:
+                response = {'code': UNKNOWN_CODE, 'msg': str(e), 'data': []}
+        if response is None:
+            try:
+                if len(chunk) == 1:
+                    response = self._post(trade_api, signer, ORDER_PATH, chunk[0].params)
+                else:
+                    response = self._post(trade_api, signer, BATCH_ORDERS_PATH, [leg.params for leg in chunk])
+            except _NOT_SENT_ERRORS as e:
+                response = {'code': NOT_SENT_CODE, 'msg': f"请求未发出: {e!r}", 'data': []}
+            except Exception as e:
+                # 读超时、连接中断、响应无法解析：请求可能已被交易所受理
+                response = {'code': UNKNOWN_CODE, 'msg': f"请求异常: {e!r}", 'data': []}
+        items = {item.get('clOrdId'): item for item in response.get('data') or []}
+        retry, unknown = [], []
+        for leg in chunk:
+            item = items.get(leg.params['clOrdId'])
+            if item is None and len(chunk) == 1 and response.get('data'):
+                item = response['data'][0]
+            if item is None:
+                code, msg, ord_id = response.get('code', ''), response.get('msg', ''), ''
+            else:
+                code, msg, ord_id = item.get('sCode', ''), item.get('sMsg', ''), item.get('ordId', '')
+            if code == '0':
+                leg.result = {'ok': True, 'ordId': ord_id, 'clOrdId': leg.params['clOrdId'], 'sCode': code, 'sMsg': msg}
+                continue
+            if code == UNKNOWN_CODE or code in UNKNOWN_OUTCOME_CODES:
+                leg.code = code
+                unknown.append(leg)
+                continue
+            if (code == NOT_SENT_CODE or code in RETRYABLE_CODES) and not final:
+                leg.code = code
+                retry.append(leg)
+                continue
+            with self._lock:
+                self.failed_legs += 1
+            leg.result = {'ok': False, 'ordId': ord_id, 'clOrdId': leg.params['clOrdId'], 'sCode': code,
+                          'sMsg': msg or str(response)}
+        return retry, unknown
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'legs': self.legs,
+            'retried_legs': self.retried_legs,
+            'failed_legs': self.failed_legs,
+            'lookups': self.lookups,
+            'unknown_legs': self.unknown_legs,
+            'encode_sign_avg_us': round(self.encode_total_us / self.encode_count, 1) if self.encode_count else None,
+            'encode_sign_max_us': round(self.encode_max_us, 1),
+            'clock_resyncs': self.clock_resyncs,
+            'clock': self.clock.stats(),
+            'ws_requests': self.ws_requests,
+            'rest_fallbacks': self.rest_fallbacks
+        }
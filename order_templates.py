@@ -0,0 +1,173 @@
+"""
+下单参数模板
+
+启动时按 (账号, 币种, 动作) 预先生成开仓订单的静态部分：instId、side/posSide、
+按 lotSz 取整后的下单数量、止盈止损的比例和固定字段。信号到达后只需填入
+按 tickSz 取整的价格、止盈止损价和两个 clOrdId，不再逐单查配置、拼字典；
+价格只与 (合约, 动作) 有关，同一信号的所有账号共用一次取整结果。
+合约精度刷新后调用 rebuild() 重新生成。
+"""
+import itertools
+import logging
+import os
+import time
+
+logger = logging.getLogger('tg_bot')
+
+# 止盈 1%，止损 2.7%
+TAKE_PROFIT_RATIO = 0.01
+STOP_LOSS_RATIO = 0.027
+# 动作 -> (side, posSide, 止盈系数, 止损系数)
+ACTIONS = {
+    '做多': ('buy', 'long', 1 + TAKE_PROFIT_RATIO, 1 - STOP_LOSS_RATIO),
+    '做空': ('sell', 'short', 1 - TAKE_PROFIT_RATIO, 1 + STOP_LOSS_RATIO)
+}
+DEFAULT_QTY = '0.01'
+
+class ClOrdIdFactory:
+    """
+    生成与 okx_utils.generate_clord_id 同格式的 clOrdId：前缀 + 秒级时间 + 6 位后缀。
+    时间串每秒只格式化一次；后缀为 3 位进程级随机串加 3 位自增序号，同一秒内不会重复
+    """
+    _ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+    def __init__(self):
+        self._salt = ''.join(self._ALPHABET[b % 62] for b in os.urandom(3))
+        self._counter = itertools.count()
+        self._second = 0
+        self._stamp = ''
+
+    def __call__(self, prefix='ORD'):
+        now = int(time.time())
+        if now != self._second:
+            self._stamp = time.strftime('%Y%m%d%H%M%S', time.localtime(now))
+            self._second = now
+        n = next(self._counter) % 238328
+        suffix = self._ALPHABET[n // 3844] + self._ALPHABET[n // 62 % 62] + self._ALPHABET[n % 62]
+        return f"{prefix}{self._stamp}{self._salt}{suffix}"[:32]
+
+next_clord_id = ClOrdIdFactory()
+
+class _PriceRule:
+    """
+    同一 (合约, 动作) 的所有账号共用：委托价、止盈价、止损价只与行情价有关，
+    一个信号只按 tickSz 取整一次，其余账号直接复用
+    """
+    __slots__ = ('inst_id', 'tp_factor', 'sl_factor', '_instruments', '_last')
+
+    def __init__(self, inst_id, tp_factor, sl_factor, instruments=None):
+        self.inst_id = inst_id
+        self.tp_factor = tp_factor
+        self.sl_factor = sl_factor
+        self._instruments = instruments
+        self._last = (None, None)
+
+    def _round(self, value):
+        if self._instruments is None:
+            return str(round(value, 2))
+        return str(self._instruments.round_price(self.inst_id, value))
+
+    def prices(self, market_price):
+        """返回 (委托价, 止盈价, 止损价) 字符串"""
+        last_price, last = self._last
+        if last_price == market_price:
+            return last
+        result = (self._round(market_price), self._round(market_price * self.tp_factor),
+                  self._round(market_price * self.sl_factor))
+        # 整体替换，多线程读到的总是同一组
+        self._last = (market_price, result)
+        return result
+
+class OrderTemplate:
+    """单个 (账号, 合约, 动作) 的开仓订单模板"""
+    __slots__ = ('inst_id', 'side', 'pos_side', 'size', 'error', '_rule')
+
+    def __init__(self, inst_id, action, qty, instruments=None, rule=None):
+        self.inst_id = inst_id
+        self.side, self.pos_side, tp_factor, sl_factor = ACTIONS[action]
+        self._rule = rule or _PriceRule(inst_id, tp_factor, sl_factor, instruments)
+        self.error = None
+        try:
+            self.size = str(instruments.quantize_size(inst_id, qty)) if instruments is not None else str(qty)
+        except ValueError as e:
+            # 数量低于最小下单量：模板照常生成，使用时再报错，与逐单构建时的行为一致
+            self.size = str(qty)
+            self.error = str(e)
+
+    def build(self, market_price, prefix='ORD'):
+        """填入价格与 clOrdId，返回与 okx_utils.build_order_params 相同结构的下单参数"""
+        if self.error:
+            raise ValueError(self.error)
+        px, tp, sl = self._rule.prices(market_price)
+        return {
+            "instId": self.inst_id,
+            "tdMode": "cross",
+            "side": self.side,
+            "ordType": "limit",
+            "px": px,
+            "sz": self.size,
+            "clOrdId": next_clord_id(prefix),
+            "posSide": self.pos_side,
+            "attachAlgoOrds": [{
+                "attachAlgoClOrdId": next_clord_id(prefix),
+                "tpTriggerPx": tp,
+                "tpOrdPx": "-1",
+                "tpOrdKind": "condition",
+                "slTriggerPx": sl,
+                "slOrdPx": "-1",
+                "tpTriggerPxType": "last",
+                "slTriggerPxType": "last"
+            }]
+        }
+
+class OrderTemplateBook:
+    """所有账号的订单模板，读操作无锁（整体替换）"""
+
+    def __init__(self, instruments=None):
+        self.instruments = instruments
+        self._accounts = []
+        self._symbols = []
+        self._templates = {}
+        self._rules = {}
+        self.misses = 0
+
+    def _make(self, account, symbol, action):
+        inst_id = f"{symbol.upper()}-USDT-SWAP"
+        rule = self._rules.get((inst_id, action))
+        if rule is None:
+            _, _, tp_factor, sl_factor = ACTIONS[action]
+            rule = self._rules.setdefault((inst_id, action), _PriceRule(inst_id, tp_factor, sl_factor, self.instruments))
+        return OrderTemplate(inst_id, action, account['FIXED_QTY'].get(symbol, DEFAULT_QTY), self.instruments, rule)
+
+    def build(self, accounts, symbols):
+        """为给定账号和币种生成全部模板"""
+        self._accounts = list(accounts)
+        self._symbols = [symbol.upper() for symbol in symbols]
+        self.rebuild()
+
+    def rebuild(self):
+        """合约精度变化后重新生成"""
+        self._rules = {}
+        templates = {}
+        for account in self._accounts:
+            for symbol in self._symbols:
+                for action in ACTIONS:
+                    templates[(account['account_name'], symbol, action)] = self._make(account, symbol, action)
+        self._templates = templates
+        invalid = [key for key, template in templates.items() if template.error]
+        logger.info(f"下单模板已生成: {len(templates)} 个" + (f"，{len(invalid)} 个数量低于最小下单量" if invalid else ""))
+
+    def get(self, account, symbol, action):
+        """返回模板；不支持的动作返回 None，未预生成的币种按需生成并缓存"""
+        key = (account['account_name'], symbol, action)
+        template = self._templates.get(key)
+        if template is None:
+            if action not in ACTIONS:
+                return None
+            self.misses += 1
+            template = self._make(account, symbol, action)
+            self._templates = {**self._templates, key: template}
+        return template
+
+    def stats(self) -> dict:
+        return {'templates': len(self._templates), 'misses': self.misses}
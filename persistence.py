@@ -0,0 +1,214 @@
+"""
+写后持久化：订单、消息、系统日志先进入内存队列，由后台线程批量写入 SQLite
+
+- 交易路径只做一次入队，不再为每一行单独开会话、提交、fsync
+- 后台线程按刷新间隔或批量大小攒批，一个事务内按表 executemany 批量插入
+- 写入失败时整批重试，超过次数后丢弃并记录错误
+- 队列已满时退化为调用方线程同步写入，保证记录不丢
+- 进程退出前 stop() 把队列中剩余的记录全部刷盘
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from database import DatabaseManager
+from models import TradingOrder
+
+logger = logging.getLogger('tg_bot')
+
+# 刷新间隔（秒）与单次事务最多写入的行数
+PERSIST_FLUSH_INTERVAL = float(os.getenv('PERSIST_FLUSH_INTERVAL', '0.5'))
+PERSIST_BATCH_SIZE = int(os.getenv('PERSIST_BATCH_SIZE', '200'))
+PERSIST_QUEUE_SIZE = int(os.getenv('PERSIST_QUEUE_SIZE', '10000'))
+# 单批写入失败后的重试次数
+PERSIST_MAX_RETRIES = 3
+
+_STOP = object()
+
+class _FlushRequest:
+    """插入队列的刷盘请求，写到它时说明之前入队的记录都已处理"""
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+class PersistenceWriter:
+    """后台批量写入器"""
+
+    def __init__(self, file_manager=None, flush_interval: float = PERSIST_FLUSH_INTERVAL,
+                 batch_size: int = PERSIST_BATCH_SIZE, max_queue: int = PERSIST_QUEUE_SIZE):
+        # 传入 file_manager 时，订单记录写库后同时追加到订单日志文件
+        self.file_manager = file_manager
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+        self.sync_writes = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+        self._next_ids = {}
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(f"持久化写入器已启动: 刷新间隔 {self.flush_interval}s, 批量 {self.batch_size}")
+
+    def stop(self, timeout: float = 10):
+        """停止后台线程，退出前写完队列中的所有记录"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._queue.put(_STOP)
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            logger.error(f"持久化写入器未能在 {timeout}s 内退出，剩余 {self._queue.qsize()} 条记录")
+        else:
+            logger.info(f"持久化写入器已停止: {self.stats()}")
+
+    def flush(self, timeout: float = 10) -> bool:
+        """阻塞直到此前入队的记录全部写入；不能在事件循环中直接调用"""
+        if self._thread is None:
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    # ---------- 主键预分配 ----------
+    def seed_ids(self, *models):
+        """从库中当前最大 id 初始化预分配计数器（启动时调用，避免首次分配时查库）"""
+        with DatabaseManager() as db:
+            current = {model: db.get_max_id(model) for model in models}
+        with self._lock:
+            for model, max_id in current.items():
+                self._next_ids[model] = max(self._next_ids.get(model, 0), max_id)
+
+    def allocate_id(self, model) -> int:
+        """
+        为即将入队的记录预分配主键，写入前即可用于关联（如订单关联触发它的消息）；
+        要求该表只由本进程写入
+        """
+        if model not in self._next_ids:
+            self.seed_ids(model)
+        with self._lock:
+            self._next_ids[model] += 1
+            return self._next_ids[model]
+
+    # ---------- 入队 ----------
+    def submit(self, model, row: dict):
+        """提交一行待写入记录；未设置 timestamp 时以入队时间为准"""
+        if 'timestamp' not in row and hasattr(model, 'timestamp'):
+            row = dict(row, timestamp=datetime.utcnow())
+        item = (model, row)
+        if self._thread is None:
+            self._write_batch([item])
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.warning("持久化队列已满，改为同步写入")
+            self.sync_writes += 1
+            self._write_batch([item])
+            return
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    # ---------- 后台写入 ----------
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, waiters = [], []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, _FlushRequest):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                # 停止或刷盘请求立即写入；否则攒够批量或到达刷新间隔再写
+                if stopping or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if stopping:
+                # 取出停止标记之后仍可能有记录入队（同步退化路径除外）
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _FlushRequest):
+                        waiters.append(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+            for start in range(0, len(batch), self.batch_size):
+                self._write_batch(batch[start:start + self.batch_size])
+            for waiter in waiters:
+                waiter.done.set()
+
+    def _write_batch(self, batch):
+        rows_by_model = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+        for attempt in range(1, PERSIST_MAX_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                with DatabaseManager() as db:
+                    written = db.bulk_insert(rows_by_model)
+                break
+            except Exception as e:
+                logger.error(f"批量写入数据库失败（第 {attempt} 次）: {e}")
+                if attempt == PERSIST_MAX_RETRIES:
+                    with self._lock:
+                        self.failed += len(batch)
+                    logger.error(f"放弃写入 {len(batch)} 条记录")
+                    return
+                time.sleep(0.2 * attempt)
+        with self._lock:
+            self.written += written
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+        if self.file_manager is not None:
+            for row in rows_by_model.get(TradingOrder, []):
+                try:
+                    self.file_manager.write_order_log(row)
+                except Exception as e:
+                    logger.error(f"记录订单信息到文件失败: {e}")
+
+    def stats(self) -> dict:
+        """队列深度与写入统计"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'flushes': self.flushes,
+            'failed': self.failed,
+            'sync_writes': self.sync_writes,
+            'last_flush_ms': round(self.last_flush_ms, 2)
+        }
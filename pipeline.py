@@ -0,0 +1,327 @@
+"""
+信号处理流水线
+
+消息按阶段流转：ingest（handler 入队）→ parse → dedup → risk → execute → notify → persist，
+阶段之间用有界 asyncio.Queue 连接，队列满时上游等待（背压）。
+
+- 每个阶段是一个 async 函数 ctx -> ctx，返回 None 表示该消息不再往下游传递
+- low_priority 阶段（通知、持久化）只在没有消息处于高优先级阶段时才处理，
+  保证下单永远排在日志群组发送、Bark 推送和写库之前
+- 每个阶段统计处理耗时与队列深度
+- 交易信号走快速路径：handler 内直接依次执行 parse → execute，不经过队列跳转，
+  下单完成后再交给 notify 阶段；每条信号记录 收到 → 解析 → 发单 → 回报 的时间线
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger('tg_bot')
+
+# 各阶段队列长度上限
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '100'))
+# 下单阶段并发处理的信号数
+PIPELINE_EXECUTE_WORKERS = int(os.getenv('PIPELINE_EXECUTE_WORKERS', '4'))
+# 停止时等待队列排空的最长时间（秒）
+PIPELINE_DRAIN_TIMEOUT = 10
+
+# 保留最近多少条信号的时间线用于统计
+TIMELINE_HISTORY = 256
+# 跨群组重复信号：同一指纹在多少秒内视为重复（0 关闭）
+SIGNAL_DEDUP_TTL = float(os.getenv('SIGNAL_DEDUP_TTL', '10'))
+# 价格分桶的相对宽度，0.002 即 0.2%
+SIGNAL_DEDUP_PRICE_BUCKET = float(os.getenv('SIGNAL_DEDUP_PRICE_BUCKET', '0.002'))
+# 指纹缓存上限
+SIGNAL_DEDUP_MAX_SIZE = 1024
+
+class SignalTimeline:
+    """单条信号的处理时间线（perf_counter 时间点），回报按账号分别记录"""
+    __slots__ = ('marks', 'acks')
+
+    def __init__(self):
+        self.marks = {'received': time.perf_counter()}
+        self.acks = {}
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter()
+
+    def ack(self, account_name):
+        """某个账号收到交易所回报（在线程池中调用）"""
+        self.acks[account_name] = time.perf_counter()
+
+    def summary(self) -> dict:
+        """各时间点相对收到消息的毫秒数"""
+        received = self.marks['received']
+        summary = {name: round((at - received) * 1000, 2) for name, at in self.marks.items() if name != 'received'}
+        if self.acks:
+            summary['first_ack'] = round((min(self.acks.values()) - received) * 1000, 2)
+            summary['last_ack'] = round((max(self.acks.values()) - received) * 1000, 2)
+        return summary
+
+class SignalContext:
+    """一条 Telegram 消息在流水线中的上下文，各阶段在其上读写结果"""
+    __slots__ = ('event', 'chat_id', 'tg_message_id', 'text', 'sender_name', 'shanghai_time', 'timeline',
+                 'signal', 'message_data', 'message_id', 'market_price', 'results', 'skip_reason', 'error')
+
+    def __init__(self, chat_id, tg_message_id, text, sender_name=None, shanghai_time='', event=None):
+        self.timeline = SignalTimeline()
+        # 保留原始事件，发送者等信息在下单之后再解析
+        self.event = event
+        self.chat_id = chat_id
+        self.tg_message_id = tg_message_id
+        self.text = text or ''
+        self.sender_name = sender_name
+        self.shanghai_time = shanghai_time
+        self.signal = None
+        self.message_data = None
+        self.message_id = None
+        self.market_price = None
+        self.results = None
+        self.skip_reason = None
+        self.error = None
+
+class RecentKeys:
+    """最近见过的键（有上限，超出后淘汰最旧的），用于丢弃重复投递的消息"""
+
+    def __init__(self, maxlen: int = 4096):
+        self.maxlen = maxlen
+        self._keys = OrderedDict()
+
+    def add(self, key) -> bool:
+        """记录 key；已存在时返回 False"""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.maxlen:
+            self._keys.popitem(last=False)
+        return True
+
+class SignalFingerprints:
+    """
+    跨群组重复信号识别：指纹为 (类型, 方向, 币种, 价格桶)，带 TTL 的有界 LRU 缓存。
+    价格按相对宽度做对数分桶，查找时同时比较相邻桶，避免价格刚好落在桶边界两侧时漏判；
+    同一群组内的相同信号不视为重复（重复投递的同一条消息由 RecentKeys 处理）
+    """
+
+    def __init__(self, ttl: float = SIGNAL_DEDUP_TTL, bucket: float = SIGNAL_DEDUP_PRICE_BUCKET,
+                 maxlen: int = SIGNAL_DEDUP_MAX_SIZE):
+        self.ttl = ttl
+        self.maxlen = maxlen
+        self._log_step = math.log1p(bucket) if bucket > 0 else None
+        # 指纹 -> (过期时间, 首次发出的群组)；TTL 固定，插入顺序即过期顺序
+        self._entries = OrderedDict()
+        self.suppressed = {}
+
+    def _bucket(self, price):
+        if not price or price <= 0 or self._log_step is None:
+            return None
+        return math.floor(math.log(price) / self._log_step)
+
+    def _expire(self, now):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def check(self, signal, chat_id):
+        """
+        记录信号指纹；TTL 内已有其他群组发出过相同信号时返回该群组 id 并计数，否则返回 None
+        """
+        if self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        self._expire(now)
+        base = (signal.kind, signal.side or signal.action, signal.symbol)
+        bucket = self._bucket(signal.price)
+        candidates = [bucket] if bucket is None else [bucket, bucket - 1, bucket + 1]
+        for candidate in candidates:
+            entry = self._entries.get(base + (candidate,))
+            if entry is not None and entry[1] != chat_id:
+                self.suppressed[chat_id] = self.suppressed.get(chat_id, 0) + 1
+                return entry[1]
+        key = base + (bucket,)
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl, chat_id)
+        if len(self._entries) > self.maxlen:
+            self._entries.popitem(last=False)
+        return None
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'suppressed': dict(self.suppressed)}
+
+class Stage:
+    """流水线的一个阶段"""
+
+    def __init__(self, name, func, workers: int = 1, maxsize: int = PIPELINE_QUEUE_SIZE, low_priority: bool = False):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.maxsize = maxsize
+        self.low_priority = low_priority
+        self.queue = None
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.max_depth = 0
+
+    def record(self, elapsed_ms):
+        self.processed += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    def stats(self, reset=False) -> dict:
+        stats = {
+            'depth': self.queue.qsize() if self.queue else 0,
+            'max_depth': self.max_depth,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.processed, 2) if self.processed else 0.0,
+            'max_ms': round(self.max_ms, 2)
+        }
+        if reset:
+            self.processed = self.dropped = self.errors = 0
+            self.total_ms = self.max_ms = 0.0
+            self.max_depth = 0
+        return stats
+
+class SignalPipeline:
+    """由有界队列串联的多阶段处理流水线"""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._tasks = []
+        # 处于高优先级阶段（排队或处理中）的消息数，为 0 时低优先级阶段才能运行
+        self._urgent = 0
+        self._idle = None
+        self._timelines = deque(maxlen=TIMELINE_HISTORY)
+
+    async def start(self):
+        """在当前事件循环中创建队列与工作协程"""
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._urgent = 0
+        for index, stage in enumerate(self.stages):
+            stage.queue = asyncio.Queue(maxsize=stage.maxsize)
+            for n in range(stage.workers):
+                self._tasks.append(asyncio.create_task(self._worker(index, stage), name=f"pipeline-{stage.name}-{n}"))
+        logger.info(f"信号流水线已启动: {' → '.join(stage.name for stage in self.stages)}")
+
+    async def submit(self, ctx):
+        """消息进入流水线；第一个阶段队列满时等待"""
+        first = self.stages[0]
+        if not first.low_priority:
+            self._enter_urgent()
+        await self._put(first, ctx)
+
+    async def run_inline(self, ctx, through):
+        """
+        快速路径：在调用方协程中直接依次执行各阶段直到 through（含），
+        再把结果交给下一个阶段的队列；执行期间低优先级阶段同样让路
+        """
+        self._enter_urgent()
+        try:
+            for index, stage in enumerate(self.stages):
+                start = time.perf_counter()
+                try:
+                    ctx = await stage.func(ctx)
+                except Exception as e:
+                    stage.errors += 1
+                    logger.error(f"流水线阶段 {stage.name} 处理异常: {e}", exc_info=True)
+                    ctx = None
+                stage.record((time.perf_counter() - start) * 1000)
+                if ctx is None:
+                    stage.dropped += 1
+                    return
+                if stage.name == through:
+                    break
+        finally:
+            self._leave_urgent()
+        if index + 1 < len(self.stages):
+            await self._put(self.stages[index + 1], ctx)
+
+    async def stop(self, timeout: float = PIPELINE_DRAIN_TIMEOUT):
+        """等待已入队的消息处理完（最多 timeout 秒），然后停止工作协程"""
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"信号流水线 {timeout}s 内未排空，剩余: {self.stats()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self):
+        for stage in self.stages:
+            await stage.queue.join()
+
+    def _enter_urgent(self):
+        self._urgent += 1
+        self._idle.clear()
+
+    def _leave_urgent(self):
+        self._urgent -= 1
+        if self._urgent <= 0:
+            self._urgent = 0
+            self._idle.set()
+
+    async def _put(self, stage, ctx):
+        await stage.queue.put(ctx)
+        depth = stage.queue.qsize()
+        if depth > stage.max_depth:
+            stage.max_depth = depth
+
+    async def _worker(self, index, stage):
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            ctx = await stage.queue.get()
+            try:
+                if stage.low_priority:
+                    # 有消息在下单等高优先级阶段时先让路
+                    await self._idle.wait()
+                start = time.perf_counter()
+                try:
+                    result = await stage.func(ctx)
+                except Exception as e:
+                    stage.errors += 1
+                    logger.error(f"流水线阶段 {stage.name} 处理异常: {e}", exc_info=True)
+                    result = None
+                stage.record((time.perf_counter() - start) * 1000)
+                if result is None:
+                    stage.dropped += 1
+                    if not stage.low_priority:
+                        self._leave_urgent()
+                    continue
+                if next_stage is None:
+                    if not stage.low_priority:
+                        self._leave_urgent()
+                    continue
+                if not stage.low_priority and next_stage.low_priority:
+                    self._leave_urgent()
+                await self._put(next_stage, result)
+            finally:
+                stage.queue.task_done()
+
+    def record_timeline(self, ctx):
+        """记录一条已执行信号的时间线"""
+        summary = ctx.timeline.summary()
+        self._timelines.append(summary)
+        return summary
+
+    def timeline_stats(self) -> dict:
+        """最近信号 收到 → 全部回报 的耗时中位数与最大值（毫秒）"""
+        totals = sorted(t['last_ack'] for t in self._timelines if 'last_ack' in t)
+        if not totals:
+            return {'signals': 0, 'p50_ms': 0.0, 'max_ms': 0.0}
+        return {'signals': len(totals), 'p50_ms': totals[len(totals) // 2], 'max_ms': totals[-1]}
+
+    def stats(self, reset=False) -> dict:
+        """各阶段的队列深度与耗时统计"""
+        return {stage.name: stage.stats(reset) for stage in self.stages}
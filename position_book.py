@@ -0,0 +1,327 @@
+"""
+持仓簿：通过 OKX 私有 WebSocket 在内存中维护每个账号的持仓
+
+- 后台线程运行独立事件循环，每个账号一条私有连接：登录后订阅 positions 与 orders（SWAP）
+- 订阅成功后用 REST get_positions 拉一次快照作为基线，之后按 positions 推送增量更新
+  （eventType=snapshot 的全量推送会替换整本，按 uTime 丢弃比当前更旧的条目）
+- 缺口处理：orders 频道报告成交后，对应合约在收到更新的 positions 推送前标记为“待确认”，
+  查询返回 None 让调用方回退 REST；超过 POSITION_GAP_TIMEOUT 仍未确认则重新拉 REST 快照；
+  断线期间整本视为不可用，重连后重新拉快照
+- 平仓下单后调用方应 invalidate()，直到持仓推送确认前不再使用内存数据
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+logger = logging.getLogger('tg_bot')
+
+# 未设置时按账号 FLAG 选择实盘或模拟盘地址；测试时可指向本地替身
+OKX_WS_PRIVATE_URL = os.getenv('OKX_WS_PRIVATE_URL')
+_LIVE_PRIVATE_URL = 'wss://ws.okx.com:8443/ws/v5/private'
+_DEMO_PRIVATE_URL = 'wss://wspap.okx.com:8443/ws/v5/private'
+# 成交后多久仍未收到持仓推送则重新拉 REST 快照（秒）
+POSITION_GAP_TIMEOUT = float(os.getenv('POSITION_GAP_TIMEOUT', '2'))
+# 定期用 REST 快照校准（秒）
+POSITION_RESYNC_INTERVAL = float(os.getenv('POSITION_RESYNC_INTERVAL', '300'))
+WS_PING_INTERVAL = 20
+WS_RECONNECT_MAX_DELAY = 30
+WS_LOGIN_TIMEOUT = 10
+
+def private_ws_url(account, url=None):
+    """私有频道地址：显式配置优先，否则按账号 FLAG 选择实盘或模拟盘"""
+    if url:
+        return url
+    return _DEMO_PRIVATE_URL if str(account.get('FLAG')) == '1' else _LIVE_PRIVATE_URL
+
+def private_ws_headers(account, url=None):
+    """连接 OKX 模拟盘私有频道需要的额外请求头；本地替身不需要"""
+    if str(account.get('FLAG')) == '1' and not url:
+        return {'x-simulated-trading': '1'}
+    return None
+
+def login_args(account, timestamp=None):
+    """私有频道登录参数"""
+    timestamp = timestamp or str(int(time.time()))
+    digest = hmac.new(account['SECRET_KEY'].encode(), f"{timestamp}GET/users/self/verify".encode(), hashlib.sha256).digest()
+    return {
+        'apiKey': account['API_KEY'],
+        'passphrase': account['PASSPHRASE'],
+        'timestamp': timestamp,
+        'sign': base64.b64encode(digest).decode()
+    }
+
+async def ws_login(ws, account, timestamp=None):
+    """发送登录请求并等待结果，失败抛出 RuntimeError"""
+    await ws.send(json.dumps({'op': 'login', 'args': [login_args(account, timestamp)]}))
+    deadline = time.monotonic() + WS_LOGIN_TIMEOUT
+    while True:
+        raw = await asyncio.wait_for(ws.recv(), timeout=max(0.1, deadline - time.monotonic()))
+        message = json.loads(raw)
+        if message.get('event') == 'login':
+            if message.get('code') != '0':
+                raise RuntimeError(f"登录失败: {message}")
+            return
+        if message.get('event') == 'error':
+            raise RuntimeError(f"登录失败: {message}")
+
+def _utime(item):
+    try:
+        return int(item.get('uTime') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+class AccountBook:
+    """单个账号的持仓；持仓只由 WS 线程写入，读取方拿到的是整体替换的 dict；dirty 两边都会写，用锁保护"""
+
+    def __init__(self, account):
+        self.account = account
+        # (instId, posSide) -> 持仓字段（与 REST get_positions 的 data 条目同格式）
+        self.positions = {}
+        self.synced = False
+        self.synced_at = 0.0
+        # instId -> 标记时间（monotonic），这些合约的内存持仓暂不可信
+        self.dirty = {}
+        self.lock = threading.Lock()
+        # instId -> 最近一次持仓推送的 uTime，用于判断成交是否已反映在持仓里
+        self.inst_utime = {}
+        self._snapshot_pages = None
+        self.updates = 0
+
+    def replace(self, items, requested_at=None):
+        """整体替换；requested_at 为快照请求发出的时间，之后才打上的待确认标记快照未必反映，予以保留"""
+        positions = {}
+        inst_utime = {}
+        for item in items:
+            inst_utime[item['instId']] = max(inst_utime.get(item['instId'], 0), _utime(item))
+            if float(item.get('pos') or 0) != 0:
+                positions[(item['instId'], item['posSide'])] = item
+        self.positions = positions
+        self.inst_utime = inst_utime
+        with self.lock:
+            if requested_at is None:
+                self.dirty = {}
+            else:
+                self.dirty = {inst_id: since for inst_id, since in self.dirty.items() if since >= requested_at}
+        self.synced = True
+        self.synced_at = time.monotonic()
+
+    def mark_fill(self, order):
+        """成交晚于最近一次持仓推送时，该合约进入待确认状态"""
+        inst_id = order.get('instId')
+        if _utime(order) > self.inst_utime.get(inst_id, 0):
+            self.mark_dirty(inst_id)
+
+    def mark_dirty(self, inst_id):
+        with self.lock:
+            self.dirty.setdefault(inst_id, time.monotonic())
+
+    def apply(self, items):
+        positions = dict(self.positions)
+        for item in items:
+            key = (item.get('instId'), item.get('posSide'))
+            current = positions.get(key)
+            if current is not None and _utime(item) < _utime(current):
+                continue
+            inst_id = item.get('instId')
+            self.inst_utime[inst_id] = max(self.inst_utime.get(inst_id, 0), _utime(item))
+            if float(item.get('pos') or 0) == 0:
+                positions.pop(key, None)
+            else:
+                positions[key] = item
+            # 收到持仓推送即确认该合约的待确认状态
+            with self.lock:
+                self.dirty.pop(inst_id, None)
+        self.positions = positions
+        self.updates += 1
+
+class PositionBookService:
+    """OKX 私有 WebSocket 持仓订阅服务"""
+
+    def __init__(self, accounts, clients, url: str = OKX_WS_PRIVATE_URL,
+                 gap_timeout: float = POSITION_GAP_TIMEOUT, resync_interval: float = POSITION_RESYNC_INTERVAL):
+        self.clients = clients
+        self.url = url
+        self.gap_timeout = gap_timeout
+        self.resync_interval = resync_interval
+        self._books = {self._key(account): AccountBook(account) for account in accounts}
+        self._thread = None
+        self._loop = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.resyncs = 0
+        self.reconnects = 0
+
+    @staticmethod
+    def _key(account):
+        return account['API_KEY'], account['FLAG']
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        """启动后台订阅线程；未安装 websockets 时所有查询回退 REST"""
+        if websockets is None:
+            logger.warning("未安装 websockets，持仓簿不可用，平仓前将通过 REST 查询持仓")
+            return False
+        if not self._books:
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._thread_main, name='position-book', daemon=True)
+        self._thread.start()
+        logger.info(f"持仓簿已启动: {len(self._books)} 个账号")
+        return True
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._run())
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    # ---------- 连接 ----------
+    async def _run(self):
+        await asyncio.gather(*(self._run_account(book) for book in self._books.values()))
+
+    async def _run_account(self, book):
+        account = book.account
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(private_ws_url(account, self.url), ping_interval=None, close_timeout=2,
+                                              additional_headers=private_ws_headers(account, self.url)) as ws:
+                    await ws_login(ws, account)
+                    await ws.send(json.dumps({'op': 'subscribe', 'args': [
+                        {'channel': 'positions', 'instType': 'SWAP'},
+                        {'channel': 'orders', 'instType': 'SWAP'}
+                    ]}))
+                    # 订阅之后再拉快照：之后的推送都比快照新，不会漏掉中间的变化
+                    await self._resync(book)
+                    delay = 1
+                    logger.info(f"账号 {account['account_name']} 持仓 WebSocket 已连接")
+                    await self._consume(ws, book)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"账号 {account['account_name']} 持仓 WebSocket 连接异常: {e!r}")
+            finally:
+                book.synced = False
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WS_RECONNECT_MAX_DELAY)
+
+    async def _resync(self, book):
+        """用 REST 快照替换整本"""
+        account_api = self.clients.account(book.account)
+        requested_at = time.monotonic()
+        response = await asyncio.get_running_loop().run_in_executor(None, lambda: account_api.get_positions(instType='SWAP'))
+        if response.get('code') != '0':
+            raise RuntimeError(f"获取持仓快照失败: {response}")
+        book.replace(response.get('data') or [], requested_at)
+        self.resyncs += 1
+
+    async def _consume(self, ws, book):
+        last_recv = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=1)
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_recv > WS_PING_INTERVAL:
+                    await ws.send('ping')
+                    last_recv = time.monotonic()
+                await self._check_gaps(book)
+                continue
+            last_recv = time.monotonic()
+            if raw != 'pong':
+                self.handle_message(book, raw)
+            await self._check_gaps(book)
+
+    async def _check_gaps(self, book):
+        now = time.monotonic()
+        with book.lock:
+            dirty = list(book.dirty.items())
+        expired = [inst_id for inst_id, since in dirty if now - since > self.gap_timeout]
+        if expired or now - book.synced_at > self.resync_interval:
+            if expired:
+                logger.warning(f"账号 {book.account['account_name']} {expired} 成交后未收到持仓推送，重新拉取快照")
+            await self._resync(book)
+
+    # ---------- 数据处理 ----------
+    def handle_message(self, book, raw):
+        """解析一帧私有频道推送并更新持仓簿"""
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get('event') == 'error':
+            logger.error(f"账号 {book.account['account_name']} 私有频道错误: {message}")
+            return
+        data = message.get('data')
+        channel = message.get('arg', {}).get('channel')
+        if data is None:
+            return
+        if channel == 'positions':
+            if message.get('eventType') == 'snapshot':
+                # 全量推送可能分页，收齐最后一页后整体替换
+                pages = book._snapshot_pages or []
+                pages.extend(data)
+                if message.get('lastPage', True) in (True, 'true'):
+                    book._snapshot_pages = None
+                    book.replace(pages)
+                else:
+                    book._snapshot_pages = pages
+            else:
+                book.apply(data)
+        elif channel == 'orders':
+            for order in data:
+                if order.get('state') in ('filled', 'partially_filled'):
+                    book.mark_fill(order)
+
+    # ---------- 查询 ----------
+    def get_positions(self, account, inst_id):
+        """
+        返回该合约的非零持仓列表（与 REST get_positions 的 data 同格式）；
+        未同步、断线或该合约待确认时返回 None，由调用方回退 REST
+        """
+        book = self._books.get(self._key(account))
+        if book is None or not book.synced or inst_id in book.dirty:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [item for (item_inst, _), item in book.positions.items() if item_inst == inst_id]
+
+    def invalidate(self, account, inst_id):
+        """本地刚下了会改变持仓的订单，等持仓推送确认前不再使用内存数据"""
+        book = self._books.get(self._key(account))
+        if book is not None:
+            book.mark_dirty(inst_id)
+
+    def stats(self) -> dict:
+        return {
+            'synced': sum(1 for book in self._books.values() if book.synced),
+            'accounts': len(self._books),
+            'positions': sum(len(book.positions) for book in self._books.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'resyncs': self.resyncs,
+            'reconnects': self.reconnects
+        }
@@ -0,0 +1,135 @@
+"""
+增量补单检查
+
+- 持久化游标（bot_state.reconciler_cursor）记录已检查到的最后一条消息 id，
+  每次只读取游标之后的新信号消息，重启后不会重复检查已处理的消息
+- 实时 handler 通过 begin()/finish() 登记每条信号的处理结果，形成 消息 id -> 结果 的内存索引；
+  不在索引中的消息（如上一个进程处理的）按 trading_orders.source_message_id 精确判断是否已成功下单
+- 处理中或未超过宽限期的消息不检查，游标停在它之前，下个周期再看
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from database import DatabaseManager
+from executor import run_persistence
+from models import TelegramMessage
+
+logger = logging.getLogger('tg_bot')
+
+RECONCILE_INTERVAL = int(os.getenv('RECONCILE_INTERVAL', '60'))
+# 消息入库后至少等待多久才检查（秒），给实时处理和批量写库留出时间
+RECONCILE_GRACE_SECONDS = int(os.getenv('RECONCILE_GRACE_SECONDS', '30'))
+# 只补最近多少小时内的信号
+RECONCILE_LOOKBACK_HOURS = float(os.getenv('RECONCILE_LOOKBACK_HOURS', '2'))
+# 处理超过该时长仍未结束的信号视为已中断（秒），不再阻塞游标
+RECONCILE_INFLIGHT_TIMEOUT = 600
+RECONCILE_BATCH_SIZE = 500
+CURSOR_KEY = 'reconciler_cursor'
+# 内存结果索引保留的消息数
+_MAX_OUTCOMES = 4096
+
+class SignalReconciler:
+    """基于游标的增量补单检查器"""
+
+    def __init__(self, writer, patch_open, patch_close):
+        # patch_open/patch_close: async (msg) -> bool，补单/补平仓并返回是否成功
+        self.writer = writer
+        self.patch_open = patch_open
+        self.patch_close = patch_close
+        self.cursor = None
+        self._inflight = {}
+        self._outcomes = OrderedDict()
+        self.checked = 0
+        self.patched = 0
+
+    # ---------- 实时 handler 登记 ----------
+    def begin(self, message_id):
+        """信号开始处理"""
+        self._inflight[message_id] = time.monotonic()
+
+    def finish(self, message_id, ok=None):
+        """
+        信号处理结束；ok 为是否已成功执行。
+        ok 为 None 表示结果未知（如处理中途异常），交由数据库中的关联订单判断
+        """
+        self._inflight.pop(message_id, None)
+        if ok is None:
+            return
+        self._outcomes[message_id] = ok
+        self._outcomes.move_to_end(message_id)
+        while len(self._outcomes) > _MAX_OUTCOMES:
+            self._outcomes.popitem(last=False)
+
+    # ---------- 数据库读写（在持久化线程池中执行） ----------
+    def _fetch(self, since):
+        # 先把尚未落盘的消息和订单写完，保证读到最新状态
+        self.writer.flush()
+        with DatabaseManager() as db:
+            if self.cursor is None:
+                value = db.get_state(CURSOR_KEY)
+                if value is None:
+                    # 首次启用：从当前最新消息开始，不回补历史（旧订单没有消息关联）
+                    self.cursor = db.get_max_id(TelegramMessage)
+                    db.set_state(CURSOR_KEY, str(self.cursor))
+                    logger.info(f"补单检查游标初始化为 {self.cursor}")
+                else:
+                    self.cursor = int(value)
+            messages = db.get_signal_messages_after(self.cursor, since, limit=RECONCILE_BATCH_SIZE)
+            unknown = [msg['id'] for msg in messages if msg['id'] not in self._outcomes]
+            executed = db.get_executed_message_ids(unknown)
+        return messages, executed
+
+    def _save_cursor(self, cursor):
+        with DatabaseManager() as db:
+            db.set_state(CURSOR_KEY, str(cursor))
+
+    # ---------- 检查 ----------
+    async def tick(self):
+        """检查游标之后的新信号，补上未成功执行的，并推进游标"""
+        now = datetime.utcnow()
+        since = now - timedelta(hours=RECONCILE_LOOKBACK_HOURS)
+        messages, executed = await run_persistence(self._fetch, since)
+        cursor = self.cursor
+        for msg in messages:
+            message_id = msg['id']
+            if self._is_inflight(message_id) or (now - msg['timestamp']).total_seconds() < RECONCILE_GRACE_SECONDS:
+                break
+            ok = self._outcomes.get(message_id)
+            if ok is None:
+                ok = message_id in executed
+            # 只补开仓和平仓信号，其他类型（如跨群组的重复信号）只推进游标
+            patch = {'交易信号': self.patch_open, '平仓信号': self.patch_close}.get(msg['signal_type'])
+            if not ok and patch is not None:
+                self.begin(message_id)
+                try:
+                    ok = await patch(msg)
+                    self.patched += 1
+                finally:
+                    self.finish(message_id, bool(ok))
+            self.checked += 1
+            cursor = message_id
+        if cursor != self.cursor:
+            await run_persistence(self._save_cursor, cursor)
+            self.cursor = cursor
+
+    def _is_inflight(self, message_id):
+        started = self._inflight.get(message_id)
+        if started is None:
+            return False
+        if time.monotonic() - started > RECONCILE_INFLIGHT_TIMEOUT:
+            logger.warning(f"消息 {message_id} 处理超时未结束，按关联订单判断是否补单")
+            self._inflight.pop(message_id, None)
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'cursor': self.cursor,
+            'inflight': len(self._inflight),
+            'outcomes': len(self._outcomes),
+            'checked': self.checked,
+            'patched': self.patched
+        }
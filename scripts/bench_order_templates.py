@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+下单参数构建基准：信号文本 → 各账号请求体字节
+对比逐单构建（动作分支 + 查 FIXED_QTY + okx_utils.build_order_params）与预生成模板，
+统计从解析信号到所有账号的请求体 JSON 编码完成的耗时；不发网络请求，
+行情价格逐个信号递增，合约精度用录制的 ETH/BTC 合约信息
+
+用法: python scripts/bench_order_templates.py [重复次数]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import okx_utils
+from instruments import InstrumentRegistry
+from order_templates import OrderTemplateBook
+from signal_parser import SignalMatcher
+
+SIGNAL_TEXT = "执行交易:做多 0.072ETH\n策略当前交易对:ETHUSDT.P\nETH价格:2633.96"
+MARKET_PRICE = 2634.77
+ACCOUNT_COUNTS = (1, 5, 50)
+INSTRUMENTS = [
+    {'instId': 'ETH-USDT-SWAP', 'tickSz': '0.01', 'lotSz': '0.01', 'minSz': '0.01', 'ctVal': '0.1'},
+    {'instId': 'BTC-USDT-SWAP', 'tickSz': '0.1', 'lotSz': '0.01', 'minSz': '0.01', 'ctVal': '0.01'}
+]
+
+class _FakePublic:
+    def get_instruments(self, instType):
+        return {'code': '0', 'data': INSTRUMENTS}
+
+class _FakeClients:
+    def public(self, flag='1'):
+        return _FakePublic()
+
+def make_accounts(count):
+    return [{'account_name': f'OKX{i}', 'FIXED_QTY': {'ETH': '0.1', 'BTC': '0.01'}} for i in range(1, count + 1)]
+
+def legacy_build(account, action, symbol, market_price, instruments):
+    """改造前 place_order 中构建下单参数的步骤"""
+    symbol_id = f"{symbol.upper()}-USDT-SWAP"
+    if action == '做多':
+        side, pos_side = 'buy', 'long'
+        take_profit, stop_loss = market_price * 1.01, market_price * (1 - 0.027)
+    else:
+        side, pos_side = 'sell', 'short'
+        take_profit, stop_loss = market_price * (1 - 0.01), market_price * (1 + 0.027)
+    qty = account['FIXED_QTY'].get(symbol, '0.01')
+    return okx_utils.build_order_params(symbol_id, side, market_price, qty, pos_side, take_profit, stop_loss,
+                                        instruments=instruments)
+
+def run(matcher, accounts, build, repeat):
+    """返回每个信号的耗时列表（us）"""
+    samples = []
+    for i in range(repeat):
+        # 每个信号的行情价不同，模板的价格取整不会跨信号复用
+        market_price = MARKET_PRICE + i * 0.01
+        start = time.perf_counter()
+        signal = matcher.parse(SIGNAL_TEXT)
+        bodies = [json.dumps(build(account, signal.action, signal.symbol, market_price)).encode() for account in accounts]
+        samples.append((time.perf_counter() - start) * 1e6)
+    assert len(bodies) == len(accounts)
+    return samples
+
+def summarize(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # 不使用解析缓存，每次都完整解析
+    matcher = SignalMatcher(cache_size=0)
+    instruments = InstrumentRegistry(_FakeClients())
+    instruments.refresh()
+
+    print(f"信号 → 请求体字节，每组 {repeat} 次（us/信号）")
+    print(f"{'账号数':<8}{'逐单 p50':>12}{'逐单 p99':>12}{'模板 p50':>12}{'模板 p99':>12}{'加速比':>10}")
+    for count in ACCOUNT_COUNTS:
+        accounts = make_accounts(count)
+        templates = OrderTemplateBook(instruments)
+        templates.build(accounts, ['ETH', 'BTC'])
+
+        # 两种方式生成的参数除 clOrdId 外必须一致
+        for account in accounts:
+            before = legacy_build(account, '做多', 'ETH', MARKET_PRICE, instruments)
+            after = templates.get(account, 'ETH', '做多').build(MARKET_PRICE)
+            for params in (before, after):
+                params.pop('clOrdId')
+                params['attachAlgoOrds'][0].pop('attachAlgoClOrdId')
+            assert before == after, f"模板参数与逐单构建不一致:\n{before}\n{after}"
+
+        legacy = run(matcher, accounts, lambda a, action, symbol, price: legacy_build(a, action, symbol, price, instruments), repeat)
+        templated = run(matcher, accounts, lambda a, action, symbol, price: templates.get(a, symbol, action).build(price), repeat)
+        legacy_p50, legacy_p99 = summarize(legacy)
+        templated_p50, templated_p99 = summarize(templated)
+        print(f"{count:<8}{legacy_p50:>12.1f}{legacy_p99:>12.1f}{templated_p50:>12.1f}{templated_p99:>12.1f}"
+              f"{legacy_p50 / templated_p50:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+信号解析微基准
+对比旧版逐条 re.search 的 extract_trade_info/extract_close_signal 与预编译匹配器，
+先校验两者在语料上的结果完全一致，再输出每条消息的平均解析耗时；
+最后一列为 parse_signal 缓存命中（同一条消息被补单检查再次解析）时的耗时
+
+用法: python scripts/bench_signal_parser.py [语料JSON路径] [重复次数]
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from signal_parser import SignalMatcher, parse_signal
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'data', 'signal_corpus.json')
+
+# ========== 旧版实现（与改造前 main.py 一致，去掉日志） ==========
+CLOSE_KEYWORDS = ['空止盈', '空止损', '多止盈', '多止损', '平多', '平空']
+
+def legacy_extract_trade_info(message):
+    if any(keyword in message for keyword in CLOSE_KEYWORDS):
+        return None, None
+    action_match = re.search(r"执行交易:(.+?)(?= \d+\.\d+\w+)", message)
+    symbol_match = re.search(r"策略当前交易对:(\w+USDT\.P)", message)
+    if action_match and symbol_match:
+        return action_match.group(1).strip(), symbol_match.group(1).split('USDT')[0]
+    long_patterns = [
+        r'做多\s*([A-Z]+)', r'([A-Z]+)\s*做多', r'买入\s*([A-Z]+)', r'([A-Z]+)\s*买入',
+        r'LONG\s*([A-Z]+)', r'([A-Z]+)\s*LONG', r'做多\s*\d+\.?\d*([A-Z]+)', r'([A-Z]+)\s*做多\s*\d+\.?\d*',
+        r'买入\s*\d+\.?\d*([A-Z]+)', r'([A-Z]+)\s*买入\s*\d+\.?\d*',
+    ]
+    short_patterns = [
+        r'做空\s*([A-Z]+)', r'([A-Z]+)\s*做空', r'卖出\s*([A-Z]+)', r'([A-Z]+)\s*卖出',
+        r'SHORT\s*([A-Z]+)', r'([A-Z]+)\s*SHORT', r'做空\s*\d+\.?\d*([A-Z]+)', r'([A-Z]+)\s*做空\s*\d+\.?\d*',
+        r'卖出\s*\d+\.?\d*([A-Z]+)', r'([A-Z]+)\s*卖出\s*\d+\.?\d*',
+    ]
+    for pattern in long_patterns:
+        match = re.search(pattern, message, re.IGNORECASE)
+        if match:
+            return '做多', match.group(1).upper()
+    for pattern in short_patterns:
+        match = re.search(pattern, message, re.IGNORECASE)
+        if match:
+            return '做空', match.group(1).upper()
+    return None, None
+
+def legacy_extract_close_signal(message):
+    if any(kw in message for kw in ['空止盈', '空止损', '平空']):
+        symbol_match = re.search(r'([A-Z]+)', message)
+        return 'short', symbol_match.group(1).upper().split('USDT')[0] if symbol_match else None
+    if any(kw in message for kw in ['多止盈', '多止损', '平多']):
+        symbol_match = re.search(r'([A-Z]+)', message)
+        return 'long', symbol_match.group(1).upper().split('USDT')[0] if symbol_match else None
+    return None, None
+
+def legacy_parse(message):
+    return legacy_extract_trade_info(message), legacy_extract_close_signal(message)
+
+# ========== 新版实现 ==========
+MATCHER = SignalMatcher()
+
+def compiled_parse(message):
+    kinds = MATCHER.keywords(message)
+    opened = MATCHER.match_open(message, kinds)
+    closed = MATCHER.match_close(message, kinds)
+    return (opened[:2] if opened else (None, None)), (closed[:2] if closed else (None, None))
+
+def bench(func, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1e6
+
+def main():
+    corpus_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        messages = json.load(f)
+
+    mismatches = [m for m in messages if legacy_parse(m) != compiled_parse(m)]
+    if mismatches:
+        for m in mismatches:
+            print(f"结果不一致: {m!r}\n  旧版: {legacy_parse(m)}\n  新版: {compiled_parse(m)}")
+        sys.exit(1)
+
+    signals = [m for m in messages if legacy_parse(m) != ((None, None), (None, None))]
+    chatter = [m for m in messages if m not in signals]
+    print(f"语料: {len(messages)} 条（信号 {len(signals)} 条，非信号 {len(chatter)} 条），结果一致")
+    print(f"{'分组':<8}{'旧版(us/条)':>14}{'新版(us/条)':>14}{'加速比':>10}{'缓存命中(us/条)':>18}")
+    for name, group in (('全部', messages), ('信号', signals), ('非信号', chatter)):
+        if not group:
+            continue
+        before = bench(legacy_parse, group, repeat)
+        after = bench(compiled_parse, group, repeat)
+        cached = bench(parse_signal, group, repeat)
+        print(f"{name:<8}{before:>14.2f}{after:>14.2f}{before / after:>9.1f}x{cached:>18.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+SQLite 读写并发基准
+模拟 main.py（写进程）与 api.py（读进程）同时访问同一个库：
+一个写进程按单笔事务插入订单，若干读进程反复执行 API 的订单列表查询，
+分别在默认配置（回滚日志）和 models.make_engine 调优配置（WAL 等）下运行，输出吞吐与锁冲突次数
+
+用法: python scripts/bench_sqlite_concurrency.py [持续秒数] [读进程数]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORK_DIR = tempfile.mkdtemp(prefix='bench_sqlite_')
+# models 导入时会按 DATABASE_URL 创建默认引擎，指向临时目录避免碰到真实数据
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'unused.db')}"
+
+from sqlalchemy import create_engine, select, text
+from models import Base, TradingOrder, make_engine
+
+SEED_ROWS = 5000
+
+def build_engine(profile, url, read_only=False):
+    if profile == 'tuned':
+        return make_engine(url, read_only=read_only)
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+def sample_order(i):
+    return {
+        'account_name': f"账号{i % 5}", 'action': '做多' if i % 2 else '做空', 'symbol': 'ETH',
+        'quantity': 0.1, 'price': 2600.0, 'market_price': 2600.0, 'order_id': str(i), 'status': '成功'
+    }
+
+def writer(profile, url, duration, result):
+    engine = build_engine(profile, url)
+    insert = TradingOrder.__table__.insert()
+    writes = errors = 0
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert, sample_order(writes))
+            writes += 1
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+    latencies.sort()
+    result.put(('writer', writes, errors, latencies[int(len(latencies) * 0.99)] if latencies else 0.0))
+
+def reader(profile, url, duration, result):
+    engine = build_engine(profile, url, read_only=True)
+    query = select(TradingOrder).order_by(TradingOrder.timestamp.desc()).limit(100)
+    reads = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            with engine.connect() as conn:
+                conn.execute(query).fetchall()
+            reads += 1
+        except Exception:
+            errors += 1
+    result.put(('reader', reads, errors, 0.0))
+
+def run(profile, duration, readers):
+    url = f"sqlite:///{os.path.join(WORK_DIR, profile + '.db')}"
+    engine = build_engine(profile, url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(TradingOrder.__table__.insert(), [sample_order(i) for i in range(SEED_ROWS)])
+        journal = conn.execute(text("PRAGMA journal_mode")).scalar()
+    engine.dispose()
+
+    result = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=writer, args=(profile, url, duration, result))]
+    procs += [multiprocessing.Process(target=reader, args=(profile, url, duration, result)) for _ in range(readers)]
+    for p in procs:
+        p.start()
+    rows = [result.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    writes = sum(r[1] for r in rows if r[0] == 'writer')
+    reads = sum(r[1] for r in rows if r[0] == 'reader')
+    errors = sum(r[2] for r in rows)
+    p99 = max(r[3] for r in rows if r[0] == 'writer') * 1000
+    print(f"{profile:<8}{journal:>10}{writes / duration:>12.0f}{reads / duration:>12.0f}{p99:>14.2f}{errors:>10}")
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"持续 {duration}s，1 个写进程 + {readers} 个读进程，临时目录 {WORK_DIR}")
+    print(f"{'配置':<8}{'日志模式':>10}{'写入/s':>12}{'查询/s':>12}{'写入p99(ms)':>14}{'锁冲突':>10}")
+    for profile in ('default', 'tuned'):
+        run(profile, duration, readers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+补单检查查询计划校验
+在临时库上建表（含迁移索引），对补单检查使用的两条查询执行 EXPLAIN QUERY PLAN，
+要求按索引或主键范围查找、不全表扫描，且消息查询不需要额外排序；
+并校验旧库上的废弃索引会被迁移删除（它们不被任何查询使用，只拖慢写入）。
+不满足时以非零状态退出，修改模型索引或查询后运行一次即可发现退化
+
+用法: python scripts/check_query_plans.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORK_DIR = tempfile.mkdtemp(prefix='check_plans_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'plans.db')}"
+
+from sqlalchemy import text
+from models import OBSOLETE_INDEXES, create_tables, engine, migrate_indexes
+from database import signal_messages_after_query, executed_message_ids_query
+
+# (名称, 查询, 必须出现的计划片段, 不允许出现的计划片段)
+CHECKS = [
+    ('游标后信号消息', signal_messages_after_query(1000, datetime.utcnow() - timedelta(hours=2)),
+     ['USING COVERING INDEX ix_telegram_messages_signal_id'], ['SCAN telegram_messages', 'TEMP B-TREE FOR ORDER BY']),
+    ('已执行消息', executed_message_ids_query([1001, 1002, 1003]),
+     ['USING COVERING INDEX ix_trading_orders_source_message'], ['SCAN trading_orders']),
+]
+
+def explain(conn, query):
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+# 模拟旧库上残留的废弃索引
+LEGACY_INDEX_SQL = [
+    'CREATE INDEX ix_telegram_messages_signal_ts ON telegram_messages (has_signal, timestamp, signal_type, signal_action, signal_symbol)',
+    'CREATE INDEX ix_trading_orders_status_ts ON trading_orders (status, timestamp, action, symbol)',
+    'CREATE INDEX ix_trading_orders_action_symbol ON trading_orders (action, symbol, status)',
+]
+
+def main():
+    create_tables()
+    with engine.begin() as conn:
+        for sql in LEGACY_INDEX_SQL:
+            conn.execute(text(sql))
+    migrate_indexes()
+    failed = False
+    with engine.connect() as conn:
+        names = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        leftover = sorted(names & set(OBSOLETE_INDEXES))
+        print(f"[{'失败' if leftover else '通过'}] 废弃索引已删除: {leftover or '无残留'}")
+        failed = bool(leftover)
+        for name, query, required, forbidden in CHECKS:
+            plan = explain(conn, query)
+            plan_text = ' | '.join(plan)
+            missing = [p for p in required if p not in plan_text]
+            present = [p for p in forbidden if p in plan_text]
+            status = '通过' if not missing and not present else '失败'
+            print(f"[{status}] {name}: {plan_text}")
+            if missing or present:
+                failed = True
+                for p in missing:
+                    print(f"    缺少: {p}")
+                for p in present:
+                    print(f"    不应出现: {p}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
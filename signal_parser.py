@@ -0,0 +1,214 @@
+"""
+交易信号解析
+
+parse_signal(text) 一次扫描得到 Signal（类型、方向、币种、数量、信号价、止盈止损、命中规则），
+结果按消息内容做 LRU 缓存，实时 handler 与补单检查不会重复解析同一条消息。
+
+所有正则在模块加载时预编译：
+- 关键词预筛：一次扫描找出消息中出现的开仓/平仓关键词，非信号消息在这一步直接返回
+- 标准格式（执行交易 + 策略当前交易对）一条正则同时取出动作、数量和币种
+- 通用开仓格式把原来按优先级依次尝试的做多/做空正则合并为一条，
+  用 \\A(?:.*?P1|.*?P2|...) 保持"先按规则顺序、再按位置"的匹配优先级
+"""
+import functools
+import re
+
+CLOSE_SHORT_KEYWORDS = ['空止盈', '空止损', '平空']
+CLOSE_LONG_KEYWORDS = ['多止盈', '多止损', '平多']
+CLOSE_KEYWORDS = CLOSE_SHORT_KEYWORDS + CLOSE_LONG_KEYWORDS
+OPEN_KEYWORDS = ['做多', '买入', 'LONG', '做空', '卖出', 'SHORT']
+STANDARD_KEYWORD = '执行交易'
+
+# 通用开仓格式，按优先级排列；{sym} 为币种，{qty} 为数量
+LONG_PATTERNS = [
+    r'做多\s*{sym}',  # 做多 ETH
+    r'{sym}\s*做多',  # ETH 做多
+    r'买入\s*{sym}',  # 买入 ETH
+    r'{sym}\s*买入',  # ETH 买入
+    r'LONG\s*{sym}',  # LONG ETH
+    r'{sym}\s*LONG',  # ETH LONG
+    r'做多\s*{qty}{sym}',  # 做多 0.072ETH
+    r'{sym}\s*做多\s*{qty}',  # ETH 做多 0.072
+    r'买入\s*{qty}{sym}',  # 买入 0.072ETH
+    r'{sym}\s*买入\s*{qty}',  # ETH 买入 0.072
+]
+
+SHORT_PATTERNS = [
+    r'做空\s*{sym}',  # 做空 ETH
+    r'{sym}\s*做空',  # ETH 做空
+    r'卖出\s*{sym}',  # 卖出 ETH
+    r'{sym}\s*卖出',  # ETH 卖出
+    r'SHORT\s*{sym}',  # SHORT ETH
+    r'{sym}\s*SHORT',  # ETH SHORT
+    r'做空\s*{qty}{sym}',  # 做空 0.072ETH
+    r'{sym}\s*做空\s*{qty}',  # ETH 做空 0.072
+    r'卖出\s*{qty}{sym}',  # 卖出 0.072ETH
+    r'{sym}\s*卖出\s*{qty}',  # ETH 卖出 0.072
+]
+
+OPEN_RULES = [('做多', f'long{i}', p) for i, p in enumerate(LONG_PATTERNS)] + \
+             [('做空', f'short{i}', p) for i, p in enumerate(SHORT_PATTERNS)]
+_OPEN_RULE_ACTIONS = {rule_id: action for action, rule_id, _ in OPEN_RULES}
+_QTY_RULES = {rule_id for _, rule_id, pattern in OPEN_RULES if '{qty}' in pattern}
+
+def _compile_open_regex():
+    alternatives = [
+        r'.*?' + pattern.format(sym=f'(?P<s_{rule_id}>[A-Z]+)', qty=f'(?P<q_{rule_id}>\\d+\\.?\\d*)')
+        for _, rule_id, pattern in OPEN_RULES
+    ]
+    return re.compile(r'\A(?:' + '|'.join(alternatives) + ')', re.IGNORECASE | re.DOTALL)
+
+def _compile_keyword_regex():
+    def alternation(words):
+        return '|'.join(re.escape(w) for w in words)
+    # 零宽前瞻逐位置扫描，重叠的关键词（如"做多止盈"中的"多止盈"）也不会漏掉
+    return re.compile(
+        f'(?=(?P<close_short>{alternation(CLOSE_SHORT_KEYWORDS)})'
+        f'|(?P<close_long>{alternation(CLOSE_LONG_KEYWORDS)})'
+        f'|(?P<standard>{re.escape(STANDARD_KEYWORD)})'
+        f'|(?P<open>{alternation(OPEN_KEYWORDS)}))',
+        re.IGNORECASE
+    )
+
+KEYWORD_RE = _compile_keyword_regex()
+OPEN_RE = _compile_open_regex()
+CLOSE_SYMBOL_RE = re.compile(r'[A-Z]+')
+# 信号价、止盈、止损一次扫描取出
+LEVELS_RE = re.compile(
+    r'[A-Z]+价格[:：](?P<price>[0-9]+\.?[0-9]*)'
+    r'|(?P<level>止盈|止损)(?:价格?|价位)?\s*[:：]?\s*(?P<level_px>[0-9]+\.?[0-9]*)'
+)
+
+# 解析结果缓存条数
+PARSE_CACHE_SIZE = 2048
+
+_SIDES = {'做多': 'long', '做空': 'short'}
+
+def _to_float(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+class Signal:
+    """
+    单条消息的解析结果；会被缓存共享，视为只读
+    kind: 'open' 开仓 / 'close' 平仓 / None 非信号
+    action: 开仓为信号原文动作（做多/做空...），平仓为 long/short
+    side: 归一化方向 long/short，无法判断时为 None
+    """
+    __slots__ = ('kind', 'action', 'side', 'symbol', 'qty', 'price', 'take_profit', 'stop_loss', 'rule')
+
+    def __init__(self, kind=None, action=None, side=None, symbol=None, qty=None,
+                 price=None, take_profit=None, stop_loss=None, rule=None):
+        self.kind = kind
+        self.action = action
+        self.side = side
+        self.symbol = symbol
+        self.qty = qty
+        self.price = price
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.rule = rule
+
+    @property
+    def is_open(self):
+        return self.kind == 'open' and bool(self.action and self.symbol)
+
+    @property
+    def is_close(self):
+        return self.kind == 'close' and bool(self.action and self.symbol)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if getattr(self, name) is not None)
+        return f"Signal({fields})"
+
+NO_SIGNAL = Signal()
+
+class SignalMatcher:
+    """预编译的信号匹配器；separator 为"执行交易"/"策略当前交易对"后允许的分隔符正则"""
+
+    def __init__(self, separator: str = ':', cache_size: int = PARSE_CACHE_SIZE):
+        self.standard_re = re.compile(
+            rf'\A(?=(?s:.*?){STANDARD_KEYWORD}{separator}(?P<action>.+?)(?= (?P<qty>\d+\.\d+)\w+))'
+            rf'(?=(?s:.*?)策略当前交易对{separator}(?P<symbol>\w+USDT\.P))'
+        )
+        # 以消息文本为键的 LRU 缓存（dict 查找使用字符串自带的哈希）
+        self.parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+    def _parse(self, message) -> Signal:
+        if not message:
+            return NO_SIGNAL
+        kinds = self.keywords(message)
+        if not kinds:
+            return NO_SIGNAL
+        closed = self.match_close(message, kinds)
+        if closed:
+            close_type, symbol, rule_id = closed
+            signal = Signal('close', close_type, close_type, symbol, rule=rule_id)
+        else:
+            opened = self.match_open(message, kinds)
+            if not opened:
+                return NO_SIGNAL
+            action, symbol, qty, rule_id = opened
+            signal = Signal('open', action, _SIDES.get(action), symbol, _to_float(qty), rule=rule_id)
+        for m in LEVELS_RE.finditer(message):
+            if m.group('price') is not None:
+                if signal.price is None:
+                    signal.price = float(m.group('price'))
+            elif m.group('level') == '止盈':
+                if signal.take_profit is None:
+                    signal.take_profit = _to_float(m.group('level_px'))
+            elif signal.stop_loss is None:
+                signal.stop_loss = _to_float(m.group('level_px'))
+        return signal
+
+    def cache_info(self):
+        """解析缓存命中统计"""
+        return self.parse.cache_info()
+
+    @staticmethod
+    def keywords(message):
+        """一次扫描返回消息中出现的关键词类别集合"""
+        return {m.lastgroup for m in KEYWORD_RE.finditer(message)}
+
+    def match_open(self, message, kinds=None):
+        """匹配开仓信号，返回 (action, symbol, qty, rule_id)，未匹配返回 None"""
+        if kinds is None:
+            kinds = self.keywords(message)
+        # 含平仓关键词的消息不作为开仓信号
+        if 'close_short' in kinds or 'close_long' in kinds:
+            return None
+        if 'standard' in kinds:
+            m = self.standard_re.match(message)
+            if m:
+                return m.group('action').strip(), m.group('symbol').split('USDT')[0], m.group('qty'), 'standard'
+        if 'open' not in kinds:
+            return None
+        m = OPEN_RE.match(message)
+        if not m:
+            return None
+        # lastgroup 为 s_<rule_id> 或 q_<rule_id>
+        rule_id = m.lastgroup[2:]
+        qty = m.group('q_' + rule_id) if rule_id in _QTY_RULES else None
+        return _OPEN_RULE_ACTIONS[rule_id], m.group('s_' + rule_id).upper(), qty, rule_id
+
+    def match_close(self, message, kinds=None):
+        """匹配平仓信号，返回 (close_type, symbol, rule_id)；symbol 可能为 None，未匹配返回 None"""
+        if kinds is None:
+            kinds = self.keywords(message)
+        if 'close_short' in kinds:
+            close_type, rule_id = 'short', 'close_short'
+        elif 'close_long' in kinds:
+            close_type, rule_id = 'long', 'close_long'
+        else:
+            return None
+        m = CLOSE_SYMBOL_RE.search(message)
+        symbol = m.group(0).upper().split('USDT')[0] if m else None
+        return close_type, symbol, rule_id
+
+DEFAULT_MATCHER = SignalMatcher()
+
+def parse_signal(text) -> Signal:
+    """使用默认匹配器解析消息（带缓存）"""
+    return DEFAULT_MATCHER.parse(text)
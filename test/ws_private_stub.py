@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+本地 OKX 私有 WebSocket 替身
+模拟登录（校验签名）、positions/orders 订阅和推送，配合假的 REST 持仓快照，
+用于离线验证 position_book.PositionBookService
+
+用法:
+    python test/ws_private_stub.py            # 启动替身并用持仓簿自检
+    python test/ws_private_stub.py --serve    # 只启动替身，供 OKX_WS_PRIVATE_URL=ws://127.0.0.1:18766 使用
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from position_book import PositionBookService, login_args
+
+ACCOUNT = {
+    'account_name': 'stub',
+    'API_KEY': 'stub-key',
+    'SECRET_KEY': 'stub-secret',
+    'PASSPHRASE': 'stub-pass',
+    'FLAG': '1'
+}
+
+def position(inst_id, pos_side, pos, utime):
+    return {'instId': inst_id, 'instType': 'SWAP', 'posSide': pos_side, 'pos': str(pos), 'mgnMode': 'cross',
+            'uTime': str(utime)}
+
+def order_fill(inst_id, utime):
+    return {'instId': inst_id, 'instType': 'SWAP', 'state': 'filled', 'ordId': str(utime), 'uTime': str(utime)}
+
+class FakeAccountAPI:
+    """REST get_positions 替身，返回替身当前持有的持仓"""
+
+    def __init__(self, stub):
+        self.stub = stub
+        self.calls = 0
+
+    def get_positions(self, instType='', instId=''):
+        self.calls += 1
+        return {'code': '0', 'msg': '', 'data': [dict(item) for item in self.stub.rest_positions]}
+
+class FakeClients:
+    def __init__(self, account_api):
+        self.account_api = account_api
+
+    def account(self, account):
+        return self.account_api
+
+class PrivateStub:
+    """私有频道替身：记录已订阅的连接，测试通过 push() 推送数据"""
+
+    def __init__(self, accounts):
+        self.secrets = {account['API_KEY']: account for account in accounts}
+        self.connections = set()
+        self.rest_positions = []
+        self.logins = 0
+
+    async def handler(self, ws):
+        raw = await ws.recv()
+        request = json.loads(raw)
+        args = (request.get('args') or [{}])[0]
+        account = self.secrets.get(args.get('apiKey'))
+        if request.get('op') != 'login' or account is None or login_args(account, args.get('timestamp'))['sign'] != args.get('sign'):
+            await ws.send(json.dumps({'event': 'error', 'code': '60009', 'msg': 'Login failed.'}))
+            return
+        self.logins += 1
+        await ws.send(json.dumps({'event': 'login', 'code': '0', 'msg': ''}))
+        try:
+            async for message in ws:
+                if message == 'ping':
+                    await ws.send('pong')
+                    continue
+                request = json.loads(message)
+                if request.get('op') == 'subscribe':
+                    for arg in request.get('args', []):
+                        await ws.send(json.dumps({'event': 'subscribe', 'arg': arg}))
+                    self.connections.add(ws)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+
+    async def push(self, channel, data, event_type='event_update'):
+        frame = {'arg': {'channel': channel, 'instType': 'SWAP'}, 'data': data}
+        if channel == 'positions':
+            frame['eventType'] = event_type
+        for ws in list(self.connections):
+            await ws.send(json.dumps(frame))
+
+    async def drop_connections(self):
+        for ws in list(self.connections):
+            await ws.close()
+
+async def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+async def serve(host, port):
+    stub = PrivateStub([ACCOUNT])
+    async with websockets.serve(stub.handler, host, port):
+        print(f"私有频道替身已启动: ws://{host}:{port}，API_KEY={ACCOUNT['API_KEY']}")
+        await asyncio.Future()
+
+async def self_check(host, port):
+    stub = PrivateStub([ACCOUNT])
+    stub.rest_positions = [position('ETH-USDT-SWAP', 'long', 1, 1000)]
+    rest = FakeAccountAPI(stub)
+    async with websockets.serve(stub.handler, host, port):
+        book = PositionBookService([ACCOUNT], FakeClients(rest), url=f"ws://{host}:{port}", gap_timeout=0.3)
+        book.start()
+        eth = lambda: book.get_positions(ACCOUNT, 'ETH-USDT-SWAP')
+        btc = lambda: book.get_positions(ACCOUNT, 'BTC-USDT-SWAP')
+
+        # 1. 连接后以 REST 快照为基线
+        assert await wait_until(lambda: eth() is not None), "持仓簿未完成同步"
+        assert [p['pos'] for p in eth()] == ['1'], f"快照持仓不一致: {eth()}"
+        assert btc() == [], "无持仓的合约应返回空列表"
+
+        # 2. 增量推送更新持仓；旧 uTime 的推送被丢弃
+        await stub.push('positions', [position('ETH-USDT-SWAP', 'long', 2, 2000)])
+        assert await wait_until(lambda: [p['pos'] for p in eth() or []] == ['2']), "增量推送未生效"
+        await stub.push('positions', [position('ETH-USDT-SWAP', 'long', 5, 1500)])
+        await asyncio.sleep(0.1)
+        assert [p['pos'] for p in eth()] == ['2'], "过期推送覆盖了较新的持仓"
+
+        # 3. 成交后持仓待确认，收到持仓推送后恢复
+        await stub.push('orders', [order_fill('BTC-USDT-SWAP', 3000)])
+        assert await wait_until(lambda: btc() is None), "成交后未进入待确认状态"
+        await stub.push('positions', [position('BTC-USDT-SWAP', 'short', 1, 3001)])
+        assert await wait_until(lambda: [p['posSide'] for p in btc() or []] == ['short']), "持仓推送未确认成交"
+
+        # 4. 成交后迟迟没有持仓推送（缺口）：超时后重新拉 REST 快照
+        calls = rest.calls
+        stub.rest_positions = [position('ETH-USDT-SWAP', 'long', 3, 4001), position('BTC-USDT-SWAP', 'short', 1, 3001)]
+        await stub.push('orders', [order_fill('ETH-USDT-SWAP', 4000)])
+        assert await wait_until(lambda: eth() is None), "缺口期间仍返回内存持仓"
+        assert await wait_until(lambda: [p['pos'] for p in eth() or []] == ['3']), "缺口超时后未重新同步"
+        assert rest.calls == calls + 1, "缺口恢复应只拉一次快照"
+
+        # 5. 本地平仓后 invalidate，持仓推送平为 0 后条目移除
+        book.invalidate(ACCOUNT, 'ETH-USDT-SWAP')
+        assert eth() is None, "invalidate 后仍返回内存持仓"
+        await stub.push('positions', [position('ETH-USDT-SWAP', 'long', 0, 5000)])
+        assert await wait_until(lambda: eth() == []), "平仓推送未移除持仓"
+
+        # 6. 断线期间不可用，重连后重新登录并拉快照
+        logins = stub.logins
+        await stub.drop_connections()
+        assert await wait_until(lambda: eth() is None, timeout=1), "断线后仍返回内存持仓"
+        assert await wait_until(lambda: eth() is not None and stub.logins == logins + 1), "重连后未恢复"
+
+        # 读取耗时：内存查询应在微秒级
+        start = time.perf_counter()
+        for _ in range(100000):
+            book.get_positions(ACCOUNT, 'BTC-USDT-SWAP')
+        per_call_us = (time.perf_counter() - start) / 100000 * 1e6
+        print(f"内存持仓查询耗时: {per_call_us:.2f}us/次")
+        print(f"统计: {book.stats()}")
+        book.stop()
+    print("持仓簿自检通过")
+
+def main():
+    parser = argparse.ArgumentParser(description='OKX 私有频道 WebSocket 替身')
+    parser.add_argument('--serve', action='store_true', help='只启动替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18766)
+    args = parser.parse_args()
+    if args.serve:
+        asyncio.run(serve(args.host, args.port))
+    else:
+        asyncio.run(self_check(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
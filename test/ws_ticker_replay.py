@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+本地 OKX 公共行情 WebSocket 替身
+回放 test/data/okx_tickers.jsonl 中录制的 tickers 帧，用于离线验证 market_data.MarketDataService
+
+用法:
+    python test/ws_ticker_replay.py            # 启动替身并用行情服务自检
+    python test/ws_ticker_replay.py --serve    # 只启动替身，供 OKX_WS_PUBLIC_URL=ws://127.0.0.1:18765 使用
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from market_data import MarketDataService
+
+FRAMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'okx_tickers.jsonl')
+
+def load_frames(path=FRAMES_FILE):
+    """读取录制的行情帧"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def make_handler(frames, interval, loop_forever):
+    async def handler(ws):
+        subscribed = set()
+        # 先等待订阅请求，再按录制顺序回放对应 instId 的帧
+        raw = await ws.recv()
+        request = json.loads(raw)
+        for arg in request.get('args', []):
+            subscribed.add(arg.get('instId'))
+            await ws.send(json.dumps({'event': 'subscribe', 'arg': arg}))
+
+        async def answer_pings():
+            async for message in ws:
+                if message == 'ping':
+                    await ws.send('pong')
+
+        ping_task = asyncio.create_task(answer_pings())
+        try:
+            while True:
+                for frame in frames:
+                    if json.loads(frame)['arg']['instId'] in subscribed:
+                        await ws.send(frame)
+                        await asyncio.sleep(interval)
+                if not loop_forever:
+                    break
+            await ping_task
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            ping_task.cancel()
+    return handler
+
+async def serve(host, port, interval, loop_forever=True):
+    frames = load_frames()
+    async with websockets.serve(make_handler(frames, interval, loop_forever), host, port):
+        print(f"行情替身已启动: ws://{host}:{port}，共 {len(frames)} 帧")
+        await asyncio.Future()
+
+async def self_check(host, port, interval):
+    frames = load_frames()
+    async with websockets.serve(make_handler(frames, interval, False), host, port):
+        service = MarketDataService(['ETH-USDT-SWAP', 'BTC-USDT-SWAP'], url=f"ws://{host}:{port}", max_age=1)
+        service.start()
+        await asyncio.sleep(interval * len(frames) + 0.5)
+        eth = service.get_ticker('ETH-USDT-SWAP')
+        btc = service.get_ticker('BTC-USDT-SWAP')
+        print(f"ETH: {eth}")
+        print(f"BTC: {btc}")
+        assert eth is not None and eth.last == 2634.77, "ETH 最新价与录制的最后一帧不一致"
+        assert btc is not None and btc.last == 61268.2, "BTC 最新价与录制的最后一帧不一致"
+
+        # 读取耗时：内存查询应在微秒级
+        start = time.perf_counter()
+        for _ in range(100000):
+            service.get_last_price('ETH-USDT-SWAP')
+        per_call_us = (time.perf_counter() - start) / 100000 * 1e6
+        print(f"内存行情查询耗时: {per_call_us:.2f}us/次")
+
+        # 替身停止推送后，超过新鲜度阈值应判定为过期
+        await asyncio.sleep(1.2)
+        assert service.get_last_price('ETH-USDT-SWAP') is None, "过期行情未被拒绝"
+        print(f"统计: {service.stats()}")
+        service.stop()
+    print("行情服务自检通过")
+
+def main():
+    parser = argparse.ArgumentParser(description='OKX 公共行情 WebSocket 替身')
+    parser.add_argument('--serve', action='store_true', help='只启动替身，循环回放')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18765)
+    parser.add_argument('--interval', type=float, default=0.05, help='帧间隔（秒）')
+    args = parser.parse_args()
+    if args.serve:
+        asyncio.run(serve(args.host, args.port, args.interval))
+    else:
+        asyncio.run(self_check(args.host, args.port, args.interval))
+
+if __name__ == "__main__":
+    main()
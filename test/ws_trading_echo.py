@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+本地 OKX 下单通道替身
+WebSocket 端模拟私有频道登录和 order / batch-orders 回报，HTTP 端模拟 REST 下单和查单接口，
+用于离线验证 ws_trading.WsTradingService 与下单网关的回退逻辑，并对比两种通道的下单延迟
+
+用法:
+    python test/ws_trading_echo.py                 # 启动替身并自检、输出延迟对比
+    python test/ws_trading_echo.py --serve         # 只启动 WebSocket 替身，供 OKX_WS_PRIVATE_URL=ws://127.0.0.1:18767 使用
+    python test/ws_trading_echo.py --delay 20      # 每个回报额外延迟 20ms，模拟网络往返
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from order_gateway import OrderGateway
+from position_book import login_args
+from ws_trading import WsTradingService
+
+ACCOUNT = {
+    'account_name': 'stub',
+    'API_KEY': 'stub-key',
+    'SECRET_KEY': 'stub-secret',
+    'PASSPHRASE': 'stub-pass',
+    'FLAG': '1'
+}
+
+_ord_ids = itertools.count(1)
+# 两个替身共用的已受理订单：clOrdId -> ordId，供查单接口使用
+placed = {}
+
+def ack(orders):
+    """受理订单并返回与 OKX 下单接口同格式的回报"""
+    items = []
+    for order in orders:
+        ord_id = str(next(_ord_ids))
+        placed[order.get('clOrdId', '')] = ord_id
+        items.append({'clOrdId': order.get('clOrdId', ''), 'ordId': ord_id, 'tag': '', 'sCode': '0', 'sMsg': ''})
+    return items
+
+class TradingEcho:
+    """WebSocket 下单替身；drop_next 为 True 时受理下一条请求但不回报，用于验证结果未知时的查单"""
+
+    def __init__(self, delay_ms=0.0):
+        self.delay = delay_ms / 1000
+        self.connections = set()
+        self.ops = []
+        self.drop_next = False
+
+    async def handler(self, ws):
+        request = json.loads(await ws.recv())
+        args = (request.get('args') or [{}])[0]
+        if request.get('op') != 'login' or login_args(ACCOUNT, args.get('timestamp'))['sign'] != args.get('sign'):
+            await ws.send(json.dumps({'event': 'error', 'code': '60009', 'msg': 'Login failed.'}))
+            return
+        await ws.send(json.dumps({'event': 'login', 'code': '0', 'msg': ''}))
+        self.connections.add(ws)
+        try:
+            async for message in ws:
+                if message == 'ping':
+                    await ws.send('pong')
+                    continue
+                request = json.loads(message)
+                self.ops.append(request['op'])
+                data = ack(request['args'])
+                if self.drop_next:
+                    self.drop_next = False
+                    continue
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                await ws.send(json.dumps({'id': request['id'], 'op': request['op'], 'code': '0', 'msg': '', 'data': data}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+
+def start_rest_echo(host, delay_ms):
+    """REST 下单、查单替身（HTTP/1.1 keep-alive），返回 (server, base_url)"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 头和正文分两次写出，不关闭 Nagle 会叠加约 40ms 的延迟确认
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if delay_ms:
+                time.sleep(delay_ms / 1000)
+            self.reply({'code': '0', 'msg': '', 'data': ack(body if isinstance(body, list) else [body])})
+
+        def do_GET(self):
+            query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+            ord_id = placed.get(query.get('clOrdId'))
+            if ord_id is None:
+                self.reply({'code': '51603', 'msg': 'Order does not exist', 'data': []})
+            else:
+                self.reply({'code': '0', 'msg': '', 'data': [{'instId': query.get('instId'), 'clOrdId': query['clOrdId'],
+                                                              'ordId': ord_id, 'state': 'live'}]})
+
+        def reply(self, response):
+            payload = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+class RestTrade(httpx.Client):
+    """TradeAPI 替身：网关直接 POST 下单，查单走 get_order"""
+
+    def get_order(self, instId, ordId='', clOrdId=''):
+        return self.get('/api/v5/trade/order', params={'instId': instId, 'ordId': ordId, 'clOrdId': clOrdId}).json()
+
+class RestClients:
+    """OKXClientRegistry 替身：trade() 返回指向本地 REST 替身的客户端"""
+
+    def __init__(self, base_url):
+        self.client = RestTrade(base_url=base_url)
+
+    def trade(self, account):
+        return self.client
+
+def order(i):
+    return {'instId': 'ETH-USDT-SWAP', 'tdMode': 'cross', 'side': 'buy', 'ordType': 'limit', 'px': '2634.77',
+            'sz': '0.1', 'posSide': 'long', 'clOrdId': f"ECHO{time.time_ns()}{i}"[:32]}
+
+async def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+async def latency(gateway, count):
+    """顺序下单 count 次，返回每次耗时（ms）"""
+    loop = asyncio.get_running_loop()
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        result = await loop.run_in_executor(None, gateway.submit, ACCOUNT, [order(i)])
+        samples.append((time.perf_counter() - start) * 1000)
+        assert result[0]['ok'], result
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+async def serve(host, port, delay_ms):
+    echo = TradingEcho(delay_ms)
+    async with websockets.serve(echo.handler, host, port):
+        print(f"下单替身已启动: ws://{host}:{port}，API_KEY={ACCOUNT['API_KEY']}")
+        await asyncio.Future()
+
+async def self_check(host, port, delay_ms, count):
+    loop = asyncio.get_running_loop()
+    echo = TradingEcho(delay_ms)
+    rest_server, rest_url = start_rest_echo(host, delay_ms)
+    clients = RestClients(rest_url)
+    server = await websockets.serve(echo.handler, host, port)
+    service = WsTradingService([ACCOUNT], url=f"ws://{host}:{port}", timeout=0.3)
+    service.start()
+    gateway = OrderGateway(clients, ws=service)
+    assert await wait_until(lambda: service.is_connected(ACCOUNT)), "下单 WebSocket 未连接"
+
+    # 1. 单笔走 order，多笔合并为一次 batch-orders
+    result = await loop.run_in_executor(None, gateway.submit, ACCOUNT, [order(0)])
+    assert result[0]['ok'] and echo.ops[-1] == 'order', result
+    result = await loop.run_in_executor(None, gateway.submit, ACCOUNT, [order(i) for i in range(3)])
+    assert all(r['ok'] for r in result) and echo.ops[-1] == 'batch-orders', result
+    assert len({r['ordId'] for r in result}) == 3, "回报未按 clOrdId 对应"
+
+    # 2. 已受理但回报丢失：按 clOrdId 查单确认成功，不再发第二次
+    echo.drop_next = True
+    sent = len(echo.ops)
+    result = await loop.run_in_executor(None, gateway.submit, ACCOUNT, [order(0)])
+    assert result[0]['ok'] and result[0]['ordId'] == placed[result[0]['clOrdId']], result
+    assert len(echo.ops) == sent + 1 and gateway.stats()['lookups'] == 1, gateway.stats()
+    assert service.stats()['timeouts'] == 1, service.stats()
+
+    # 3. 延迟对比：WebSocket 与 REST（同一替身、同样的人为延迟）
+    ws_p50, ws_p99 = await latency(gateway, count)
+    rest_p50, rest_p99 = await latency(OrderGateway(clients), count)
+    print(f"顺序下单 {count} 次（人为延迟 {delay_ms}ms）")
+    print(f"  WebSocket: p50 {ws_p50:.2f}ms, p99 {ws_p99:.2f}ms")
+    print(f"  REST:      p50 {rest_p50:.2f}ms, p99 {rest_p99:.2f}ms")
+
+    # 4. 替身关闭后回退 REST
+    server.close()
+    for ws in list(echo.connections):
+        await ws.close()
+    await server.wait_closed()
+    assert await wait_until(lambda: not service.is_connected(ACCOUNT)), "断线未被发现"
+    fallbacks = gateway.stats()['rest_fallbacks']
+    result = await loop.run_in_executor(None, gateway.submit, ACCOUNT, [order(0)])
+    assert result[0]['ok'] and gateway.stats()['rest_fallbacks'] == fallbacks + 1, gateway.stats()
+
+    print(f"WebSocket 统计: {service.stats()}")
+    print(f"网关统计: {gateway.stats()}")
+    service.stop()
+    rest_server.shutdown()
+    print("WebSocket 下单自检通过")
+
+def main():
+    parser = argparse.ArgumentParser(description='OKX 下单通道替身')
+    parser.add_argument('--serve', action='store_true', help='只启动 WebSocket 替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18767)
+    parser.add_argument('--delay', type=float, default=0.0, help='每个回报的人为延迟（毫秒）')
+    parser.add_argument('--count', type=int, default=200, help='延迟对比的下单次数')
+    args = parser.parse_args()
+    if args.serve:
+        asyncio.run(serve(args.host, args.port, args.delay))
+    else:
+        asyncio.run(self_check(args.host, args.port, args.delay, args.count))
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,19 @@ import sys
 import time
 import asyncio
 import logging
-import re
 from datetime import datetime, timedelta
 from telethon.sync import TelegramClient
 from telethon import events
-from utils import get_shanghai_time, send_bark_notification, build_order_params
-import okx.Trade as Trade
-import okx.MarketData as MarketData
-import okx.Account as Account
-import json
-
+from telethon.errors import FloodWaitError
+from utils import get_shanghai_time, send_bark_notification, build_order_params, ProcessedIdStore
+from okx_clients import OKXClientRegistry
+from instruments import InstrumentRegistry
+from order_gateway import OrderGateway
+from ws_trading import WsTradingService, OKX_WS_TRADING
+from market_data import MarketDataService
+from position_book import PositionBookService
+from signal_parser import SignalMatcher
+from connection_monitor import TelegramConnectionMonitor
 from dotenv import load_dotenv
 load_dotenv('.env')
 print("TG_API_ID from env:", os.getenv("TG_API_ID"))
@@ -89,212 +92,161 @@ def get_test_accounts():
 
 TEST_ACCOUNTS = get_test_accounts()
 
-PROCESSED_IDS_FILE = 'processed_message_ids.json'
-
-# 加载/保存消息ID缓存
-
-def load_processed_ids():
-    try:
-        with open(PROCESSED_IDS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 转为 set 方便后续处理
-            return {int(k): set(v) for k, v in data.items()}
-    except Exception:
-        return {}
-
-def save_processed_ids(processed_ids):
-    try:
-        # set 转 list 方便序列化
-        data = {str(k): list(v) for k, v in processed_ids.items()}
-        with open(PROCESSED_IDS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"保存消息ID缓存失败: {e}")
+# 行情、合约精度、服务器时间等公共接口与账号同一环境（实盘/模拟盘）
+OKX_FLAG = TEST_ACCOUNTS[0]['FLAG'] if TEST_ACCOUNTS else '1'
+
+# OKX 客户端注册表：启动时创建，所有信号复用同一批连接
+OKX_CLIENTS = OKXClientRegistry()
+# 下单网关：clOrdId 由网关生成，保证同一批内唯一
+ORDER_GATEWAY = OrderGateway(OKX_CLIENTS, ws=WsTradingService(TEST_ACCOUNTS) if OKX_WS_TRADING else None, flag=OKX_FLAG)
+OKX_CLIENTS.warm_up(TEST_ACCOUNTS, [OKX_FLAG])
+
+# 合约精度缓存：止盈止损按 tickSz 取整，数量按 lotSz 向下取整
+INSTRUMENTS = InstrumentRegistry(OKX_CLIENTS, flag=OKX_FLAG)
+# WebSocket 行情缓存，价格查询优先走内存
+MARKET_DATA = MarketDataService(['ETH-USDT-SWAP', 'BTC-USDT-SWAP'], flag=OKX_FLAG)
+# 持仓簿：平仓时优先使用私有 WebSocket 推送维护的持仓
+POSITION_BOOK = PositionBookService(TEST_ACCOUNTS, OKX_CLIENTS)
+
+PROCESSED_IDS_FILE = 'processed_message_ids.json'  # 旧版缓存，仅用于首次迁移
+PROCESSED_IDS_LOG = 'processed_message_ids.log'
+
+# 已处理消息ID：启动时加载一次，之后每个新ID只追加一行
+PROCESSED_IDS = ProcessedIdStore(PROCESSED_IDS_LOG, legacy_json_path=PROCESSED_IDS_FILE)
+
+# 预编译的信号匹配器，标准格式的冒号可省略或使用全角；解析结果按消息内容缓存
+SIGNAL_MATCHER = SignalMatcher(separator='[:：]?')
+
+# 补单检查参数：每个频道只拉取上次看到的消息之后的新消息，间隔按消息频率与限流自适应
+PATCH_MISSING_SIGNALS_INTERVAL = int(os.getenv('PATCH_MISSING_SIGNALS_INTERVAL', 30))  # 初始间隔（秒）
+PATCH_MIN_INTERVAL = int(os.getenv('PATCH_MIN_INTERVAL', 10))
+PATCH_MAX_INTERVAL = int(os.getenv('PATCH_MAX_INTERVAL', 300))
+PATCH_MAX_CONCURRENCY = int(os.getenv('PATCH_MAX_CONCURRENCY', 4))  # 同时拉取的频道数上限
+PATCH_FETCH_LIMIT = 100  # 单次最多拉取的新消息数
+
+class ChannelPoller:
+    """单个频道的补单轮询状态"""
+    __slots__ = ('channel_id', 'last_seen_id', 'interval', 'next_due')
+
+    def __init__(self, channel_id, last_seen_id=0):
+        self.channel_id = channel_id
+        self.last_seen_id = last_seen_id
+        self.interval = PATCH_MISSING_SIGNALS_INTERVAL
+        self.next_due = time.monotonic() + self.interval
+
+    def schedule(self, new_messages):
+        """有新消息时缩短间隔，空轮询时逐步拉长"""
+        if new_messages:
+            self.interval = max(PATCH_MIN_INTERVAL, self.interval / 2)
+        else:
+            self.interval = min(PATCH_MAX_INTERVAL, self.interval * 1.5)
+        self.next_due = time.monotonic() + self.interval
 
-# 初始化缓存
-PROCESSED_MESSAGE_IDS = load_processed_ids()
+    def flood_wait(self, seconds):
+        """遇到 FloodWait：按服务端要求等待，并加大之后的间隔"""
+        self.interval = min(PATCH_MAX_INTERVAL, self.interval * 2)
+        self.next_due = time.monotonic() + max(seconds, self.interval)
 
-# 提取信号中的价格，如“ETH价格:2633.96”
-def extract_signal_price(message):
-    match = re.search(r"[A-Z]+价格[:：]([0-9]+\.?[0-9]*)", message)
-    if match:
-        return float(match.group(1))
-    return None
+CHANNEL_POLLERS = {}
 
 async def init_processed_ids():
-    updated = False
     for channel_id in CHANNEL_IDS:
-        if channel_id not in PROCESSED_MESSAGE_IDS:
-            PROCESSED_MESSAGE_IDS[channel_id] = set()
+        last_seen_id = 0
         async for message in client.iter_messages(channel_id, limit=20):
-            if message and message.id not in PROCESSED_MESSAGE_IDS[channel_id]:
-                PROCESSED_MESSAGE_IDS[channel_id].add(message.id)
-                updated = True
-    if updated:
-        save_processed_ids(PROCESSED_MESSAGE_IDS)
-
-async def check_and_patch_missing_signals():
-    while True:
-        logger.info('【定时补单检查】正在检查各频道最近20条消息...')
-        # 每次定时检查前都重新加载缓存，实现热编辑支持
-        global PROCESSED_MESSAGE_IDS
-        PROCESSED_MESSAGE_IDS = load_processed_ids()
+            if message:
+                PROCESSED_IDS.add(channel_id, message.id)
+                last_seen_id = max(last_seen_id, message.id)
+        CHANNEL_POLLERS[channel_id] = ChannelPoller(channel_id, last_seen_id)
+
+async def patch_message(channel_id, message):
+    """补处理一条遗漏的消息"""
+    # 只处理新消息（登记成功说明之前未处理过）
+    if not PROCESSED_IDS.add(channel_id, message.id):
+        return
+    signal = SIGNAL_MATCHER.parse(message.text)
+    action, symbol = signal.action, signal.symbol
+    signal_price = signal.price
+    # 补开仓信号
+    if signal.is_open:
+        # 做多/做空需比价
+        if action in ['做多', '做空'] and signal_price:
+            market_price = get_latest_market_price(symbol)
+            if not market_price:
+                logger.warning(f"补单时获取市场价失败: {symbol}")
+                return
+            price_diff = (market_price - signal_price) / signal_price
+            bark_title = f"补单价格检查-{action}-{symbol}"
+            if action == '做多':
+                if market_price <= signal_price:
+                    await process_open_signal(action, symbol, signal_price)
+                elif 0 < price_diff <= 0.005:
+                    await process_open_signal(action, symbol, signal_price)
+                else:
+                    content = f"做多信号，市场价高于信号价超0.5%，不下单\n信号价:{signal_price}, 市场价:{market_price}"
+                    logger.warning(content)
+                    send_bark_notification(bark_title, content)
+                    if TG_LOG_GROUP_ID:
+                        await client.send_message(TG_LOG_GROUP_ID, content)
+            elif action == '做空':
+                if market_price >= signal_price:
+                    await process_open_signal(action, symbol, signal_price)
+                elif 0 < -price_diff <= 0.005:
+                    await process_open_signal(action, symbol, signal_price)
+                else:
+                    content = f"做空信号，市场价低于信号价超0.5%，不下单\n信号价:{signal_price}, 市场价:{market_price}"
+                    logger.warning(content)
+                    send_bark_notification(bark_title, content)
+                    if TG_LOG_GROUP_ID:
+                        await client.send_message(TG_LOG_GROUP_ID, content)
+        else:
+            # 其他信号或无价格，直接补单
+            await process_open_signal(action, symbol, signal_price or 0)
+    # 补平仓信号
+    elif signal.is_close:
+        await process_close_signal(signal.action, signal.symbol)
+
+async def poll_channel(poller, semaphore):
+    """拉取频道中 last_seen_id 之后的新消息并补处理"""
+    async with semaphore:
+        new_messages = 0
         try:
-            for channel_id in CHANNEL_IDS:
-                if channel_id not in PROCESSED_MESSAGE_IDS:
-                    PROCESSED_MESSAGE_IDS[channel_id] = set()
-                async for message in client.iter_messages(channel_id, limit=20):
-                    if not message or not message.text:
-                        continue
-                    msg_id = message.id
-                    if msg_id in PROCESSED_MESSAGE_IDS[channel_id]:
-                        continue
-                    # 只处理新消息
-                    PROCESSED_MESSAGE_IDS[channel_id].add(msg_id)
-                    save_processed_ids(PROCESSED_MESSAGE_IDS)
-                    msg_text = message.text
-                    action, symbol = extract_trade_info(msg_text)
-                    close_type, close_symbol = extract_close_signal(msg_text)
-                    signal_price = extract_signal_price(msg_text)
-                    # 补开仓信号
-                    if action and symbol:
-                        # 做多/做空需比价
-                        if action in ['做多', '做空'] and signal_price:
-                            market_price = get_latest_market_price(symbol)
-                            if not market_price:
-                                logger.warning(f"补单时获取市场价失败: {symbol}")
-                                continue
-                            price_diff = (market_price - signal_price) / signal_price
-                            bark_title = f"补单价格检查-{action}-{symbol}"
-                            if action == '做多':
-                                if market_price <= signal_price:
-                                    await process_open_signal(action, symbol, signal_price)
-                                elif 0 < price_diff <= 0.005:
-                                    await process_open_signal(action, symbol, signal_price)
-                                else:
-                                    content = f"做多信号，市场价高于信号价超0.5%，不下单\n信号价:{signal_price}, 市场价:{market_price}"
-                                    logger.warning(content)
-                                    send_bark_notification(bark_title, content)
-                                    if TG_LOG_GROUP_ID:
-                                        await client.send_message(TG_LOG_GROUP_ID, content)
-                            elif action == '做空':
-                                if market_price >= signal_price:
-                                    await process_open_signal(action, symbol, signal_price)
-                                elif 0 < -price_diff <= 0.005:
-                                    await process_open_signal(action, symbol, signal_price)
-                                else:
-                                    content = f"做空信号，市场价低于信号价超0.5%，不下单\n信号价:{signal_price}, 市场价:{market_price}"
-                                    logger.warning(content)
-                                    send_bark_notification(bark_title, content)
-                                    if TG_LOG_GROUP_ID:
-                                        await client.send_message(TG_LOG_GROUP_ID, content)
-                        else:
-                            # 其他信号或无价格，直接补单
-                            await process_open_signal(action, symbol, signal_price or 0)
-                    # 补平仓信号
-                    elif close_type and close_symbol:
-                        await process_close_signal(close_type, close_symbol)
+            if poller.last_seen_id:
+                # reverse=True 从旧到新，积压超过单次上限时下一轮从断点继续
+                messages = client.iter_messages(poller.channel_id, min_id=poller.last_seen_id,
+                                                reverse=True, limit=PATCH_FETCH_LIMIT)
+            else:
+                # 还没有基准消息ID时只看最近20条
+                messages = client.iter_messages(poller.channel_id, limit=20)
+            async for message in messages:
+                if not message:
+                    continue
+                poller.last_seen_id = max(poller.last_seen_id, message.id)
+                new_messages += 1
+                if message.text:
+                    await patch_message(poller.channel_id, message)
+        except FloodWaitError as e:
+            logger.warning(f"【定时补单检查】频道 {poller.channel_id} 触发限流，等待 {e.seconds} 秒")
+            poller.flood_wait(e.seconds)
+            return
         except Exception as e:
-            logger.error(f"历史消息补单检查异常: {e}")
-        await asyncio.sleep(30)
+            logger.error(f"频道 {poller.channel_id} 补单检查异常: {e}")
+        poller.schedule(new_messages)
+        if new_messages:
+            logger.info(f"【定时补单检查】频道 {poller.channel_id} 新消息 {new_messages} 条，下次间隔 {poller.interval:.0f} 秒")
 
-def extract_trade_info(message):
-    """从消息中提取开仓交易信息"""
-    logger.debug(f"正在从消息中提取交易信息: {message[:100]}...")
-    
-    # 首先检查是否包含平仓关键词，如果是平仓信号则不提取开仓信息
-    close_keywords = ['空止盈', '空止损', '多止盈', '多止损', '平多', '平空']
-    has_close_signal = any(keyword in message for keyword in close_keywords)
-    
-    if has_close_signal:
-        logger.debug("检测到平仓信号，跳过开仓信号提取")
-        return None, None
-    
-    # 尝试从标准格式中提取
-    action_pattern = r"执行交易[:：]?(.+?)(?= \d+\.\d+\w+)"
-    action_match = re.search(action_pattern, message)
-    symbol_pattern = r"策略当前交易对[:：]?(\w+USDT\.P)"
-    symbol_match = re.search(symbol_pattern, message)
-    
-    if action_match and symbol_match:
-        action = action_match.group(1).strip()
-        symbol = symbol_match.group(1).split('USDT')[0]
-        logger.info(f"成功提取交易信息 - 动作: {action}, 符号: {symbol}")
-        return action, symbol
-    
-    # 如果标准格式不匹配，使用通用正则表达式
-    # 做多信号 - 支持多种格式
-    long_patterns = [
-        r'做多\s*([A-Z]+)',  # 做多 ETH
-        r'([A-Z]+)\s*做多',  # ETH 做多
-        r'买入\s*([A-Z]+)',  # 买入 ETH
-        r'([A-Z]+)\s*买入',  # ETH 买入
-        r'LONG\s*([A-Z]+)',  # LONG ETH
-        r'([A-Z]+)\s*LONG',  # ETH LONG
-        r'做多\s*\d+\.?\d*([A-Z]+)',  # 做多 0.072ETH
-        r'([A-Z]+)\s*做多\s*\d+\.?\d*',  # ETH 做多 0.072
-        r'买入\s*\d+\.?\d*([A-Z]+)',  # 买入 0.072ETH
-        r'([A-Z]+)\s*买入\s*\d+\.?\d*',  # ETH 买入 0.072
-    ]
-    
-    # 做空信号 - 支持多种格式
-    short_patterns = [
-        r'做空\s*([A-Z]+)',  # 做空 ETH
-        r'([A-Z]+)\s*做空',  # ETH 做空
-        r'卖出\s*([A-Z]+)',  # 卖出 ETH
-        r'([A-Z]+)\s*卖出',  # ETH 卖出
-        r'SHORT\s*([A-Z]+)',  # SHORT ETH
-        r'([A-Z]+)\s*SHORT',  # ETH SHORT
-        r'做空\s*\d+\.?\d*([A-Z]+)',  # 做空 0.072ETH
-        r'([A-Z]+)\s*做空\s*\d+\.?\d*',  # ETH 做空 0.072
-        r'卖出\s*\d+\.?\d*([A-Z]+)',  # 卖出 0.072ETH
-        r'([A-Z]+)\s*卖出\s*\d+\.?\d*',  # ETH 卖出 0.072
-    ]
-    
-    # 检查做多信号
-    for pattern in long_patterns:
-        match = re.search(pattern, message, re.IGNORECASE)
-        if match:
-            symbol = match.group(1).upper()
-            logger.info(f"检测到做多信号: {symbol}")
-            return '做多', symbol
-    
-    # 检查做空信号
-    for pattern in short_patterns:
-        match = re.search(pattern, message, re.IGNORECASE)
-        if match:
-            symbol = match.group(1).upper()
-            logger.info(f"检测到做空信号: {symbol}")
-            return '做空', symbol
-    
-    logger.debug("未检测到开仓交易信号")
-    return None, None
-
-def extract_close_signal(message):
-    """从消息中提取平仓信号"""
-    logger.debug(f"正在从消息中提取平仓信号: {message[:100]}...")
-
-    # 先判断多空止盈止损和平多/平空
-    if any(kw in message for kw in ['空止盈', '空止损', '平空']):
-        symbol_match = re.search(r'([A-Z]+)', message)
-        if symbol_match:
-            symbol = symbol_match.group(1).upper().split('USDT')[0]
-            logger.info(f"检测到平空/空止盈/空止损信号: {symbol}")
-            return 'short', symbol
-        else:
-            logger.warning("未能从平空/空止盈/空止损信号中提取币种")
-            return 'short', None
-    if any(kw in message for kw in ['多止盈', '多止损', '平多']):
-        symbol_match = re.search(r'([A-Z]+)', message)
-        if symbol_match:
-            symbol = symbol_match.group(1).upper().split('USDT')[0]
-            logger.info(f"检测到平多/多止盈/多止损信号: {symbol}")
-            return 'long', symbol
-        else:
-            logger.warning("未能从平多/多止盈/多止损信号中提取币种")
-            return 'long', None
-    logger.debug("未检测到平仓信号")
-    return None, None
+async def check_and_patch_missing_signals():
+    semaphore = asyncio.Semaphore(PATCH_MAX_CONCURRENCY)
+    for channel_id in CHANNEL_IDS:
+        CHANNEL_POLLERS.setdefault(channel_id, ChannelPoller(channel_id))
+    while True:
+        # 合约精度按间隔刷新，未到期时直接返回
+        await asyncio.get_running_loop().run_in_executor(None, INSTRUMENTS.refresh_if_due)
+        now = time.monotonic()
+        due = [p for p in CHANNEL_POLLERS.values() if p.next_due <= now]
+        if due:
+            await asyncio.gather(*(poll_channel(p, semaphore) for p in due))
+        next_due = min(p.next_due for p in CHANNEL_POLLERS.values())
+        await asyncio.sleep(max(1, next_due - time.monotonic()))
 
 def get_order_size(account_idx, symbol):
     coin = symbol.split('-')[0] if '-' in symbol else symbol
@@ -308,10 +260,13 @@ def get_order_size(account_idx, symbol):
     return None
 
 def get_latest_market_price(symbol):
-    """获取最新市场价格"""
+    """获取最新市场价格，优先使用 WebSocket 内存行情，过期时回退 REST"""
+    symbol_id = f"{symbol.upper()}-USDT-SWAP"
+    cached_price = MARKET_DATA.get_last_price(symbol_id)
+    if cached_price is not None:
+        return cached_price
     try:
-        market_api = MarketData.MarketAPI(debug=False)
-        symbol_id = f"{symbol.upper()}-USDT-SWAP"
+        market_api = OKX_CLIENTS.market(MARKET_DATA.flag)
         response = market_api.get_ticker(instId=symbol_id)
         if response.get('code') == '0':
             return float(response['data'][0]['last'])
@@ -367,13 +322,6 @@ def build_close_bark_content(close_type, symbol, account_name, close_results, ok
 async def place_okx_order(account, action, symbol, size):
     """真实的OKX下单函数"""
     try:
-        trade_api = Trade.TradeAPI(
-            account['API_KEY'],
-            account['SECRET_KEY'],
-            account['PASSPHRASE'],
-            False,
-            account['FLAG']
-        )
         symbol_id = f"{symbol.upper()}-USDT-SWAP"
         market_price = get_latest_market_price(symbol)
         if market_price is None:
@@ -386,51 +334,50 @@ async def place_okx_order(account, action, symbol, size):
         if action == '做多':
             side = 'buy'
             pos_side = 'long'
-            take_profit = round(market_price * 1.01, 2)  # 止盈1%
-            stop_loss = round(market_price * (1 - 0.027), 2)  # 止损2.7%
+            take_profit = INSTRUMENTS.round_price(symbol_id, market_price * 1.01)  # 止盈1%
+            stop_loss = INSTRUMENTS.round_price(symbol_id, market_price * (1 - 0.027))  # 止损2.7%
         elif action == '做空':
             side = 'sell'
             pos_side = 'short'
-            take_profit = round(market_price * (1 - 0.01), 2)  # 止盈1%
-            stop_loss = round(market_price * (1 + 0.027), 2)  # 止损2.7%
+            take_profit = INSTRUMENTS.round_price(symbol_id, market_price * (1 - 0.01))  # 止盈1%
+            stop_loss = INSTRUMENTS.round_price(symbol_id, market_price * (1 + 0.027))  # 止损2.7%
         else:
             logger.error(f"未知的交易动作: {action}")
             return {
                 "success": False,
                 "error_msg": f"未知的交易动作: {action}"
             }
+        # FIXED_QTY 即张数，按 lotSz 向下取整，低于 minSz 时抛出异常不下单
+        size = INSTRUMENTS.quantize_size(symbol_id, size)
         # 杠杆倍数，优先取账户配置，否则默认10
         leverage = int(os.getenv(f"OKX{account['account_idx']}_LEVERAGE", 10))
         # 保证金计算
-        margin = round(market_price * size / leverage, 4)
+        margin = round(market_price * float(size) / leverage, 4)
         logger.info(f"保证金计算参数: 市价={market_price}, 数量={size}, 杠杆={leverage}, 保证金={margin}")
         # 构建下单参数
         order_params = build_order_params(
             symbol_id, side, market_price, size, pos_side, take_profit, stop_loss
         )
-        response = trade_api.place_order(**order_params)
-        if response.get('code') == '0' and response.get('data') and len(response['data']) > 0:
-            order_id = response['data'][0].get('ordId', '')
-            cl_ord_id = order_params['clOrdId']
+        # 经下单网关发送（预签名、可选 WebSocket 通道、结果未知时按 clOrdId 查单），在线程池中等待
+        result = (await asyncio.get_running_loop().run_in_executor(None, ORDER_GATEWAY.submit, account, [order_params]))[0]
+        POSITION_BOOK.invalidate(account, symbol_id)
+        okx_resp = {'code': result['sCode'], 'msg': result['sMsg'], 'ordId': result['ordId']}
+        if result['ok']:
             return {
                 "success": True,
                 "take_profit": take_profit,
                 "stop_loss": stop_loss,
                 "margin": margin,
-                "clOrdId": cl_ord_id,
-                "okx_resp": response,
+                "clOrdId": result['clOrdId'],
+                "okx_resp": okx_resp,
                 "market_price": market_price
             }
         else:
-            error_msg = None
-            if response.get('data') and isinstance(response['data'], list) and len(response['data']) > 0:
-                error_msg = response['data'][0].get('sMsg', '下单失败')
-            else:
-                error_msg = response.get('msg', '下单失败')
             return {
                 "success": False,
-                "error_msg": error_msg,
-                "okx_resp": response,
+                "error_msg": result['sMsg'] or '下单失败',
+                "clOrdId": result['clOrdId'],
+                "okx_resp": okx_resp,
                 "market_price": market_price
             }
     except Exception as e:
@@ -459,33 +406,23 @@ async def fake_close_position(account_idx, symbol, close_type):
 async def close_okx_position(account, symbol, close_type):
     """真实的OKX平仓函数，只平当前信号方向的仓位"""
     try:
-        account_api = Account.AccountAPI(
-            account['API_KEY'],
-            account['SECRET_KEY'],
-            account['PASSPHRASE'],
-            False,
-            account['FLAG']
-        )
-        trade_api = Trade.TradeAPI(
-            account['API_KEY'],
-            account['SECRET_KEY'],
-            account['PASSPHRASE'],
-            False,
-            account['FLAG']
-        )
+        account_api = OKX_CLIENTS.account(account)
         symbol_id = f"{symbol.upper()}-USDT-SWAP"
-        # 获取持仓信息
-        positions_response = account_api.get_positions(instId=symbol_id)
-        if positions_response.get('code') != '0':
-            logger.error(f"获取持仓信息失败: {positions_response}")
-            return {
-                "success": False,
-                "close_results": [],
-                "okx_resp": positions_response,
-                "error_msg": "获取持仓信息失败"
-            }
-        positions = positions_response['data']
-        close_results = []
+        # 优先使用持仓簿，不可用时回退 REST 查询
+        positions = POSITION_BOOK.get_positions(account, symbol_id)
+        loop = asyncio.get_running_loop()
+        if positions is None:
+            positions_response = await loop.run_in_executor(None, lambda: account_api.get_positions(instId=symbol_id))
+            if positions_response.get('code') != '0':
+                logger.error(f"获取持仓信息失败: {positions_response}")
+                return {
+                    "success": False,
+                    "close_results": [],
+                    "okx_resp": positions_response,
+                    "error_msg": "获取持仓信息失败"
+                }
+            positions = positions_response['data']
+        legs = []
         for position in positions:
             pos_side = position['posSide']
             pos_size = float(position['pos'])
@@ -495,26 +432,31 @@ async def close_okx_position(account, symbol, close_type):
             if (close_type == 'long' and pos_side == 'long') or (close_type == 'short' and pos_side == 'short'):
                 # 平多：side=sell, posSide=long；平空：side=buy, posSide=short
                 side = 'sell' if pos_side == 'long' else 'buy'
-                clord_id = f"CLOSE{int(time.time())}{account['account_idx']}"
-                response = trade_api.place_order(
-                    instId=symbol_id,
-                    tdMode='cross',
-                    side=side,
-                    posSide=pos_side,
-                    ordType='market',
-                    sz=str(pos_size),
-                    clOrdId=clord_id
-                )
-                if response.get('code') == '0':
-                    order_id = response['data'][0]['ordId']
-                    close_results.append({
-                        'pos_side': pos_side,
-                        'size': pos_size,
-                        'order_id': order_id
-                    })
-                    logger.info(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 成功: {order_id}")
-                else:
-                    logger.error(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 失败: {response}")
+                legs.append((pos_side, pos_size, {
+                    'instId': symbol_id,
+                    'tdMode': 'cross',
+                    'side': side,
+                    'posSide': pos_side,
+                    'ordType': 'market',
+                    'sz': position['pos']
+                }))
+        # 经下单网关批量发出（在线程池中阻塞等待，不占用事件循环）；
+        # 同一账号已有请求在途时，后到的平仓与其他排队订单合并为下一批
+        results = await loop.run_in_executor(None, ORDER_GATEWAY.submit, account, [params for _, _, params in legs])
+        if legs:
+            POSITION_BOOK.invalidate(account, symbol_id)
+        close_results = []
+        for (pos_side, pos_size, _), result in zip(legs, results):
+            if result['ok']:
+                order_id = result['ordId']
+                close_results.append({
+                    'pos_side': pos_side,
+                    'size': pos_size,
+                    'order_id': order_id
+                })
+                logger.info(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 成功: {order_id}")
+            else:
+                logger.error(f"账号 {account['account_name']} 平仓 {pos_side} {symbol} 失败: {result['sCode']} {result['sMsg']}")
         if close_results:
             return {
                 "success": True,
@@ -538,63 +480,70 @@ async def close_okx_position(account, symbol, close_type):
         }
 
 async def process_open_signal(action, symbol, price):
-    """处理开仓信号"""
-    for account in TEST_ACCOUNTS:
-        size = get_order_size(account['account_idx'], symbol)
-        if not size:
-            logger.warning(f"未配置账户{account['account_name']}的下单数量，跳过")
-            continue
-        logger.info(f"准备为账户 {account['account_name']} 下单，参数如下：")
-        logger.info(f"action: {action}, symbol: {symbol}, size: {size}")
-        order_result = await place_okx_order(account, action, symbol, size)
-        logger.info(f"下单返回结果: {order_result}")
-        bark_title = f"Tg信号策略{action}-{symbol}"
-        # entry_price 用实际下单市场价
-        entry_price = order_result.get('market_price', 0)
-        bark_content = build_bark_content(
-            signal={'symbol': symbol, 'action': action},
-            account_name=account['account_name'],
-            entry_price=entry_price,
-            size=size,
-            margin=order_result.get('margin', 0),
-            take_profit=order_result.get('take_profit', 0),
-            stop_loss=order_result.get('stop_loss', 0),
-            clOrdId=order_result.get('clOrdId', ''),
-            okx_resp=order_result.get('okx_resp'),
-            error_msg=order_result.get('error_msg')
-        )
-        logger.info(f"准备发送Bark通知，参数如下：title={bark_title}, content={bark_content}")
-        send_bark_notification(bark_title, bark_content)
-        logger.info(f"Bark通知已发送: {bark_title}")
+    """处理开仓信号，各账号并发下单"""
+    await asyncio.gather(*(open_account(account, action, symbol) for account in TEST_ACCOUNTS))
+
+async def open_account(account, action, symbol):
+    """单个账号开仓并推送结果"""
+    size = get_order_size(account['account_idx'], symbol)
+    if not size:
+        logger.warning(f"未配置账户{account['account_name']}的下单数量，跳过")
+        return
+    logger.info(f"准备为账户 {account['account_name']} 下单，参数如下：")
+    logger.info(f"action: {action}, symbol: {symbol}, size: {size}")
+    order_result = await place_okx_order(account, action, symbol, size)
+    logger.info(f"下单返回结果: {order_result}")
+    bark_title = f"Tg信号策略{action}-{symbol}"
+    # entry_price 用实际下单市场价
+    entry_price = order_result.get('market_price', 0)
+    bark_content = build_bark_content(
+        signal={'symbol': symbol, 'action': action},
+        account_name=account['account_name'],
+        entry_price=entry_price,
+        size=size,
+        margin=order_result.get('margin', 0),
+        take_profit=order_result.get('take_profit', 0),
+        stop_loss=order_result.get('stop_loss', 0),
+        clOrdId=order_result.get('clOrdId', ''),
+        okx_resp=order_result.get('okx_resp'),
+        error_msg=order_result.get('error_msg')
+    )
+    logger.info(f"准备发送Bark通知，参数如下：title={bark_title}, content={bark_content}")
+    send_bark_notification(bark_title, bark_content)
+    logger.info(f"Bark通知已发送: {bark_title}")
 
 async def process_close_signal(close_type, symbol):
-    """处理平仓信号"""
-    for account in TEST_ACCOUNTS:
-        logger.info(f"准备为账户 {account['account_name']} 平仓，参数如下：close_type: {close_type}, symbol: {symbol}")
-        close_result = await close_okx_position(account, symbol, close_type)
-        logger.info(f"平仓返回结果: {close_result}")
-        bark_title = f"Tg信号策略平仓-{symbol}"
-        bark_content = build_close_bark_content(
-            close_type=close_type,
-            symbol=symbol,
-            account_name=account['account_name'],
-            close_results=close_result['close_results'],
-            okx_resp=close_result['okx_resp'] if close_result['success'] else None,
-            error_msg=None if close_result['success'] else close_result.get('error_msg', '平仓失败')
-        )
-        logger.info(f"准备发送Bark通知，参数如下：title={bark_title}, content={bark_content}")
-        send_bark_notification(bark_title, bark_content)
-        logger.info(f"Bark通知已发送: {bark_title}")
-
-async def auto_restart_every_30min():
-    while True:
-        await asyncio.sleep(1800)  # 30分钟
-        logger.info('【自动重启】30分钟到，准备重启进程...')
-        os.execv(sys.executable, [sys.executable] + sys.argv)
+    """处理平仓信号，各账号并发平仓"""
+    await asyncio.gather(*(close_account(account, close_type, symbol) for account in TEST_ACCOUNTS))
+
+async def close_account(account, close_type, symbol):
+    """单个账号平仓并推送结果"""
+    logger.info(f"准备为账户 {account['account_name']} 平仓，参数如下：close_type: {close_type}, symbol: {symbol}")
+    close_result = await close_okx_position(account, symbol, close_type)
+    logger.info(f"平仓返回结果: {close_result}")
+    bark_title = f"Tg信号策略平仓-{symbol}"
+    bark_content = build_close_bark_content(
+        close_type=close_type,
+        symbol=symbol,
+        account_name=account['account_name'],
+        close_results=close_result['close_results'],
+        okx_resp=close_result['okx_resp'] if close_result['success'] else None,
+        error_msg=None if close_result['success'] else close_result.get('error_msg', '平仓失败')
+    )
+    logger.info(f"准备发送Bark通知，参数如下：title={bark_title}, content={bark_content}")
+    send_bark_notification(bark_title, bark_content)
+    logger.info(f"Bark通知已发送: {bark_title}")
 
 async def main():
     await client.start()
     logger.info(f'已登录 Telegram，监听频道: {CHANNEL_IDS}')
+    MARKET_DATA.start()
+    POSITION_BOOK.start()
+    # 下单签名按服务器时间生成时间戳
+    await asyncio.get_running_loop().run_in_executor(None, ORDER_GATEWAY.clock.sync)
+    await asyncio.get_running_loop().run_in_executor(None, INSTRUMENTS.refresh)
+    if ORDER_GATEWAY.ws is not None:
+        ORDER_GATEWAY.ws.start()
 
     # 初始化消息ID缓存（最近20条默认不补单）
     await init_processed_ids()
@@ -602,8 +551,6 @@ async def main():
     # 启动消息遗漏检测定时任务
     asyncio.create_task(check_and_patch_missing_signals())
 
-    # 启动定时重启任务
-    asyncio.create_task(auto_restart_every_30min())
 
     @client.on(events.NewMessage(chats=CHANNEL_IDS))
     async def handler(event):
@@ -616,25 +563,18 @@ async def main():
         if TG_LOG_GROUP_ID:
             await client.send_message(TG_LOG_GROUP_ID, log_msg)
         # 处理信号前，登记消息ID，避免重复下单
-        channel_id = event.chat_id
-        msg_id = event.id
-        if channel_id not in PROCESSED_MESSAGE_IDS:
-            PROCESSED_MESSAGE_IDS[channel_id] = set()
-        if msg_id not in PROCESSED_MESSAGE_IDS[channel_id]:
-            PROCESSED_MESSAGE_IDS[channel_id].add(msg_id)
-            save_processed_ids(PROCESSED_MESSAGE_IDS)
-        # 提取开仓信号
-        action, symbol = extract_trade_info(msg)
-        if action and symbol:
-            logger.info(f"检测到开仓信号: {action} {symbol}")
-            await process_open_signal(action, symbol, 0)  # 价格暂时设为0，实际应从信号中提取
-        # 提取平仓信号
-        close_type, close_symbol = extract_close_signal(msg)
-        if close_type and close_symbol:
-            logger.info(f"检测到平仓信号: {close_type} {close_symbol}")
-            await process_close_signal(close_type, close_symbol)
-
-    await client.run_until_disconnected()
+        PROCESSED_IDS.add(event.chat_id, event.id)
+        # 一次解析得到开仓/平仓信号
+        signal = SIGNAL_MATCHER.parse(msg)
+        if signal.is_open:
+            logger.info(f"检测到开仓信号: {signal}")
+            await process_open_signal(signal.action, signal.symbol, signal.price or 0)
+        elif signal.is_close:
+            logger.info(f"检测到平仓信号: {signal}")
+            await process_close_signal(signal.action, signal.symbol)
+
+    # 长期运行：连接不健康时只重建 Telegram 连接，不再定时重启进程
+    await TelegramConnectionMonitor(client).run()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
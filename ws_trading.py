@@ -0,0 +1,228 @@
+"""
+WebSocket 下单通道（可选，OKX_WS_TRADING=true 启用）
+
+每个账号保持一条已登录的私有 WebSocket，下单网关通过 order / batch-orders 操作发单，
+按请求 id 对应回报，省去每单一次 HTTP 请求的开销：
+- 后台线程运行独立事件循环，断线后退避重连；下单网关在交易线程中阻塞等待回报
+- 回报的 data 与 REST 下单接口同格式（clOrdId/ordId/sCode/sMsg），网关按腿解析逻辑不变
+- 连接不可用或请求未能发出时抛出 WsNotSent，网关直接改走 REST；
+  已发出但回报超时或断线时抛出 WsOutcomeUnknown，订单可能已被受理，由网关按 clOrdId 查单后再决定是否重发
+"""
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+from okx_signing import dumps
+from position_book import OKX_WS_PRIVATE_URL, WS_PING_INTERVAL, WS_RECONNECT_MAX_DELAY, private_ws_url, private_ws_headers, ws_login
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
+logger = logging.getLogger('tg_bot')
+
+OKX_WS_TRADING = os.getenv('OKX_WS_TRADING', 'false').lower() == 'true'
+# 等待下单回报的超时（秒）
+WS_ORDER_TIMEOUT = float(os.getenv('WS_ORDER_TIMEOUT', '5'))
+
+class WsNotSent(Exception):
+    """请求没有发出（未连接、发送失败），可以安全地改走 REST"""
+
+class WsOutcomeUnknown(Exception):
+    """请求已发出但没有收到回报（超时、断线），不能直接重发"""
+
+class _Connection:
+    __slots__ = ('ws', 'pending', 'connected_at')
+
+    def __init__(self, ws):
+        self.ws = ws
+        # 请求 id -> Future
+        self.pending = {}
+        self.connected_at = time.monotonic()
+
+class WsTradingService:
+    """按账号维护私有 WebSocket 下单连接"""
+
+    def __init__(self, accounts, url: str = OKX_WS_PRIVATE_URL, timeout: float = WS_ORDER_TIMEOUT, clock=None):
+        self.accounts = list(accounts)
+        self.url = url
+        self.timeout = timeout
+        # 可选 okx_signing.ServerClock，登录签名按服务器时间生成
+        self.clock = clock
+        self._connections = {}
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._loop = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.timeouts = 0
+        self.not_sent = 0
+        self.reconnects = 0
+        self.ack_total_ms = 0.0
+        self.ack_max_ms = 0.0
+
+    @staticmethod
+    def _key(account):
+        return account['API_KEY'], account['FLAG']
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        """启动后台连接线程；未安装 websockets 时网关全部走 REST"""
+        if websockets is None:
+            logger.warning("未安装 websockets，WebSocket 下单不可用，全部使用 REST 下单")
+            return False
+        if not self.accounts:
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._thread_main, name='ws-trading', daemon=True)
+        self._thread.start()
+        logger.info(f"WebSocket 下单通道已启动: {len(self.accounts)} 个账号")
+        return True
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._run())
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _run(self):
+        await asyncio.gather(*(self._run_account(account) for account in self.accounts))
+
+    # ---------- 连接 ----------
+    def _login_timestamp(self):
+        if self.clock is None:
+            return None
+        return str(int(time.time() + self.clock.offset_ms / 1000))
+
+    async def _run_account(self, account):
+        key = self._key(account)
+        delay = 1
+        while not self._stop.is_set():
+            connection = None
+            try:
+                async with websockets.connect(private_ws_url(account, self.url), ping_interval=None, close_timeout=2,
+                                              additional_headers=private_ws_headers(account, self.url)) as ws:
+                    await ws_login(ws, account, self._login_timestamp())
+                    connection = _Connection(ws)
+                    self._connections[key] = connection
+                    delay = 1
+                    logger.info(f"账号 {account['account_name']} 下单 WebSocket 已连接")
+                    await self._consume(connection)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"账号 {account['account_name']} 下单 WebSocket 连接异常: {e!r}")
+            finally:
+                if self._connections.get(key) is connection:
+                    self._connections.pop(key, None)
+                if connection is not None:
+                    for future in connection.pending.values():
+                        if not future.done():
+                            future.set_exception(ConnectionError("WebSocket 连接已断开"))
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WS_RECONNECT_MAX_DELAY)
+
+    async def _consume(self, connection):
+        ws = connection.ws
+        while not self._stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=WS_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                await ws.send('ping')
+                continue
+            if raw == 'pong':
+                continue
+            message = _loads(raw)
+            future = connection.pending.pop(message.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+            elif message.get('event') == 'error':
+                logger.error(f"下单 WebSocket 错误: {message}")
+
+    # ---------- 下单 ----------
+    def is_connected(self, account) -> bool:
+        return self._key(account) in self._connections
+
+    async def _request(self, connection, op, args):
+        request_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        connection.pending[request_id] = future
+        try:
+            await connection.ws.send(dumps({'id': request_id, 'op': op, 'args': args}).decode())
+        except Exception as e:
+            connection.pending.pop(request_id, None)
+            raise WsNotSent(f"发送失败: {e!r}")
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            connection.pending.pop(request_id, None)
+
+    def request(self, account, op, args) -> dict:
+        """
+        在交易线程中调用：发送 order / batch-orders 并阻塞等待回报，返回与 REST 同结构的响应；
+        请求未发出时抛出 WsNotSent，已发出但结果未知时抛出 WsOutcomeUnknown
+        """
+        connection = self._connections.get(self._key(account))
+        loop = self._loop
+        if connection is None or loop is None:
+            with self._lock:
+                self.not_sent += 1
+            raise WsNotSent("WebSocket 未连接")
+        start = time.perf_counter()
+        try:
+            response = asyncio.run_coroutine_threadsafe(self._request(connection, op, args), loop).result(self.timeout + 1)
+        except WsNotSent:
+            with self._lock:
+                self.not_sent += 1
+            raise
+        except ConnectionError as e:
+            # 已发出但在回报前断线，订单是否已受理未知
+            with self._lock:
+                self.timeouts += 1
+            raise WsOutcomeUnknown(f"等待回报时连接断开: {e}")
+        except (asyncio.TimeoutError, TimeoutError):
+            with self._lock:
+                self.timeouts += 1
+            raise WsOutcomeUnknown('WebSocket 下单回报超时')
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.requests += 1
+            self.ack_total_ms += elapsed_ms
+            self.ack_max_ms = max(self.ack_max_ms, elapsed_ms)
+        return response
+
+    def stats(self) -> dict:
+        return {
+            'connected': len(self._connections),
+            'accounts': len(self.accounts),
+            'requests': self.requests,
+            'ack_avg_ms': round(self.ack_total_ms / self.requests, 2) if self.requests else None,
+            'ack_max_ms': round(self.ack_max_ms, 2),
+            'timeouts': self.timeouts,
+            'not_sent': self.not_sent,
+            'reconnects': self.reconnects
+        }